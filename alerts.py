@@ -0,0 +1,282 @@
+"""
+ウォッチリストの価格アラート。
+
+ユーザーは「アイテムの価格が閾値以下 (below) / 以上 (above) になったら通知」というルールを登録する。
+ルールはアイテムごと・方向ごとに閾値でソートした索引に入れておき、価格の更新時は
+価格が変わったアイテムについて「前回の価格から今回の価格までの区間を跨いだ閾値」だけを二分探索で取り出す。
+評価のコストは ユーザー数 x ルール数 ではなく、価格が変わったアイテム数と発火したルール数に比例する。
+
+通知は閾値を跨いだときに1度だけ行い (価格が閾値の向こう側に留まっている間は再通知しない)、
+ユーザーごとの上限付きキュー (古いものから捨てる) に入れる。画面側は自分のキューを取り出して表示する。
+
+ユーザーはブラウザのセッション単位のため、閉じられたセッションのルールが残り続けないよう、
+一定時間 (user_ttl) 参照されなかったユーザーのルール・索引・通知キューは削除する。
+ルール数はユーザーごと・全体の両方で上限を設ける。
+"""
+import itertools
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from typing import Any, Deque, Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+BELOW = "below"
+ABOVE = "above"
+DIRECTIONS = (BELOW, ABOVE)
+
+# ユーザーごとの登録数と未読通知の上限
+MAX_RULES_PER_USER = 50
+QUEUE_SIZE = 100
+# 全体の登録数の上限
+MAX_RULES = 100_000
+# この秒数参照されなかったユーザーのルールを削除する
+USER_TTL = 1800
+# 期限切れのユーザーを探す間隔 (秒)
+EXPIRE_INTERVAL = 60
+
+
+class Rule(NamedTuple):
+    """
+    アラートのルール。
+
+    Attributes:
+        rule_id (int): ルールID。
+        user (str): 登録したユーザー (セッション) のID。
+        item_id (str): 対象のアイテムID。
+        direction (str): BELOW (閾値以下になったら通知) または ABOVE (閾値以上になったら通知)。
+        threshold (int): 閾値 (₽)。
+    """
+    rule_id: int
+    user: str
+    item_id: str
+    direction: str
+    threshold: int
+
+
+class Alert(NamedTuple):
+    """発火した通知。old_price は閾値を跨ぐ前の価格 (初回の価格で発火した場合は None)。"""
+    rule: Rule
+    old_price: Optional[int]
+    price: int
+    time: float
+
+
+class _ThresholdIndex:
+    """1アイテム・1方向のルールを閾値の昇順で保持する索引 ((閾値, ルールID) のソート済みリスト)。"""
+    __slots__ = ("keys",)
+
+    def __init__(self):
+        self.keys: List[Tuple[int, int]] = []
+
+    def add(self, threshold: int, rule_id: int) -> None:
+        insort(self.keys, (threshold, rule_id))
+
+    def remove(self, threshold: int, rule_id: int) -> None:
+        i = bisect_left(self.keys, (threshold, rule_id))
+        if i < len(self.keys) and self.keys[i] == (threshold, rule_id):
+            del self.keys[i]
+
+    def between(self, low: float, high: float, closed_low: bool) -> List[int]:
+        """閾値が low-high の区間にあるルールID (closed_low なら [low, high), そうでなければ (low, high])。"""
+        if closed_low:
+            lo = bisect_left(self.keys, (low, -1))
+            hi = bisect_left(self.keys, (high, -1))
+        else:
+            lo = bisect_right(self.keys, (low, float("inf")))
+            hi = bisect_right(self.keys, (high, float("inf")))
+        return [rule_id for _, rule_id in self.keys[lo:hi]]
+
+
+class AlertEngine:
+    """
+    ルールの索引と通知キュー (プロセス全体で共有、スレッドセーフ)。
+
+    Args:
+        max_rules_per_user (int): ユーザーごとのルール数の上限。
+        queue_size (int): ユーザーごとの未読通知の上限。
+        max_rules (int): 全体のルール数の上限。
+        user_ttl (float): この秒数 rules / drain / add_rule で参照されなかったユーザーのルールを削除する。
+    """
+
+    def __init__(self, max_rules_per_user: int = MAX_RULES_PER_USER, queue_size: int = QUEUE_SIZE,
+                 max_rules: int = MAX_RULES, user_ttl: float = USER_TTL):
+        self.max_rules_per_user = max_rules_per_user
+        self.queue_size = queue_size
+        self.max_rules = max_rules
+        self.user_ttl = user_ttl
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._rules: Dict[int, Rule] = {}
+        self._user_rules: Dict[str, Set[int]] = {}
+        # アイテムID -> {方向 -> 索引}
+        self._index: Dict[str, Dict[str, _ThresholdIndex]] = {}
+        # 最後に評価した価格 (価格の変化の検出用)
+        self._prices: Dict[str, int] = {}
+        self._queues: Dict[str, Deque[Alert]] = {}
+        # ルールを持つユーザー -> 最後に参照された時刻
+        self._last_seen: Dict[str, float] = {}
+        self._last_expire = time.monotonic()
+        # 最後に update_market で評価した市場データ
+        self._market: Optional[Mapping[str, Any]] = None
+        self.evaluations = 0
+
+    def add_rule(self, user: str, item_id: str, direction: str, threshold: int,
+                 price: Optional[int] = None) -> Rule:
+        """
+        ルールを登録します。現在の価格が既に条件を満たしていればすぐに通知する。
+
+        Args:
+            price (Optional[int]): 登録時点の価格 (まだ評価していないアイテムの場合の初期値)。
+
+        Raises:
+            ValueError: 方向が不正な場合、またはユーザーか全体のルール数が上限に達している場合。
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"invalid direction: {direction}")
+        with self._lock:
+            now = time.monotonic()
+            self._expire_due(now)
+            self._touch(user)
+            if len(self._user_rules.get(user, ())) >= self.max_rules_per_user:
+                raise ValueError(f"too many rules (max {self.max_rules_per_user})")
+            if len(self._rules) >= self.max_rules:
+                raise ValueError(f"too many rules in total (max {self.max_rules})")
+            rule = Rule(next(self._ids), user, item_id, direction, int(threshold))
+            self._rules[rule.rule_id] = rule
+            self._user_rules.setdefault(user, set()).add(rule.rule_id)
+            self._last_seen[user] = now
+            self._index.setdefault(item_id, {}).setdefault(direction, _ThresholdIndex()).add(rule.threshold, rule.rule_id)
+            if price is not None:
+                self._prices.setdefault(item_id, price)
+            price = self._prices.get(item_id)
+            if price is not None and (price <= rule.threshold if direction == BELOW else price >= rule.threshold):
+                self._notify(rule, None, price, time.time())
+        return rule
+
+    def remove_rule(self, user: str, rule_id: int) -> bool:
+        """ルールを削除します (他のユーザーのルールは削除できない)。"""
+        with self._lock:
+            rule = self._rules.get(rule_id)
+            if rule is None or rule.user != user:
+                return False
+            self._remove(rule)
+            return True
+
+    def _remove(self, rule: Rule) -> None:
+        del self._rules[rule.rule_id]
+        self._user_rules[rule.user].discard(rule.rule_id)
+        by_direction = self._index[rule.item_id]
+        by_direction[rule.direction].remove(rule.threshold, rule.rule_id)
+        if not by_direction[rule.direction].keys:
+            del by_direction[rule.direction]
+        if not by_direction:
+            del self._index[rule.item_id]
+            self._prices.pop(rule.item_id, None)
+
+    def _touch(self, user: str) -> None:
+        if user in self._user_rules:
+            self._last_seen[user] = time.monotonic()
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        user_ttl 秒参照されなかったユーザーのルール・索引・通知キューを削除します。
+
+        Returns:
+            int: 削除したユーザーの数。
+        """
+        with self._lock:
+            return self._expire(time.monotonic() if now is None else now)
+
+    def _expire_due(self, now: float) -> None:
+        if now - self._last_expire >= EXPIRE_INTERVAL:
+            self._expire(now)
+
+    def _expire(self, now: float) -> int:
+        self._last_expire = now
+        cutoff = now - self.user_ttl
+        stale = [user for user, seen in self._last_seen.items() if seen < cutoff]
+        for user in stale:
+            for rule_id in list(self._user_rules.get(user, ())):
+                self._remove(self._rules[rule_id])
+            self._user_rules.pop(user, None)
+            self._last_seen.pop(user, None)
+            self._queues.pop(user, None)
+        return len(stale)
+
+    def rules(self, user: str) -> List[Rule]:
+        """ユーザーのルール一覧 (登録順)。ユーザーの最終参照時刻も更新する。"""
+        with self._lock:
+            self._touch(user)
+            return sorted((self._rules[i] for i in self._user_rules.get(user, ())), key=lambda r: r.rule_id)
+
+    def watched_items(self) -> List[str]:
+        """いずれかのルールの対象になっているアイテムID。"""
+        with self._lock:
+            return list(self._index)
+
+    def update(self, prices: Mapping[str, Optional[int]]) -> int:
+        """
+        最新の価格でルールを評価し、閾値を跨いだルールの通知をキューに入れます。
+
+        Args:
+            prices (Mapping[str, Optional[int]]): アイテムID -> 価格 (ウォッチ対象のみでよい, None は価格なし)。
+
+        Returns:
+            int: 発火した通知の数。
+        """
+        now = time.time()
+        fired = 0
+        with self._lock:
+            self._expire_due(time.monotonic())
+            for item_id, price in prices.items():
+                by_direction = self._index.get(item_id)
+                if by_direction is None or price is None:
+                    continue
+                old = self._prices.get(item_id)
+                if old == price:
+                    continue
+                self._prices[item_id] = price
+                self.evaluations += 1
+                # 値下がり: new <= 閾値 < old のルール / 値上がり: old < 閾値 <= new のルール
+                # (初回の価格は「十分遠い価格から変化した」とみなす)
+                if BELOW in by_direction and (old is None or price < old):
+                    for rule_id in by_direction[BELOW].between(price, float("inf") if old is None else old, True):
+                        self._notify(self._rules[rule_id], old, price, now)
+                        fired += 1
+                if ABOVE in by_direction and (old is None or price > old):
+                    for rule_id in by_direction[ABOVE].between(float("-inf") if old is None else old, price, False):
+                        self._notify(self._rules[rule_id], old, price, now)
+                        fired += 1
+        return fired
+
+    def update_market(self, market: Mapping[str, Mapping[str, Any]], field: str = "avg24hPrice") -> int:
+        """
+        市場データ (アイテムID -> アイテム) のウォッチ対象の価格で評価します。
+        前回と同じ市場データ (同じオブジェクト) なら何もしないため、各セッションの定期実行から呼んでよい。
+
+        Returns:
+            int: 発火した通知の数。
+        """
+        with self._lock:
+            if market is self._market:
+                return 0
+            self._market = market
+            watched = list(self._index)
+        return self.update({item_id: market[item_id].get(field) for item_id in watched if item_id in market})
+
+    def _notify(self, rule: Rule, old: Optional[int], price: int, now: float) -> None:
+        queue = self._queues.get(rule.user)
+        if queue is None:
+            queue = self._queues[rule.user] = deque(maxlen=self.queue_size)
+        queue.append(Alert(rule, old, price, now))
+
+    def drain(self, user: str) -> List[Alert]:
+        """ユーザーの未読通知を全て取り出します。"""
+        with self._lock:
+            self._touch(user)
+            queue = self._queues.get(user)
+            if not queue:
+                return []
+            alerts = list(queue)
+            queue.clear()
+            return alerts
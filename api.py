@@ -1,45 +1,555 @@
-import requests
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import IntEnum
+
 import streamlit as st
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Deque, Set, Tuple
+
+import profiling
+
+API_URL = os.environ.get("TARKOV_API_URL", "https://api.tarkov.dev/graphql")  # 負荷試験ではスタブサーバーを指定する
+REQUEST_TIMEOUT = float(os.environ.get("TARKOV_API_TIMEOUT", "15"))  # 1リクエストのタイムアウト (秒)
+
+logger = logging.getLogger(__name__)
+
+# 上流APIへのリクエストレート制限 (環境変数で変更可能)
+API_RATE = float(os.environ.get("TARKOV_API_RATE", "5"))       # 1秒あたりの平均リクエスト数
+API_BURST = float(os.environ.get("TARKOV_API_BURST", "10"))    # 連続で送れる最大数
+API_QUEUE = int(os.environ.get("TARKOV_API_QUEUE", "64"))      # 優先度ごとの待ち行列の上限
+
+
+class Priority(IntEnum):
+    """リクエストの優先度 (値が小さいほど優先)。"""
+    INTERACTIVE = 0  # ユーザー操作による検索
+    BACKGROUND = 1   # 価格履歴の記録などの定期更新
+    PREFETCH = 2     # 先読み
+
+
+# 優先度ごとの待ち時間の上限 (秒)。超えたリクエストは古くなったものとして破棄する
+DEFAULT_DEADLINES = {
+    Priority.INTERACTIVE: 10.0,
+    Priority.BACKGROUND: 60.0,
+    Priority.PREFETCH: 15.0,
+}
+
+
+class _Ticket:
+    __slots__ = ("enqueued", "deadline", "expired", "priority", "queued")
+
+    def __init__(self, enqueued: float, deadline: float, priority: Priority):
+        self.enqueued = enqueued
+        self.deadline = deadline
+        self.expired = False
+        self.priority = priority
+        self.queued = False
+
+
+class _ClassStats:
+    """優先度ごとの待ち時間・破棄数の集計。"""
+    __slots__ = ("granted", "shed", "total_wait", "max_wait", "recent_wait")
+
+    def __init__(self):
+        self.granted = 0
+        self.shed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_wait = 0.0  # 指数移動平均
+
+    def record(self, wait: float) -> None:
+        self.granted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_wait = wait if self.granted == 1 else 0.8 * self.recent_wait + 0.2 * wait
+
+
+class RateGovernor:
+    """
+    優先度付きトークンバケット。
+
+    トークンは rate 個/秒で burst 個まで貯まり、待っているリクエストのうち
+    最も優先度の高い (同じ優先度なら古い) ものから順に払い出す。
+    待ち行列は優先度ごとに上限があり、期限を過ぎたリクエストは破棄される。
+    """
+
+    def __init__(self, rate: float = API_RATE, burst: float = API_BURST, max_queue: int = API_QUEUE):
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._queues: Dict[Priority, Deque[_Ticket]] = {p: deque() for p in Priority}
+        self._stats: Dict[Priority, _ClassStats] = {p: _ClassStats() for p in Priority}
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _shed_expired(self, now: float) -> None:
+        for queue in self._queues.values():
+            for ticket in [x for x in queue if x.deadline <= now]:
+                queue.remove(ticket)
+                ticket.expired = True
+                ticket.queued = False
+
+    def _head(self) -> Optional[_Ticket]:
+        for priority in Priority:
+            if self._queues[priority]:
+                return self._queues[priority][0]
+        return None
+
+    @staticmethod
+    def ticket(priority: Priority = Priority.INTERACTIVE, timeout: Optional[float] = None) -> _Ticket:
+        """acquire に渡す待ち札を作ります (待っている間に promote で優先度を上げるため)。"""
+        now = time.monotonic()
+        timeout = DEFAULT_DEADLINES[priority] if timeout is None else timeout
+        return _Ticket(now, now + timeout, priority)
+
+    def acquire(self, priority: Priority = Priority.INTERACTIVE, timeout: Optional[float] = None,
+                ticket: Optional[_Ticket] = None) -> bool:
+        """
+        リクエストの送信許可を待ちます。
+
+        Args:
+            priority (Priority): リクエストの優先度。
+            timeout (Optional[float]): 待ち時間の上限 (秒)。省略時は優先度ごとの既定値。
+            ticket (Optional[_Ticket]): ticket() で作った待ち札 (指定時は priority / timeout より優先)。
+
+        Returns:
+            bool: 送信してよい場合はTrue。待ち行列が満杯、または期限切れで破棄された場合はFalse。
+        """
+        if ticket is None:
+            ticket = self.ticket(priority, timeout)
+
+        with self._cond:
+            queue = self._queues[ticket.priority]
+            if len(queue) >= self.max_queue:
+                self._stats[ticket.priority].shed += 1
+                return False
+            queue.append(ticket)
+            ticket.queued = True
+
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                self._shed_expired(now)
+                if ticket.expired:
+                    self._stats[ticket.priority].shed += 1
+                    self._cond.notify_all()
+                    return False
+
+                if self._head() is ticket:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self._queues[ticket.priority].popleft()
+                        ticket.queued = False
+                        self._stats[ticket.priority].record(now - ticket.enqueued)
+                        # 次の先頭のリクエストを起こす
+                        self._cond.notify_all()
+                        return True
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = ticket.deadline - now
+                self._cond.wait(max(0.001, min(wait, ticket.deadline - now)))
+
+    def promote(self, ticket: _Ticket, priority: Priority) -> None:
+        """
+        待ち札の優先度を上げます (より優先度の高い呼び出し元が同じリクエストの結果を待つ場合)。
+        待ち行列の中では、新しい優先度の中で待ち始めた順の位置に移す。送信済み・破棄済みの札は何もしない。
+        """
+        with self._cond:
+            if priority >= ticket.priority or ticket.expired:
+                return
+            ticket.deadline = max(ticket.deadline, time.monotonic() + DEFAULT_DEADLINES[priority])
+            if ticket.queued:
+                self._queues[ticket.priority].remove(ticket)
+                queue = self._queues[priority]
+                position = next((i for i, x in enumerate(queue) if x.enqueued > ticket.enqueued), len(queue))
+                queue.insert(position, ticket)
+            ticket.priority = priority
+            self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, Any]:
+        """優先度ごとの待ち行列の長さと待ち時間の統計を返します。"""
+        with self._cond:
+            self._refill(time.monotonic())
+            result: Dict[str, Any] = {"tokens": round(self._tokens, 2)}
+            for priority in Priority:
+                stats = self._stats[priority]
+                result[priority.name.lower()] = {
+                    "queue_depth": len(self._queues[priority]),
+                    "granted": stats.granted,
+                    "shed": stats.shed,
+                    "avg_wait": stats.total_wait / stats.granted if stats.granted else 0.0,
+                    "recent_wait": stats.recent_wait,
+                    "max_wait": stats.max_wait,
+                }
+            return result
+
+
+# 応答キャッシュ (stale-while-revalidate) とサーキットブレーカーの設定
+CACHE_TTL = float(os.environ.get("TARKOV_CACHE_TTL", "300"))            # この秒数を過ぎた応答は裏で再検証する
+CACHE_MAX_ENTRIES = int(os.environ.get("TARKOV_CACHE_MAX_ENTRIES", "256"))
+CACHE_DIR = os.environ.get("TARKOV_CACHE_DIR")  # 指定時は応答をディスクにも保存し、プロセス間で共有する
+BREAKER_THRESHOLD = int(os.environ.get("TARKOV_BREAKER_THRESHOLD", "5"))  # 連続失敗でOPENにする回数
+BREAKER_COOLDOWN = float(os.environ.get("TARKOV_BREAKER_COOLDOWN", "30"))  # OPENからHALF_OPENまでの秒数
+
+
+class UpstreamError(Exception):
+    """上流APIからデータを取得できなかったことを表す例外 (メッセージは画面表示用)。"""
+
+
+class CachedResponse:
+    """最後に取得に成功した応答と取得時刻。"""
+    __slots__ = ("data", "fetched_at")
+
+    def __init__(self, data: Dict[str, Any], fetched_at: float):
+        self.data = data
+        self.fetched_at = fetched_at
+
+    @property
+    def age(self) -> float:
+        """取得からの経過秒数。"""
+        return time.time() - self.fetched_at
+
+    @property
+    def stale(self) -> bool:
+        return self.age >= CACHE_TTL
+
+
+class ResponseCache:
+    """
+    クエリ文字列をキーにした、件数上限付きのLRU応答キャッシュ。
+
+    disk_dir を指定した場合は応答をJSONファイルにも保存し、メモリにない応答はディスクから読む。
+    起動時のキャッシュウォーマー (warmup.py) など別プロセスが取得した応答を共有するために使う。
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, disk_dir: Optional[str] = CACHE_DIR):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, query: str) -> str:
+        return os.path.join(self.disk_dir, hashlib.sha1(query.encode("utf-8")).hexdigest() + ".json")
+
+    def _load(self, query: str) -> Optional[CachedResponse]:
+        try:
+            with open(self._disk_path(query), encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return CachedResponse(stored["data"], stored["fetched_at"])
+
+    def _store(self, query: str, entry: CachedResponse) -> None:
+        path = self._disk_path(query)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"fetched_at": entry.fetched_at, "data": entry.data}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("failed to write response cache: %s", e)
+
+    def get(self, query: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is not None:
+                self._entries.move_to_end(query)
+                return entry
+        if not self.disk_dir:
+            return None
+        entry = self._load(query)
+        if entry is not None:
+            self._remember(query, entry)
+        return entry
+
+    def put(self, query: str, data: Dict[str, Any]) -> CachedResponse:
+        entry = CachedResponse(data, time.time())
+        self._remember(query, entry)
+        if self.disk_dir:
+            self._store(query, entry)
+        return entry
+
+    def _remember(self, query: str, entry: CachedResponse) -> None:
+        with self._lock:
+            self._entries[query] = entry
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class CircuitBreaker:
+    """
+    上流の連続失敗を検知して一時的にリクエストを止めるサーキットブレーカー。
+
+    CLOSED: 通常状態。threshold 回連続で失敗すると OPEN へ。
+    OPEN: リクエストを送らない。cooldown 秒後に HALF_OPEN へ。
+    HALF_OPEN: 1件だけ試行リクエストを通し、成功なら CLOSED、失敗なら再び OPEN へ。
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return self.HALF_OPEN
+            return self._state
+
+    def retry_in(self) -> float:
+        """OPEN状態の場合、次の試行までの秒数。"""
+        with self._lock:
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        """リクエストを送ってよいかを返します (HALF_OPEN では試行1件のみ許可)。"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self._state = self.HALF_OPEN
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def release(self) -> None:
+        """許可を得たリクエストを送らずに終えた場合に呼び、試行枠を返却します。"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self._failures >= self.threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+# 全セッションで共有するレート制限・応答キャッシュ・サーキットブレーカー
+_governor = RateGovernor()
+_cache = ResponseCache()
+_breaker = CircuitBreaker()
+
+# 古い応答の再検証を行うバックグラウンドスレッド
+_revalidator = ThreadPoolExecutor(max_workers=2, thread_name_prefix="revalidate")
+_revalidating: Set[str] = set()
+# 直近の再検証に失敗したクエリ (次に取得に成功するまで)
+_refresh_failed: Set[str] = set()
+_revalidating_lock = threading.Lock()
+
+# 取得中のクエリ -> (結果, 取得を始めた優先度, レート制限の待ち札)。同じクエリの同時の取得は1件にまとめる
+_inflight: Dict[str, Tuple["Future[CachedResponse]", Priority, _Ticket]] = {}
+_inflight_lock = threading.Lock()
 
-API_URL = 'https://api.tarkov.dev/graphql'
 
 class TarkovClient:
     """Tarkov.dev APIと通信するためのクライアントクラス。"""
 
     @staticmethod
-    def run_query(query: str) -> Optional[Dict[str, Any]]:
+    def run_query(query: str, priority: Priority = Priority.INTERACTIVE) -> Optional[Dict[str, Any]]:
         """
         GraphQLクエリを実行し、結果を返します。
         
+        直近の応答がキャッシュにあればそれを即座に返し、CACHE_TTL を過ぎていれば
+        バックグラウンドで再検証します (上流の障害中も最後に成功した応答を返し続ける)。
+        
         Args:
             query (str): 実行するGraphQLクエリ文字列。
+            priority (Priority): レート制限上の優先度。
             
         Returns:
             Optional[Dict[str, Any]]: クエリ結果の辞書。エラーが発生した場合はNone。
         """
+        entry = _cache.get(query)
+        if entry is not None:
+            if entry.stale:
+                TarkovClient._revalidate(query)
+            return entry.data
+
         try:
-            response = requests.post(API_URL, json={'query': query})
+            # TARKOV_PROFILE=query の場合は一定の割合の取得を記録する
+            with profiling.profile("query", {"query": " ".join(query.split())[:200], "priority": priority.name}):
+                return TarkovClient._fetch(query, priority).data
+        except UpstreamError as e:
+            # 混雑時に破棄されたリクエスト等 (バックグラウンド処理は黙って諦める)
+            if priority == Priority.INTERACTIVE:
+                st.error(str(e))
+            else:
+                logger.warning("%s", e)
+            return None
+
+    @staticmethod
+    def _fetch(query: str, priority: Priority) -> CachedResponse:
+        """
+        上流APIから取得し、成功した応答をキャッシュに格納します。
+
+        同じクエリを既に取得中 (先読みや他のセッション) の場合は新たにリクエストを送らず、その結果を待つ。
+        こちらの優先度の方が高ければ、取得中のリクエストのレート制限の待ち札をこちらの優先度に上げる
+        (ユーザー操作が先読みの後ろで待たされないように)。
+        待っていた取得が失敗した場合、こちらの優先度の方が高ければ (先読みが混雑で破棄された場合など) 自分で取得し直す。
+        
+        Raises:
+            UpstreamError: 取得できなかった場合 (メッセージは画面表示用)。
+        """
+        while True:
+            with _inflight_lock:
+                running = _inflight.get(query)
+                if running is None:
+                    future: "Future[CachedResponse]" = Future()
+                    ticket = _governor.ticket(priority)
+                    _inflight[query] = (future, priority, ticket)
+                    break
+            future, leader_priority, leader_ticket = running
+            _governor.promote(leader_ticket, priority)
+            try:
+                return future.result()
+            except UpstreamError:
+                if priority >= leader_priority:
+                    raise
+
+        try:
+            # 直前に他の取得が終わっていれば、その応答を使う
+            entry = _cache.get(query)
+            if entry is None or entry.stale:
+                entry = TarkovClient._request(query, ticket)
+        except BaseException as e:
+            # 待っている側が取得し直せるよう、結果を渡す前に取得中の一覧から外す
+            with _inflight_lock:
+                _inflight.pop(query, None)
+            future.set_exception(e)
+            raise
+        with _inflight_lock:
+            _inflight.pop(query, None)
+        with _revalidating_lock:
+            _refresh_failed.discard(query)
+        future.set_result(entry)
+        return entry
+
+    @staticmethod
+    def _request(query: str, ticket: _Ticket) -> CachedResponse:
+        """上流APIへ実際にリクエストを送り、成功した応答をキャッシュに格納します。"""
+        if not _breaker.allow():
+            raise UpstreamError(f"Circuit Open: the API is failing, retrying in {_breaker.retry_in():.0f}s.")
+        if not _governor.acquire(ticket=ticket):
+            _breaker.release()
+            raise UpstreamError("Rate Limit: request dropped, the API is busy. Please retry.")
+
+        # requests はキャッシュで応答できない初回の取得時まで読み込まない
+        import requests
+
+        try:
+            response = requests.post(API_URL, json={'query': query}, timeout=REQUEST_TIMEOUT)
             response.raise_for_status() # HTTPエラーチェック
             
             data = response.json()
-            
-            # GraphQLのエラーチェック
-            if 'errors' in data:
-                error_msg = data['errors'][0].get('message', 'Unknown GraphQL error')
-                st.error(f"API Error: {error_msg}")
-                return None
-                
-            # データが存在するかチェック
-            if 'data' not in data:
-                st.error("API response missing 'data' field.")
-                return None
-                
-            return data['data']
-            
         except requests.exceptions.RequestException as e:
-            st.error(f"Network Error: {e}")
-            return None
+            _breaker.record_failure()
+            raise UpstreamError(f"Network Error: {e}") from e
         except ValueError as e: # JSONデコードエラーなど
-            st.error(f"Data Error: {e}")
-            return None
+            _breaker.record_failure()
+            raise UpstreamError(f"Data Error: {e}") from e
+
+        # 上流は応答しているのでクエリ側の問題はブレーカーの失敗に数えない
+        _breaker.record_success()
+            
+        # GraphQLのエラーチェック
+        if 'errors' in data:
+            error_msg = data['errors'][0].get('message', 'Unknown GraphQL error')
+            raise UpstreamError(f"API Error: {error_msg}")
+            
+        # データが存在するかチェック
+        if 'data' not in data:
+            raise UpstreamError("API response missing 'data' field.")
+            
+        return _cache.put(query, data['data'])
+
+    @staticmethod
+    def warm(query: str, priority: Priority = Priority.BACKGROUND) -> bool:
+        """
+        クエリの応答をキャッシュに用意します (新しい応答がキャッシュにあれば何もしない)。
+        古い応答を返すだけの run_query と違い、取得が終わるまで待つ。
+        
+        Returns:
+            bool: 新しい応答がキャッシュにある状態になった場合はTrue。
+        """
+        entry = _cache.get(query)
+        if entry is not None and not entry.stale:
+            return True
+        try:
+            TarkovClient._fetch(query, priority)
+            return True
+        except UpstreamError as e:
+            logger.warning("warm-up failed: %s", e)
+            return False
+
+    @staticmethod
+    def _revalidate(query: str) -> None:
+        """古い応答の再取得をバックグラウンドで開始します (同じクエリの重複実行はしない)。"""
+        with _revalidating_lock:
+            if query in _revalidating:
+                return
+            _revalidating.add(query)
+
+        def task():
+            try:
+                TarkovClient._fetch(query, Priority.BACKGROUND)
+            except UpstreamError as e:
+                logger.warning("revalidation failed: %s", e)
+                with _revalidating_lock:
+                    _refresh_failed.add(query)
+            finally:
+                with _revalidating_lock:
+                    _revalidating.discard(query)
+
+        _revalidator.submit(task)
+
+    @staticmethod
+    def freshness(query: str) -> Optional[CachedResponse]:
+        """クエリに対してキャッシュされている応答 (取得時刻を含む) を返します。"""
+        return _cache.get(query)
+
+    @staticmethod
+    def refresh_failed(query: str) -> bool:
+        """古い応答の再検証が直近で失敗している (まだ取得し直せていない) かどうかを返します。"""
+        with _revalidating_lock:
+            return query in _refresh_failed
+
+    @staticmethod
+    def upstream_state() -> str:
+        """サーキットブレーカーの状態 ("closed" / "open" / "half_open") を返します。"""
+        return _breaker.state
+
+    @staticmethod
+    def metrics() -> Dict[str, Any]:
+        """レート制限の待ち行列・待ち時間の統計を返します。"""
+        return _governor.metrics()
@@ -1,99 +1,113 @@
+import logging
+import os
+import threading
+import time
+import uuid
 import streamlit as st
-import pandas as pd
-from api import TarkovClient
+from api import TarkovClient, Priority, CircuitBreaker
 from queries import (
-    get_ammo_query, get_item_price_query, get_tasks_query, 
-    get_all_crafts_query, get_items_by_category_query,    get_task_items_query,
-    get_barter_items_query
+    get_ammo_query, get_items_query, get_tasks_query, get_localization_query,
+    get_all_crafts_query, get_items_by_category_query, get_barters_query
 )
-from translations import TRANSLATIONS
+from data import (
+    CALIBERS, CATEGORY_MODES, ammo_query_caliber, prefetch,
+    get_localization, get_market, get_tasks, get_crafts, get_barter_index,
+    get_name_index, get_penetration_matrix, get_sale_table, get_task_graph, get_task_name_map, search_items
+)
+from translations import get_translations
+from pricing import (
+    best_sell, calculate_price, get_price_info, iter_craft_profits, iter_task_items, normalize_name
+)
+from tables import Column, build_table, render_table
+from alerts import BELOW, DIRECTIONS, MAX_RULES_PER_USER, USER_TTL, AlertEngine
+import profiling
+from paging import DEFAULT_PAGE_SIZE, PAGE_SIZE_OPTIONS, build_page, page_bounds, select_page
+# pandas / numpy (history) は使う画面の中で読み込む (タスク検索などでは不要なため起動を軽くする)
 
 # ページ設定
 st.set_page_config(page_title="Tarkov Tactical Dashboard", layout="wide")
 
+# プロファイル: TARKOV_PROFILE=rerun なら一定の割合で、?profile=<TARKOV_PROFILE_TOKEN> なら必ずこのリランを記録する
+rerun_profile = profiling.start("rerun", requested=profiling.is_admin(st.query_params.get("profile")))
+
 # セッション状態で言語を管理
 if 'lang_code' not in st.session_state:
     st.session_state.lang_code = 'ja'
 
+# 価格アラートの通知先 (ブラウザのセッション単位)
+if 'alert_user' not in st.session_state:
+    st.session_state.alert_user = uuid.uuid4().hex
+
+# ウォッチリストの価格を評価する間隔 (秒)
+ALERT_POLL_SECONDS = int(os.environ.get("TARKOV_ALERT_POLL", "60"))
+
 # ヘルパー関数: 翻訳取得
 def t(key, *args):
-    lang = st.session_state.lang_code
-    text = TRANSLATIONS.get(lang, TRANSLATIONS['ja']).get(key, key)
-    if args:
-        return text.format(*args)
-    return text
-
-# キャッシュ: タスクIDマップ作成
-@st.cache_data
-def get_task_name_map(lang):
-    # Trader名はなんでもよいのでダミー
-    query = get_tasks_query("Any", lang=lang)
+    return get_translations(st.session_state.lang_code)(key, *args)
+
+# ヘルパー: データの鮮度表示 (上流の障害で更新できていない場合だけ警告)
+# 単に TTL を過ぎただけの応答はバックグラウンドで再検証中のため、取得時刻のみ表示する
+def show_freshness(query):
+    entry = TarkovClient.freshness(query)
+    if entry is None:
+        return
+    minutes = int(entry.age // 60)
+    if TarkovClient.upstream_state() != CircuitBreaker.CLOSED or (entry.stale and TarkovClient.refresh_failed(query)):
+        st.warning(t("data_stale", minutes))
+    else:
+        st.caption(t("data_age", minutes))
+
+# ヘルパー: 応答の取得時刻の組 (データが更新されたら構築済みのページを使わないための版)
+def data_version(*queries):
+    return tuple(getattr(TarkovClient.freshness(query), 'fetched_at', None) for query in queries)
+
+# ヘルパー: クエリ実行 (キャッシュ済みの応答は即座に返る) と鮮度表示
+def fetch(query):
     data = TarkovClient.run_query(query)
-    task_map = {}
-    if data and data.get('tasks'):
-        for t in data['tasks']:
-            tid = str(t.get('tarkovDataId'))
-            if tid and tid != "None":
-                task_map[tid] = t['name']
-    return task_map
-
-# ヘルパー: 条件フォーマット
-def format_requirements(reqs, task_map=None):
-    if not reqs:
-        return ""
-    parts = []
-    for r in reqs:
-        if r['type'] == 'loyaltyLevel':
-            parts.append(t("req_ll").format(r['value']))
-        elif r['type'] == 'questCompleted':
-            val = str(r['value'])
-            task_name = task_map.get(val, val) if task_map else t("req_quest")
-            parts.append(f"{task_name}")
-    return ", ".join(parts)
-
-# ヘルパー: 価格情報取得 (フリマ最適、トレーダー最適、条件)
-def get_price_info(item, task_map=None):
-    buy_for = item.get('buyFor') or []
-    
-    # フリマ
-    flea_listing = next((x for x in buy_for if x['vendor']['name'] == 'Flea Market'), None)
-    flea_price = flea_listing['price'] if flea_listing else item.get('avg24hPrice')
-    
-    # トレーダー (フリマ以外)
-    trader_deals = [x for x in buy_for if x['vendor']['name'] != 'Flea Market']
-    trader_info = None
-    
-    if trader_deals:
-        # 価格があるものだけで最安を探す
-        valid_deals = [x for x in trader_deals if x.get('price') is not None]
-        if valid_deals:
-            best_deal = min(valid_deals, key=lambda x: x['price'])
-            req_str = format_requirements(best_deal.get('requirements', []), task_map)
-            trader_info = {
-                'price': best_deal['price'],
-                'name': best_deal['vendor']['name'],
-                'req': req_str
-            }
-            
-    return {
-        'flea_price': flea_price,
-        'trader': trader_info
-    }
-
-# ヘルパー関数: アイテムの価格を算出（既存ロジックの代替: avg24hPrice -> flea -> trader）
-def calculate_price(item):
-    price = item.get('avg24hPrice')
-    if price is None:
-        info = get_price_info(item) # 名前解決不要なので task_map=None
-        if info['flea_price']:
-            price = info['flea_price']
-        elif info['trader']:
-            price = info['trader']['price']
-    return price
-
-# ヘルパー関数: 名前をAPIのnormalizedName形式（小文字ケバブケース）に変換
-def normalize_name(name):
-    return name.lower().replace(" ", "-")
+    show_freshness(query)
+    return data
+
+# キャッシュ: 価格履歴ストア (全セッションで共有)
+@st.cache_resource
+def get_price_history():
+    from history import PriceHistory
+    return PriceHistory()
+
+# キャッシュ: 価格アラートのルールと通知キュー (全セッションで共有)
+@st.cache_resource
+def get_alert_engine():
+    # 開いているセッションはウォッチリストの定期実行で参照され続けるため、期限は実行間隔より十分長くする
+    return AlertEngine(user_ttl=max(USER_TTL, ALERT_POLL_SECONDS * 5))
+
+# ヘルパー: 価格データの応答を、その取得時刻で記録 (古い応答を現在時刻で記録しない・同じ応答は1度だけ)
+def record_price_snapshot(price_history):
+    query = get_items_query()
+    # 応答が古ければ取得し直す (取得できなければ前回の応答のまま)
+    TarkovClient.warm(query, Priority.BACKGROUND)
+    entry = TarkovClient.freshness(query)
+    if entry is None or not price_history.due(entry.fetched_at):
+        return False
+    return price_history.record(
+        {item['id']: item.get('avg24hPrice') for item in entry.data.get('items') or []}, now=entry.fetched_at)
+
+# キャッシュ: 価格履歴の記録スレッド (画面を開いているセッションの有無に関係なく、記録間隔ごとに記録する)
+@st.cache_resource
+def start_price_recorder():
+    def run():
+        # numpy を読み込む価格履歴ストアの作成はこのスレッドで行う (最初のリランを重くしない)
+        price_history = get_price_history()
+        while True:
+            try:
+                record_price_snapshot(price_history)
+            except Exception:
+                logging.getLogger(__name__).exception("failed to record price history")
+            time.sleep(max(1, min(price_history.min_interval, 60)))
+
+    thread = threading.Thread(target=run, name="price-history", daemon=True)
+    thread.start()
+    return thread
+
+start_price_recorder()
 
 # --- サイドバー設定 ---
 st.sidebar.title(t("settings"))
@@ -105,6 +119,10 @@ if lang_option == "日本語":
 else:
     st.session_state.lang_code = 'en'
 
+# 現在の言語の翻訳テーブル (リラン毎に1度だけ解決)
+tr = get_translations(st.session_state.lang_code)
+lang = st.session_state.lang_code
+
 # 機能選択
 feature_keys = ["ammo", "price", "task", "craft"]
 feature_names = [t(f"features")[k] for k in feature_keys]
@@ -114,6 +132,59 @@ current_feature_name = st.sidebar.selectbox(t("select_feature"), feature_names)
 # 選択された機能のキーを特定
 current_feature = feature_keys[feature_names.index(current_feature_name)]
 
+if rerun_profile:
+    rerun_profile.context.update(feature=current_feature, lang=lang)
+
+# 選択中の機能で使うデータセットを先読み (ボタンを押す前に取得を始めておく)
+prefetch(current_feature, lang)
+
+# 検索結果の1ページあたりの表示件数
+page_size = st.sidebar.select_slider(t("page_size"), options=PAGE_SIZE_OPTIONS, value=DEFAULT_PAGE_SIZE)
+
+# サイドバー: ウォッチリスト
+# この部分だけを一定間隔で再実行し、最新の価格でアラートを評価して自分宛ての通知を表示する
+@st.fragment(run_every=ALERT_POLL_SECONDS)
+def watchlist():
+    engine = get_alert_engine()
+    user = st.session_state.alert_user
+    rules = engine.rules(user)
+    if not rules:
+        return
+    # 評価は市場データが更新されたときに1度だけ、価格が変わったウォッチ対象のアイテムについてのみ行われる
+    market = get_market(priority=Priority.BACKGROUND)
+    engine.update_market(market)
+
+    loc = get_localization(lang)
+    price_fmt = tr.formatter("price_format")
+    for alert in engine.drain(user):
+        st.toast(t(f"alert_fired_{alert.rule.direction}", loc.item_name(alert.rule.item_id),
+                   price_fmt(alert.price), price_fmt(alert.rule.threshold)))
+
+    st.markdown(f"**{t('watchlist')}**")
+    for rule in rules:
+        current = (market.get(rule.item_id) or {}).get('avg24hPrice')
+        col1, col2 = st.columns([4, 1])
+        col1.caption(f"{loc.item_name(rule.item_id)} {'≤' if rule.direction == BELOW else '≥'} "
+                     f"{price_fmt(rule.threshold)} ({price_fmt(current) if current else tr('not_sold')})")
+        if col2.button("✕", key=f"alert_remove_{rule.rule_id}"):
+            engine.remove_rule(user, rule.rule_id)
+            st.rerun(scope="fragment")
+
+# 表示位置だけ先に確保し、各タブでの登録を反映するためスクリプトの最後に描画する
+watchlist_container = st.sidebar.container()
+
+# ヘルパー: 結果をページ分割し、表示中のページだけを構築する
+# (build を渡した場合のみ構築結果をキャッシュし、次のページを先行構築する)
+def show_page(key, signature, items, build=None, version=None):
+    if not items:
+        return []
+    page = select_page(key, len(items), page_size, t("page"), signature)
+    start, end = page_bounds(page, page_size, len(items))
+    st.caption(t("page_range", start + 1, end, len(items)))
+    if build is None:
+        return items[start:end]
+    return build_page(key, signature, items, build, page, page_size, version)
+
 st.sidebar.markdown("---")
 st.sidebar.caption(t("disclaimer"))
 st.sidebar.markdown("[Powered by Tarkov.dev](https://tarkov.dev/)")
@@ -128,8 +199,7 @@ if current_feature == "ammo":
     
     col1, col2 = st.columns([1, 2])
     with col1:
-        calibers = ["5.56x45mm NATO", "5.45x39mm", "7.62x39mm", "7.62x51mm NATO", ".300 Blackout", "12/70", "9x19mm Parabellum"]
-        selected_caliber = st.selectbox(t("ammo_caliber"), calibers)
+        selected_caliber = st.selectbox(t("ammo_caliber"), CALIBERS)
         
         # フィルタオプション
         with st.expander(t("filter_options"), expanded=True):
@@ -143,12 +213,12 @@ if current_feature == "ammo":
         # しかし `categoryNames: Ammo` での検索なので、caliber が英語表記ならOK。
         # API側のcaliber名は英語表記（例: "5.56x45mm NATO"）で一致させるのが無難。
         
-        query_caliber = selected_caliber.replace(" NATO", "") # 念のため
-        query = get_ammo_query(query_caliber, lang=st.session_state.lang_code)
-        data = TarkovClient.run_query(query)
+        query = get_ammo_query(ammo_query_caliber(selected_caliber))
+        data = fetch(query)
+        loc = get_localization(lang)
         
         if data and data.get('items'):
-            items = []
+            names, damages, pens, frags, prices = [], [], [], [], []
             for item in data['items']:
                 props = item.get('properties') or {}
                 damage = props.get('damage', 0)
@@ -159,32 +229,76 @@ if current_feature == "ammo":
                 if damage < min_dmg or pen < min_pen:
                     continue
                 
-                price = calculate_price(item)
-                
-                if price is not None:
-                    formatted_price = t("price_format").format(price)
-                else:
-                    formatted_price = t("not_sold")
-
-                items.append({
-                    t("col_name"): item.get('name'), # lang指定により翻訳された名前
-                    t("col_damage"): damage,
-                    t("col_pen"): pen,
-                    t("col_frag"): f"{frag*100:.0f}%",
-                    t("col_price"): formatted_price,
-                    '_sorting_pen': pen # ソート用の隠し列
-                })
+                names.append(loc.item_name(item['id'])) # 名前テーブルから現在の言語の名前を結合
+                damages.append(damage)
+                pens.append(pen)
+                frags.append(frag)
+                prices.append(calculate_price(item))
             
-            if items:
-                df = pd.DataFrame(items)
-                df = df.sort_values(by='_sorting_pen', ascending=False)
-                df = df.drop(columns=['_sorting_pen'])
-                st.dataframe(df, use_container_width=True)
+            if names:
+                # 列ラベルはテーブル毎に1度だけ解決
+                col_name, col_damage, col_pen, col_frag, col_price = tr.labels(
+                    "col_name", "col_damage", "col_pen", "col_frag", "col_price")
+                columns = [
+                    Column("name", col_name),
+                    Column("damage", col_damage, "int"),
+                    Column("pen", col_pen, "int"),
+                    Column("frag", col_frag, "percent", "%.0f%%"),
+                    Column("price", col_price, "price", unit=tr("price_unit")),
+                ]
+                df = build_table(columns, {
+                    "name": names,
+                    "damage": damages,
+                    "pen": pens,
+                    "frag": frags,
+                    "price": prices,
+                }, sort_by="pen")
+                render_table(df, columns)
             else:
                 st.warning(t("no_data"))
         else:
             st.warning(t("no_data"))
 
+    # 貫通マトリクス (全弾薬 x アーマークラス x 耐久度)
+    # 計算は弾薬データの更新時のみで、絞り込みは計算済みの配列を切り出すだけ
+    st.subheader(t("penetration_matrix"))
+    matrix = get_penetration_matrix()
+    show_freshness(get_ammo_query())
+    if matrix is None or not len(matrix):
+        st.warning(t("no_data"))
+    else:
+        import altair as alt
+        from ballistics import DURABILITY_LEVELS, METRICS, TARGET_HP, heatmap_frame
+
+        mcol1, mcol2, mcol3 = st.columns(3)
+        with mcol1:
+            matrix_caliber = st.selectbox(t("matrix_caliber"), matrix.caliber_options(), key="matrix_caliber",
+                                          format_func=lambda c: c.replace("Caliber", "", 1))
+        with mcol2:
+            durability = st.select_slider(t("armor_durability"), options=DURABILITY_LEVELS.tolist(), value=100,
+                                          format_func=lambda d: f"{d}%", key="matrix_durability")
+        with mcol3:
+            metric = st.radio(t("matrix_metric"), METRICS, format_func=lambda m: t(f"metric_{m}"), horizontal=True)
+
+        rows = matrix.select(matrix_caliber, min_pen, min_dmg)
+        if len(rows):
+            loc = get_localization(lang)
+            frame = heatmap_frame(matrix, rows, durability, metric, [loc.item_name(matrix.ids[i]) for i in rows])
+            # 貫通確率は高いほど、弾数・費用は低いほど良い (緑)
+            color = alt.Color("value:Q", title=t(f"metric_{metric}"),
+                              scale=alt.Scale(scheme="redyellowgreen", reverse=metric != "chance"))
+            base = alt.Chart(frame).encode(
+                x=alt.X("armor_class:O", title=t("armor_class")),
+                y=alt.Y("ammo:N", sort=None, title=None),
+            )
+            cells = base.mark_rect().encode(color=color, tooltip=["ammo", "armor_class", alt.Tooltip("value:Q", format=",.0f")])
+            labels = base.mark_text(fontSize=11).encode(text=alt.Text("value:Q", format=",.0f")).transform_filter(
+                "isValid(datum.value)")
+            st.altair_chart((cells + labels).properties(height=max(22 * len(rows), 120)), use_container_width=True)
+            st.caption(t("matrix_note", TARGET_HP))
+        else:
+            st.warning(t("no_data"))
+
 # --- 機能2: アイテム相場検索 (拡張版) ---
 elif current_feature == "price":
     st.header(t(f"features")["price"])
@@ -195,31 +309,44 @@ elif current_feature == "price":
         "barter": t("search_mode_barter"),
         "ammo": t("search_mode_ammo"),
         "meds": t("search_mode_meds"),
-        "task_item": t("search_mode_task_item")
+        "task_item": t("search_mode_task_item"),
+        "valuation": t("search_mode_valuation")
     }
     mode_key = st.radio(t("search_mode_label"), list(search_modes.keys()), format_func=lambda x: search_modes[x], horizontal=True)
 
     # タスク名マップをロード (キャッシュ活用)
-    task_map = get_task_name_map(st.session_state.lang_code)
+    task_map = get_task_name_map(lang)
+    loc = get_localization(lang)
 
     # 1. キーワード検索
     if mode_key == "keyword":
         search_term = st.text_input(t("search_item_placeholder"))
+        history_ranges = {"24h": 86400, "7d": 7 * 86400, "30d": 30 * 86400, "1y": 365 * 86400}
+        history_range = st.radio(t("history_range"), list(history_ranges.keys()), index=1, horizontal=True)
         if search_term:
-            query = get_item_price_query(search_term, lang=st.session_state.lang_code)
-            data = TarkovClient.run_query(query)
+            # 名前テーブルをローカルで検索し、全アイテムの価格データから結合する
+            market = get_market()
+            show_freshness(get_items_query())
+            items = [market[item_id] for item_id in search_items(search_term, lang) if item_id in market]
             
-            if data and data.get('items'):
-                for item in data['items']:
-                    info = get_price_info(item, task_map)
-                    flea_disp = t("price_format").format(info['flea_price']) if info['flea_price'] else t("not_sold")
+            if items:
+                price_fmt = tr.formatter("price_format")
+
+                # 価格情報の計算は表示中のページ分のみ (次ページはバックグラウンドで先行計算)
+                def build_price_rows(chunk):
+                    return [(item, get_price_info(item, task_map, tr, loc)) for item in chunk]
+
+                signature = (search_term, lang)
+                version = data_version(get_items_query(), get_tasks_query(), get_localization_query(lang))
+                for item, info in show_page("keyword", signature, items, build_price_rows, version):
+                    flea_disp = price_fmt(info['flea_price']) if info['flea_price'] else tr("not_sold")
                     
                     trader_str = "-"
                     if info['trader']:
                         req = f" ({info['trader']['req']})" if info['trader']['req'] else ""
-                        trader_str = f"{info['trader']['name']}{req}: {t('price_format').format(info['trader']['price'])}"
+                        trader_str = f"{info['trader']['name']}{req}: {price_fmt(info['trader']['price'])}"
 
-                    with st.expander(f"{item['name']}"):
+                    with st.expander(f"{loc.item_name(item['id'])}"):
                         col1, col2 = st.columns(2)
                         with col1:
                             st.metric(t("flea_price"), flea_disp)
@@ -229,17 +356,47 @@ elif current_feature == "price":
                             st.write(f"**{t('col_trader')}**")
                             st.write(trader_str)
                             
-                            sell_for = item.get('sellFor', [])
-                            valid_sells = [x for x in sell_for if x.get('price') is not None]
-                            
-                            if valid_sells:
-                                best_sell = max(valid_sells, key=lambda x: x['price'])
-                                price_val = best_sell['price']
-                                vendor_name = best_sell['vendor']['name']
+                            sell = best_sell(item)
+                            if sell:
+                                price_val = sell['price']
+                                vendor_name = loc.trader_name(sell['vendor'])
                                 
                                 st.write(f"---")
                                 st.write(f"{t('sell_recommend')}: **{vendor_name}**")
-                                st.write(f"{t('buy_price')}: {t('price_format').format(price_val)}")
+                                st.write(f"{tr('buy_price')}: {price_fmt(price_val)}")
+
+                        # 価格アラートの登録 (フリマ平均価格が閾値を跨いだらサイドバーに通知)
+                        with st.form(key=f"alert_form_{item['id']}", border=False):
+                            acol1, acol2, acol3 = st.columns([2, 2, 1], vertical_alignment="bottom")
+                            direction = acol1.radio(t("alert_direction"), DIRECTIONS,
+                                                    format_func=lambda d: t(f"alert_{d}"), horizontal=True)
+                            threshold = acol2.number_input(t("alert_threshold"), min_value=0,
+                                                           value=int(item.get('avg24hPrice') or 0), step=1000)
+                            if acol3.form_submit_button(t("alert_add")):
+                                engine = get_alert_engine()
+                                try:
+                                    engine.add_rule(st.session_state.alert_user, item['id'], direction, threshold,
+                                                    price=item.get('avg24hPrice'))
+                                    st.success(t("alert_added"))
+                                except ValueError:
+                                    if len(engine.rules(st.session_state.alert_user)) >= MAX_RULES_PER_USER:
+                                        st.error(t("alert_limit", MAX_RULES_PER_USER))
+                                    else:
+                                        st.error(t("alert_full"))
+
+                        # 価格推移 (履歴ストアから期間指定・間引き済みで取得)
+                        history_ts, history_prices = get_price_history().series(
+                            item['id'], start=int(time.time()) - history_ranges[history_range], max_points=300)
+                        if len(history_ts) >= 2:
+                            import pandas as pd
+                            from history import moving_average
+
+                            st.write(f"**{tr('price_history')}**")
+                            chart = pd.DataFrame({
+                                tr("flea_price"): history_prices,
+                                tr("moving_average"): moving_average(history_prices, 12),
+                            }, index=pd.to_datetime(history_ts, unit="s"))
+                            st.line_chart(chart)
             else:
                 st.info(t("no_data"))
 
@@ -248,21 +405,22 @@ elif current_feature == "price":
         search_term = st.text_input(t("search_item_placeholder"), key="barter_search")
         if search_term:
             with st.spinner(t("calculating")):
-                query = get_barter_items_query(search_term, lang=st.session_state.lang_code)
-                data = TarkovClient.run_query(query)
+                # 名前テーブルをローカルで検索し、バーターの索引から結合する
+                barters_for, barters_using = get_barter_index()
+                show_freshness(get_barters_query())
+                market = get_market()
+                item_ids = search_items(search_term, lang)
                 
-                if data and data.get('items'):
-                    has_result = False
-                    for item in data['items']:
-                        b_for = item.get('bartersFor', [])
-                        b_using = item.get('bartersUsing', [])
+                if item_ids:
+                    # 両方ない場合はスキップ
+                    barter_items = [item_id for item_id in item_ids if item_id in barters_for or item_id in barters_using]
+                    signature = (search_term, lang)
+                    for item_id in show_page("barter", signature, barter_items):
+                        b_for = barters_for.get(item_id, [])
+                        b_using = barters_using.get(item_id, [])
+                        item = market.get(item_id, {})
                         
-                        # 両方ない場合はスキップ
-                        if not b_for and not b_using:
-                            continue
-                        
-                        has_result = True
-                        with st.expander(f"{item['name']}", expanded=True):
+                        with st.expander(f"{loc.item_name(item_id)}", expanded=True):
                             col1, col2 = st.columns(2)
                             
                             # Get via Barter
@@ -273,10 +431,10 @@ elif current_feature == "price":
                                         reqs = []
                                         for r in b['requiredItems']:
                                             # アイテム名が無い場合のハンドリング（APIバグ回避）
-                                            r_name = r['item']['name'] if r.get('item') else "Unknown"
+                                            r_name = loc.item_name(r['item']['id']) if r.get('item') else "Unknown"
                                             reqs.append(f"{r_name} x{r['count']}")
                                         req_str = " + ".join(reqs)
-                                        st.markdown(f"**{b['trader']['name']}** (LL{b['level']})")
+                                        st.markdown(f"**{loc.trader_name(b['trader'])}** (LL{b['level']})")
                                         st.caption(f"Cost: {req_str}")
                                         st.divider()
                                 else:
@@ -289,10 +447,10 @@ elif current_feature == "price":
                                     for b in b_using:
                                         rews = []
                                         for r in b['rewardItems']:
-                                            r_name = r['item']['name'] if r.get('item') else "Unknown"
+                                            r_name = loc.item_name(r['item']['id']) if r.get('item') else "Unknown"
                                             rews.append(f"{r_name} x{r['count']}")
                                         rew_str = " + ".join(rews)
-                                        st.markdown(f"**{b['trader']['name']}** (LL{b['level']})")
+                                        st.markdown(f"**{loc.trader_name(b['trader'])}** (LL{b['level']})")
                                         st.caption(f"Get: {rew_str}")
                                         st.divider()
                                 else:
@@ -301,23 +459,23 @@ elif current_feature == "price":
                             if item.get('link'):
                                 st.markdown(f"[{t('wiki_link')}]({item['link']})")
                     
-                    if not has_result:
+                    if not barter_items:
                          st.info(t("no_data") + " (No barter info)")
                 else:
                     st.warning(t("no_data"))
 
     # 2. カテゴリ検索 (弾薬 / 医薬品)
     elif mode_key in ["ammo", "meds"]:
-        cats = ["Ammo"] if mode_key == "ammo" else ["Meds"]
+        cats = CATEGORY_MODES[mode_key]
         if st.button(t("get_data")):
             with st.spinner(t("calculating")):
-                query = get_items_by_category_query(cats, lang=st.session_state.lang_code)
-                data = TarkovClient.run_query(query)
+                query = get_items_by_category_query(cats)
+                data = fetch(query)
                 
                 if data and data.get('items'):
-                    rows = []
+                    names, flea_prices, trader_disps, trader_prices = [], [], [], []
                     for item in data['items']:
-                        info = get_price_info(item, task_map)
+                        info = get_price_info(item, task_map, tr, loc)
                         
                         trader_disp = "-"
                         trader_price = 0
@@ -326,18 +484,28 @@ elif current_feature == "price":
                             trader_disp = f"{info['trader']['name']}{req}"
                             trader_price = info['trader']['price']
                         
-                        rows.append({
-                            t("col_name"): item['name'],
-                            t("col_price"): info['flea_price'] if info['flea_price'] else 0, # ソート用(Flea)
-                            t("flea_price"): t("price_format").format(info['flea_price']) if info['flea_price'] else t("not_sold"),
-                            t("col_trader"): trader_disp,
-                            t("col_trader_price"): t("price_format").format(trader_price) if trader_price else "-"
-                        })
+                        names.append(loc.item_name(item['id']))
+                        flea_prices.append(info['flea_price'] or None)
+                        trader_disps.append(trader_disp)
+                        trader_prices.append(trader_price or None)
                     
-                    df = pd.DataFrame(rows)
-                    # 価格が高い順にソート
-                    df = df.sort_values(by=t("col_price"), ascending=False)
-                    st.dataframe(df[[t("col_name"), t("flea_price"), t("col_trader"), t("col_trader_price")]], use_container_width=True)
+                    col_name, col_flea, col_trader, col_trader_price = tr.labels(
+                        "col_name", "flea_price", "col_trader", "col_trader_price")
+                    price_unit = tr("price_unit")
+                    columns = [
+                        Column("name", col_name),
+                        Column("flea", col_flea, "price", unit=price_unit),
+                        Column("trader", col_trader, "category"),
+                        Column("trader_price", col_trader_price, "price", unit=price_unit),
+                    ]
+                    # 価格が高い順にソート (Flea)
+                    df = build_table(columns, {
+                        "name": names,
+                        "flea": flea_prices,
+                        "trader": trader_disps,
+                        "trader_price": trader_prices,
+                    }, sort_by="flea")
+                    render_table(df, columns)
                 else:
                     st.warning(t("no_data"))
 
@@ -346,64 +514,115 @@ elif current_feature == "price":
         st.info("※読み込みに数秒かかる場合があります。")
         if st.button(t("get_data")):
             with st.spinner(t("calculating")):
-                query = get_task_items_query(lang=st.session_state.lang_code)
-                data = TarkovClient.run_query(query)
+                tasks = get_tasks()
+                show_freshness(get_tasks_query())
+                market = get_market()
                 
-                if data and data.get('tasks'):
-                    item_map = {}
-                    
-                    for task in data['tasks']:
-                        for obj in task.get('objectives', []):
-                            # TaskObjectiveItem 以外は item キーがない場合がある
-                            item = obj.get('item')
-                            if not item:
-                                continue
-                            
-                            i_name = item['name']
-                            if i_name not in item_map:
-                                item_map[i_name] = {
-                                    'obj': item,
-                                    'total_count': 0,
-                                    'fir_count': 0,
-                                    'tasks': set(),
-                                    'task_traders': set()
-                                }
-                            
-                            count = obj.get('count', 1)
-                            item_map[i_name]['total_count'] += count
-                            if obj.get('foundInRaid'):
-                                item_map[i_name]['fir_count'] += count
-                            item_map[i_name]['tasks'].add(task['name'])
-                            item_map[i_name]['task_traders'].add(task['trader']['name'])
-                    
-                    rows = []
-                    for name, item_entry in item_map.items():
-                        obj = item_entry['obj']
-                        info = get_price_info(obj, task_map)
-                        
+                if tasks:
+                    price_fmt = tr.formatter("price_format")
+                    names, task_traders, counts, fir_counts, flea_prices, trader_disps = [], [], [], [], [], []
+                    for row in iter_task_items(tasks, market, loc, task_map, tr):
                         trader_disp = "-"
-                        if info['trader']:
-                            req = f" ({info['trader']['req']})" if info['trader']['req'] else ""
-                            trader_disp = f"{info['trader']['name']}{req}: {t('price_format').format(info['trader']['price'])}"
-
-                        rows.append({
-                            t("col_name"): name,
-                            t("col_task_trader"): ", ".join(sorted(item_entry['task_traders'])),
-                            t("task_item_count"): item_entry['total_count'],
-                            t("task_item_fir"): item_entry['fir_count'],
-                            t("col_price"): info['flea_price'] if info['flea_price'] else 0,
-                            t("flea_price"): t("price_format").format(info['flea_price']) if info['flea_price'] else t("not_sold"),
-                            t("col_trader"): trader_disp
-                        })
+                        if row['trader']:
+                            req = f" ({row['trader_requirements']})" if row['trader_requirements'] else ""
+                            trader_disp = f"{row['trader']}{req}: {price_fmt(row['trader_price'])}"
+
+                        names.append(row['name'])
+                        task_traders.append(row['task_traders'])
+                        counts.append(row['total_count'])
+                        fir_counts.append(row['fir_count'])
+                        flea_prices.append(row['flea_price'])
+                        trader_disps.append(trader_disp)
                         
-                    if rows:
-                        df = pd.DataFrame(rows)
+                    if names:
+                        col_name, col_task_trader, col_count, col_fir, col_flea, col_trader = tr.labels(
+                            "col_name", "col_task_trader", "task_item_count", "task_item_fir", "flea_price", "col_trader")
+                        columns = [
+                            Column("name", col_name),
+                            Column("task_traders", col_task_trader, "category"),
+                            Column("count", col_count, "int"),
+                            Column("fir", col_fir, "int"),
+                            Column("flea", col_flea, "price", unit=tr("price_unit")),
+                            Column("trader", col_trader),
+                        ]
                         # タスク使用数が多い順 -> 価格順
-                        df = df.sort_values(by=[t("task_item_count"), t("col_price")], ascending=[False, False])
-                        st.dataframe(df[[t("col_name"), t("col_task_trader"), t("task_item_count"), t("task_item_fir"), t("flea_price"), t("col_trader")]], use_container_width=True)
+                        df = build_table(columns, {
+                            "name": names,
+                            "task_traders": task_traders,
+                            "count": counts,
+                            "fir": fir_counts,
+                            "flea": flea_prices,
+                            "trader": trader_disps,
+                        }, sort_by=["count", "flea"], ascending=[False, False])
+                        render_table(df, columns)
                     else:
                         st.warning(t("no_data"))
 
+    # 5. 一括査定 (アイテム一覧を貼り付け / アップロード)
+    elif mode_key == "valuation":
+        st.caption(t("valuation_help"))
+        pasted = st.text_area(t("valuation_input"), height=200)
+        uploaded = st.file_uploader(t("valuation_upload"), type=["txt", "csv"])
+        text = pasted
+        if uploaded is not None:
+            text += "\n" + uploaded.getvalue().decode("utf-8", errors="replace")
+
+        if text.strip():
+            # 名前の解決と価格の参照はローカルの索引と価格表のみ (アイテムごとのAPIリクエストはしない)
+            table = get_sale_table()
+            show_freshness(get_items_query())
+            if table is None:
+                st.warning(t("no_data"))
+            else:
+                from valuation import appraise
+
+                channel_names = [loc.trader_name(vendor) for vendor in table.channels]
+                excluded = set(st.multiselect(t("valuation_exclude"), channel_names))
+                result = appraise(text.splitlines(), get_name_index(lang), table,
+                                  [name not in excluded for name in channel_names])
+                price_fmt = tr.formatter("price_format")
+                st.metric(t("valuation_total"), price_fmt(result.grand_total))
+
+                col_channel, col_count, col_unit, col_total, col_name = tr.labels(
+                    "col_channel", "col_count", "col_unit_price", "col_total", "col_name")
+                # 売却先ごとの合計
+                used = [i for i in range(len(channel_names)) if result.channel_counts[i]]
+                if used:
+                    columns = [
+                        Column("channel", col_channel),
+                        Column("count", col_count, "int"),
+                        Column("total", col_total, "price", unit=tr("price_unit")),
+                    ]
+                    df = build_table(columns, {
+                        "channel": [channel_names[i] for i in used],
+                        "count": result.channel_counts[used],
+                        "total": result.channel_totals[used],
+                    }, sort_by="total")
+                    render_table(df, columns)
+
+                # アイテムごとの売却先
+                if result.item_ids:
+                    columns = [
+                        Column("name", col_name),
+                        Column("count", col_count, "int"),
+                        Column("channel", col_channel, "category"),
+                        Column("unit", col_unit, "price", unit=tr("price_unit")),
+                        Column("total", col_total, "price", unit=tr("price_unit")),
+                    ]
+                    sold = result.channel >= 0
+                    df = build_table(columns, {
+                        "name": [loc.item_name(item_id) for item_id in result.item_ids],
+                        "count": result.counts,
+                        "channel": [channel_names[c] if c >= 0 else tr("not_sold") for c in result.channel],
+                        "unit": [p if ok else None for p, ok in zip(result.unit_price.tolist(), sold)],
+                        "total": [p if ok else None for p, ok in zip(result.total.tolist(), sold)],
+                    }, sort_by="total")
+                    render_table(df, columns)
+
+                if result.unresolved:
+                    with st.expander(t("valuation_unresolved", len(result.unresolved))):
+                        st.text("\n".join(result.unresolved))
+
 # --- 機能3: タスク検索 ---
 elif current_feature == "task":
     st.header(t(f"features")["task"])
@@ -421,14 +640,23 @@ elif current_feature == "task":
             max_level = st.slider(t("level_filter", 50), 1, 70, 40)
             
             search_task_item = st.text_input(t("item_filter"))
+
+            kappa_only = st.checkbox(t("kappa_only"))
     
+    # ページ切り替えのリラン後も結果を表示し続ける
     if st.button(t("get_data")):
-        query = get_tasks_query(target_trader, lang=st.session_state.lang_code)
-        data = TarkovClient.run_query(query)
+        st.session_state.task_loaded = True
+
+    if st.session_state.get("task_loaded"):
+        # 一覧と依存関係グラフは同じ応答から作る (間に再検証で応答が替わっても食い違わない)
+        graph = get_task_graph()
+        all_tasks = graph.tasks
+        show_freshness(get_tasks_query())
+        loc = get_localization(lang)
         
-        if data and data.get('tasks'):
+        if all_tasks:
             tasks = []
-            for t_obj in data['tasks']:
+            for t_obj in all_tasks:
                 # トレーダーフィルタ (normalizedNameを使用)
                 if t_obj['trader']['normalizedName'] != normalize_name(target_trader):
                     continue
@@ -436,7 +664,7 @@ elif current_feature == "task":
                 # マップフィルタ
                 task_map = t_obj.get('map')
                 map_name = task_map['name'] if task_map else "Any"
-                if selected_maps:     
+                if selected_maps:
                    if map_name not in selected_maps and "Any" not in selected_maps:
                        continue
                 
@@ -444,37 +672,83 @@ elif current_feature == "task":
                 min_level = t_obj.get('minPlayerLevel') or 0
                 if min_level > max_level:
                     continue
+
+                # Kappa フィルタ (Kappa に必要なタスクとその前提タスク)
+                if kappa_only and not graph.is_kappa_relevant(t_obj['id']):
+                    continue
                 
                 # テキストフィルタ (アイテム名などを想定して全テキスト検索)
                 if search_task_item:
                     search_lower = search_task_item.lower()
-                    name_match = search_lower in t_obj['name'].lower()
-                    desc_match = False
-                    for obj in t_obj.get('objectives', []):
-                         if search_lower in obj.get('description', '').lower():
-                             desc_match = True
-                             break
+                    name_match = search_lower in loc.task_name(t_obj['id']).lower()
+                    desc_match = any(search_lower in loc.objective(obj['id']).lower() for obj in t_obj.get('objectives', []))
                     if not (name_match or desc_match):
                         continue
                 
-                tasks.append({
-                    'name': t_obj['name'],
-                    'map': map_name,
-                    'objectives': t_obj.get('objectives', []),
-                    'wikiLink': t_obj.get('wikiLink')
-                })
+                tasks.append(t_obj)
+
+            # 表示用の行 (説明文や前提・解放タスク) は表示中のページ分だけ作る
+            def build_task_rows(chunk):
+                rows = []
+                for t_obj in chunk:
+                    i = graph.index[t_obj['id']]
+                    rows.append({
+                        'id': t_obj['id'],
+                        'name': loc.task_name(t_obj['id']),
+                        'map': loc.map_name(t_obj.get('map')),
+                        'objectives': [loc.objective(obj['id']) for obj in t_obj.get('objectives', [])],
+                        'requires': [loc.task_name(x) for x in graph.task_ids(graph.requires[i])],
+                        'unlocks': [loc.task_name(x) for x in graph.task_ids(graph.unlocks[i])],
+                        'wikiLink': t_obj.get('wikiLink')
+                    })
+                return rows
             
             if not tasks:
                  st.info(t("no_data"))
             else:
-                for task in tasks:
+                signature = (target_trader, tuple(selected_maps), max_level, search_task_item, kappa_only, lang)
+                version = data_version(get_tasks_query(), get_localization_query(lang))
+                for task in show_page("task", signature, tasks, build_task_rows, version):
                     with st.expander(f"{task['name']} ({task['map']})"):
                         st.markdown(f"**{t('task_objective')}:**")
-                        for obj in task['objectives']:
-                            st.write(f"- {obj.get('description')}")
-                        
+                        for desc in task['objectives']:
+                            st.write(f"- {desc}")
+
+                        if task['requires']:
+                            st.markdown(f"**{t('task_requires')}:** {', '.join(task['requires'])}")
+                        if task['unlocks']:
+                            st.markdown(f"**{t('task_unlocks')}:** {', '.join(task['unlocks'])}")
+
                         if task['wikiLink']:
                             st.markdown(f"[{t('wiki_link')}]({task['wikiLink']})")
+
+                # 到達計画: 選択したタスクまでの前提タスクと納品アイテムの累計 (事前計算済みの表を引くだけ)
+                st.subheader(t("task_plan"))
+                names = {task['id']: task['name'] for task in tasks}
+                plan_id = st.selectbox(t("task_plan_target"), list(names), format_func=names.get)
+                i = graph.index[plan_id]
+                chain = graph.task_ids(graph.ancestors[i])
+                st.caption(t("task_plan_summary", len(chain), len(graph.task_ids(graph.descendants[i]))))
+                if chain:
+                    st.write(" → ".join(loc.task_name(x) for x in chain + [plan_id]))
+
+                include_self = st.checkbox(t("task_plan_include_self"), value=True)
+                demand = (graph.complete_demand if include_self else graph.unlock_demand)[i]
+                if demand:
+                    col_name, col_count, col_fir = tr.labels("col_name", "task_item_count", "task_item_fir")
+                    columns = [
+                        Column("name", col_name),
+                        Column("count", col_count, "int"),
+                        Column("fir", col_fir, "int"),
+                    ]
+                    df = build_table(columns, {
+                        "name": [loc.item_name(item_id) for item_id in demand],
+                        "count": [count for count, _ in demand.values()],
+                        "fir": [fir for _, fir in demand.values()],
+                    }, sort_by="count")
+                    render_table(df, columns)
+                else:
+                    st.info(t("task_plan_no_items"))
         else:
              st.warning(t("no_data"))
 
@@ -502,95 +776,61 @@ elif current_feature == "craft":
     
     if st.button(t("calculate")):
         with st.spinner(t("calculating")):
-            query = get_all_crafts_query(lang=st.session_state.lang_code)
-            data = TarkovClient.run_query(query)
+            crafts = get_crafts()
+            show_freshness(get_all_crafts_query())
+            market = get_market()
+            loc = get_localization(lang)
             
-            if data and data.get('crafts'):
-                results = []
+            if crafts:
+                products, materials, revenues, costs, profits, durations, hourlies = [], [], [], [], [], [], []
                 
-                for craft in data['crafts']:
-                    # ステーションフィルタ (normalizedNameを使用)
-                    if craft['station']['normalizedName'] != normalize_name(target_station):
-                        continue
-                    
-                    # レベルフィルタ
-                    level = craft.get('level') or 0
-                    if level > max_station_level:
-                        continue
-                        
-                    # 報酬（完成品）計算
-                    total_revenue = 0
-                    reward_names = []
-                    reward_search_str = ""
-                    
-                    for reward in craft.get('rewardItems', []):
-                        item = reward['item']
-                        count = reward['count']
-                        price = calculate_price(item) or 0
-                        total_revenue += price * count
-                        reward_names.append(f"{item['name']} x{count}")
-                        reward_search_str += item['name'] + " "
-                        
-                    # アイテム名フィルタ
-                    if filter_item_name:
-                         if filter_item_name.lower() not in reward_search_str.lower():
-                             continue
-                        
-                    # コスト（材料）計算
-                    total_cost = 0
-                    required_names = []
-                    
-                    for req in craft.get('requiredItems', []):
-                        item = req['item']
-                        count = req['count']
-                        price = calculate_price(item) or 0
-                        total_cost += price * count
-                        required_names.append(f"{item['name']} x{count}")
-                        
-                    profit = total_revenue - total_cost
-                    
-                    # 赤字除外
-                    if exclude_loss and profit < 0:
-                        continue
-                    
-                    duration_sec = craft.get('duration') or 1
-                    profit_per_hour = (profit / duration_sec) * 3600
-                    
-                    results.append({
-                        t("col_product"): ", ".join(reward_names),
-                        t("col_material"): ", ".join(required_names),
-                        t("col_revenue"): f"{int(total_revenue):,}", # 表示用
-                        t("col_cost"): f"{int(total_cost):,}",
-                        t("col_profit"): int(profit), # ソート用兼表示用
-                        t("col_time"): f"{duration_sec / 60:.0f} min",
-                        t("col_profit_per_hour"): int(profit_per_hour),
-                        
-                        # ソート用数値
-                        '_sort_profit': profit,
-                        '_sort_hourly': profit_per_hour,
-                        '_sort_time': duration_sec
-                    })
+                for row in iter_craft_profits(crafts, market, loc, target_station, max_station_level,
+                                              filter_item_name, exclude_loss):
+                    products.append(row['product'])
+                    materials.append(row['materials'])
+                    revenues.append(row['revenue'])
+                    costs.append(row['cost'])
+                    profits.append(row['profit'])
+                    durations.append(row['duration_sec'] / 60)
+                    hourlies.append(row['profit_per_hour'])
                 
-                if results:
-                    df = pd.DataFrame(results)
+                if products:
+                    col_product, col_material, col_revenue, col_cost, col_profit, col_time, col_hourly = tr.labels(
+                        "col_product", "col_material", "col_revenue", "col_cost", "col_profit", "col_time", "col_profit_per_hour")
+                    price_unit = tr("price_unit")
+                    columns = [
+                        Column("product", col_product),
+                        Column("material", col_material),
+                        Column("revenue", col_revenue, "price", unit=price_unit),
+                        Column("cost", col_cost, "price", unit=price_unit),
+                        Column("profit", col_profit, "price", unit=price_unit),
+                        Column("time", col_time, "float", "%.0f min"),
+                        Column("hourly", col_hourly, "price", unit=tr("hourly_unit")),
+                    ]
                     
-                    # ソート適用
-                    if sort_by == "profit":
-                        df = df.sort_values(by='_sort_profit', ascending=False)
-                    elif sort_by == "hourly":
-                        df = df.sort_values(by='_sort_hourly', ascending=False)
-                    elif sort_by == "time":
-                        df = df.sort_values(by='_sort_time', ascending=True)
-                        
-                    # 表示用カラムの整形（数値カラムにフォーマット適用）
-                    df[t("col_profit")] = df['_sort_profit'].apply(lambda x: f"{int(x):,} ₽")
-                    df[t("col_profit_per_hour")] = df['_sort_hourly'].apply(lambda x: f"{int(x):,} ₽/h")
+                    # ソート適用 (数値列のまま)
+                    df = build_table(columns, {
+                        "product": products,
+                        "material": materials,
+                        "revenue": revenues,
+                        "cost": costs,
+                        "profit": profits,
+                        "time": durations,
+                        "hourly": hourlies,
+                    }, sort_by=sort_by, ascending=(sort_by == "time"))
 
-                    # 不要なカラムを削除
-                    display_cols = [t("col_product"), t("col_material"), t("col_revenue"), t("col_cost"), t("col_profit"), t("col_time"), t("col_profit_per_hour")]
                     st.write(f"**{target_station}** (Lv.{max_station_level})")
-                    st.dataframe(df[display_cols], use_container_width=True)
+                    render_table(df, columns)
                 else:
                     st.info(t("no_data"))
             else:
                  st.warning(t("no_data"))
+
+# --- ウォッチリスト (サイドバー) ---
+with watchlist_container:
+    watchlist()
+
+# --- プロファイルの保存 (入力値と一緒に保存する) ---
+if rerun_profile:
+    rerun_profile.context["inputs"] = profiling.script_inputs(globals())
+    profiling.finish(rerun_profile)
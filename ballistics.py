@@ -0,0 +1,133 @@
+"""
+弾薬 x アーマークラス x 耐久度 の貫通マトリクス。
+
+全弾薬について、アーマークラス (1-6) と耐久度 (最大値に対する%) の組み合わせごとに
+貫通確率・撃破に必要な弾数・撃破あたりの弾薬費を NumPy 配列 (弾薬, クラス, 耐久度) で一括計算する。
+計算は弾薬データが更新されたときだけ行い (data.get_penetration_matrix)、
+画面側の絞り込みは計算済みの配列を添字で切り出すだけにする。
+
+貫通確率はコミュニティで使われている近似式 (tarkov-ballistics) による。
+撃破弾数は胸部 (TARGET_HP) への命中を前提とした期待値で、
+非貫通時は BLUNT_THROUGHPUT の割合のダメージが通るものとし、耐久度は射撃中に一定とみなす。
+"""
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from pricing import calculate_price
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+ARMOR_CLASSES = np.arange(1, 7)
+# 耐久度 (最大値に対する%)
+DURABILITY_LEVELS = np.array([100, 90, 75, 50, 25])
+# 胸部のHP (ここが0になると死亡)
+TARGET_HP = 85
+# 非貫通時に通るダメージの割合 (防具ごとの値の代表値)
+BLUNT_THROUGHPUT = 0.2
+
+# 表示する指標
+METRICS = ("chance", "shots", "cost")
+
+
+def penetration_chance(penetration: np.ndarray, armor_class: np.ndarray, durability: np.ndarray) -> np.ndarray:
+    """
+    貫通確率 (0.0-1.0) を計算します。引数はブロードキャスト可能な形であればよい。
+
+    Args:
+        penetration (np.ndarray): 弾薬の貫通力。
+        armor_class (np.ndarray): アーマークラス (1-6)。
+        durability (np.ndarray): 耐久度 (最大値に対する%)。
+
+    Returns:
+        np.ndarray: 引数をブロードキャストした形の float32 配列。
+    """
+    pen = np.asarray(penetration, dtype=np.float64)
+    # 耐久度で減衰した実効アーマー値
+    armor = (121 - 5000 / (45 + np.asarray(durability, dtype=np.float64) * 2)) * np.asarray(armor_class) * 10 * 0.01
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chance = np.where(
+            armor >= pen + 15, 0.0,
+            np.where(armor >= pen, 0.4 * (armor - pen - 15) ** 2, 100 + pen / (0.9 * armor - pen)),
+        )
+    return (np.clip(chance, 0, 100) / 100).astype(np.float32)
+
+
+class PenetrationMatrix:
+    """
+    全弾薬の貫通マトリクス。
+
+    Attributes:
+        ids (np.ndarray): 弾薬のアイテムID (行の順)。
+        calibers (np.ndarray): 口径 (APIの caliber, 例: "Caliber556x45NATO")。
+        damage (np.ndarray): 1発 (散弾は1粒) あたりのダメージ。
+        penetration (np.ndarray): 貫通力。
+        projectiles (np.ndarray): 1発あたりの弾頭数 (散弾以外は1)。
+        price (np.ndarray): 1発の評価額 (価格なしは NaN)。
+        chance (np.ndarray): 貫通確率 (弾薬, クラス, 耐久度)。
+        shots (np.ndarray): 撃破に必要な弾数の期待値 (切り上げ, 弾薬, クラス, 耐久度)。
+        cost (np.ndarray): 撃破あたりの弾薬費 (弾薬, クラス, 耐久度, 価格なしは NaN)。
+    """
+    __slots__ = ("ids", "calibers", "damage", "penetration", "projectiles", "price", "chance", "shots", "cost")
+
+    def __init__(self, items: Sequence[Dict[str, Any]]):
+        rows = [(item, item.get('properties') or {}) for item in items]
+        rows = [(item, props) for item, props in rows if props.get('damage')]
+        self.ids = np.array([item['id'] for item, _ in rows], dtype=object)
+        self.calibers = np.array([props.get('caliber') or "" for _, props in rows], dtype=object)
+        self.damage = np.array([props['damage'] for _, props in rows], dtype=np.float32)
+        self.penetration = np.array([props.get('penetrationPower') or 0 for _, props in rows], dtype=np.float32)
+        self.projectiles = np.array([props.get('projectileCount') or 1 for _, props in rows], dtype=np.float32)
+        prices = [calculate_price(item) for item, _ in rows]
+        self.price = np.array([np.nan if p is None else p for p in prices], dtype=np.float64)
+
+        self.chance = penetration_chance(
+            self.penetration[:, None, None], ARMOR_CLASSES[None, :, None], DURABILITY_LEVELS[None, None, :])
+        # 1発あたりの期待ダメージ (散弾は弾頭ごとに判定)
+        expected = (self.damage * self.projectiles)[:, None, None] * (
+            self.chance + (1 - self.chance) * np.float32(BLUNT_THROUGHPUT))
+        self.shots = np.ceil(TARGET_HP / expected).astype(np.float32)
+        self.cost = self.shots * self.price[:, None, None]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def select(self, caliber: Optional[str] = None, min_pen: float = 0, min_dmg: float = 0) -> np.ndarray:
+        """条件に合う弾薬の行番号を貫通力の高い順で返します。"""
+        mask = (self.penetration >= min_pen) & (self.damage >= min_dmg)
+        if caliber:
+            mask &= self.calibers == caliber
+        rows = np.flatnonzero(mask)
+        return rows[np.argsort(-self.penetration[rows], kind="stable")]
+
+    def caliber_options(self) -> List[str]:
+        return sorted({c for c in self.calibers if c})
+
+
+def heatmap_frame(matrix: PenetrationMatrix, rows: np.ndarray, durability: int, metric: str,
+                  names: Sequence[str]) -> "pd.DataFrame":
+    """
+    ヒートマップ用の縦持ちのDataFrameを作成します (計算済みの配列を切り出すだけ)。
+
+    Args:
+        matrix (PenetrationMatrix): 貫通マトリクス。
+        rows (np.ndarray): 表示する弾薬の行番号 (PenetrationMatrix.select の結果)。
+        durability (int): 耐久度 (DURABILITY_LEVELS のいずれか)。
+        metric (str): 表示する指標 (METRICS のいずれか)。
+        names (Sequence[str]): rows に対応する弾薬の表示名。
+
+    Returns:
+        pd.DataFrame: ammo / armor_class / value の3列。
+    """
+    import pandas as pd
+
+    d = int(np.flatnonzero(DURABILITY_LEVELS == durability)[0])
+    values = getattr(matrix, metric)[rows, :, d]
+    if metric == "chance":
+        values = values * 100
+    return pd.DataFrame({
+        "ammo": np.repeat(np.asarray(names, dtype=object), len(ARMOR_CLASSES)),
+        "armor_class": np.tile(ARMOR_CLASSES, len(rows)),
+        "value": values.ravel(),
+    })
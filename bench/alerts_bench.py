@@ -0,0 +1,114 @@
+"""
+価格アラートの評価コストの計測。
+
+合成したルール (既定 10万件) を AlertEngine に登録し、一部のアイテムの価格だけが変わる更新を繰り返して
+1回の更新の評価時間を計測する。比較として全ルールを毎回走査する素朴な実装の時間も表示する。
+
+使い方:
+    python bench/alerts_bench.py [--rules 100000] [--users 10000] [--items 4000] [--changed 0.05] [--rounds 20]
+    python bench/alerts_bench.py --max-ms 5   # 更新1回の p95 が 5ms を超えたら終了コード1
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerts import ABOVE, BELOW, AlertEngine, Rule  # noqa: E402
+
+
+def naive_update(rules: List[Rule], old: Dict[str, int], new: Dict[str, int]) -> int:
+    """全ルールを走査して閾値を跨いだものを数えます (比較用)。"""
+    fired = 0
+    for rule in rules:
+        before, after = old.get(rule.item_id), new.get(rule.item_id)
+        if before is None or after is None or before == after:
+            continue
+        if rule.direction == BELOW and after <= rule.threshold < before:
+            fired += 1
+        elif rule.direction == ABOVE and before < rule.threshold <= after:
+            fired += 1
+    return fired
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="価格アラートの評価コストの計測")
+    parser.add_argument("--rules", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--items", type=int, default=4000)
+    parser.add_argument("--changed", type=float, default=0.05, help="1回の更新で価格が変わるアイテムの割合")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-ms", type=float, help="更新1回の p95 の上限 (ms)")
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    items = [f"item{i}" for i in range(args.items)]
+    prices: Dict[str, int] = {item_id: rnd.randint(5_000, 500_000) for item_id in items}
+
+    engine = AlertEngine(max_rules_per_user=max(1, -(-args.rules // args.users)), queue_size=1000,
+                         max_rules=args.rules)
+    # 人気のアイテムにルールが集中するよう、アイテムの選択に偏りを付ける
+    weights = [1 / (rank + 1) for rank in range(args.items)]
+    targets = rnd.choices(items, weights=weights, k=args.rules)
+    started = time.perf_counter()
+    rules = [
+        engine.add_rule(f"user{n % args.users}", item_id, rnd.choice((BELOW, ABOVE)),
+                        int(prices[item_id] * rnd.uniform(0.7, 1.3)))
+        for n, item_id in enumerate(targets)
+    ]
+    register_s = time.perf_counter() - started
+    watched = engine.watched_items()
+    engine.update({item_id: prices[item_id] for item_id in watched})
+    for n in range(args.users):
+        engine.drain(f"user{n}")
+
+    update_ms: List[float] = []
+    naive_ms: List[float] = []
+    fired_total = 0
+    for _ in range(args.rounds):
+        old = dict(prices)
+        for item_id in rnd.sample(items, int(args.items * args.changed)):
+            prices[item_id] = max(1, int(prices[item_id] * rnd.uniform(0.85, 1.15)))
+        # 画面側と同じく、ウォッチ対象の全アイテムの価格を渡す (変化の検出もエンジン側で行う)
+        snapshot: Dict[str, Optional[int]] = {item_id: prices[item_id] for item_id in watched}
+
+        started = time.perf_counter()
+        fired = engine.update(snapshot)
+        update_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        expected = naive_update(rules, old, prices)
+        naive_ms.append((time.perf_counter() - started) * 1000)
+        if fired != expected:
+            print(f"FAIL: engine fired {fired}, full scan found {expected}")
+            return 1
+        fired_total += fired
+        for n in range(args.users):
+            engine.drain(f"user{n}")
+
+    print(f"rules={len(rules)} users={args.users} items={args.items} watched={len(watched)} "
+          f"changed/round={int(args.items * args.changed)} rounds={args.rounds}")
+    print(f"register: {register_s * 1000:.0f} ms total ({register_s / len(rules) * 1e6:.1f} us/rule)")
+    print(f"alerts fired: {fired_total} ({fired_total / args.rounds:.0f}/round)")
+    print(f"{'':<12}{'median ms':>11}{'p95 ms':>9}")
+    print(f"{'engine':<12}{statistics.median(update_ms):>11.2f}{percentile(update_ms, 0.95):>9.2f}")
+    print(f"{'full scan':<12}{statistics.median(naive_ms):>11.2f}{percentile(naive_ms, 0.95):>9.2f}")
+
+    if args.max_ms is not None and percentile(update_ms, 0.95) > args.max_ms:
+        print(f"FAIL: p95 {percentile(update_ms, 0.95):.2f}ms > {args.max_ms}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+モジュールの読み込み時間の計測 (`python -X importtime` の集計)。
+
+各対象を新しいPythonプロセスで読み込み、-X importtime の出力から累積時間を集計する (中央値)。
+"app" は app.py のトップレベルの import 文だけを実行したもの (画面の描画は含まない) で、
+ワーカー起動時に必ず払うコストにあたる。streamlit 自体の読み込み時間も下限として表示する。
+
+pandas / numpy / requests は使う画面・処理の中で読み込む方針のため、
+"app" の読み込みでこれらが読み込まれた場合は失敗とする (--forbid で変更可)。
+
+使い方:
+    python bench/importtime.py                       # 計測して表示
+    python bench/importtime.py --save bench/importtime_baseline.json
+    python bench/importtime.py --baseline bench/importtime_baseline.json --tolerance 0.3
+    python bench/importtime.py --tree app            # 対象の -X importtime の生の出力 (遅い順)
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 計測対象 (名前 -> 実行するコード)
+MODULES = ("translations", "queries", "api", "data", "taskgraph", "pricing", "tables", "paging", "history", "ballistics",
+           "valuation", "export", "server")
+HEAVY = ("pandas", "numpy", "requests", "pyarrow", "altair")
+DEFAULT_FORBID = ("pandas", "numpy", "requests")
+
+
+def app_imports() -> str:
+    """app.py のトップレベルの import 文だけを取り出したコード。"""
+    with open(os.path.join(REPO_DIR, "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def targets() -> Dict[str, str]:
+    result = {"streamlit": "import streamlit", "app": app_imports()}
+    result.update({name: f"import {name}" for name in MODULES})
+    return result
+
+
+def run_once(code: str) -> Tuple[List[Tuple[int, int, str]], List[str]]:
+    """
+    新しいプロセスで code を実行し、importtime の行と読み込まれた重いモジュールを返します。
+
+    Returns:
+        Tuple[List[Tuple[int, int, str]], List[str]]: ([(自身のμs, 累積μs, インデント付きモジュール名)], 重いモジュール)
+    """
+    probe = f"{code}\nimport sys\nprint(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", probe],
+                          cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    heavy = [m for m in proc.stdout.strip().split(",") if m]
+    return rows, heavy
+
+
+def total_ms(rows: List[Tuple[int, int, str]]) -> float:
+    """トップレベル (インデントなし) のモジュールの累積時間の合計 (ms)。"""
+    return sum(cum for _, cum, name in rows if not name.startswith("  ")) / 1000
+
+
+def measure(repeat: int) -> Dict[str, Dict]:
+    results = {}
+    for name, code in targets().items():
+        times = []
+        heavy: List[str] = []
+        for _ in range(repeat):
+            rows, heavy = run_once(code)
+            times.append(total_ms(rows))
+        results[name] = {"median_ms": round(statistics.median(times), 1), "min_ms": round(min(times), 1), "heavy": heavy}
+    return results
+
+
+def print_tree(name: str, limit: int = 30) -> None:
+    rows, _ = run_once(targets()[name])
+    print(f"{'self ms':>9}{'cum ms':>9}  module")
+    for self_us, cumulative_us, module in sorted(rows, key=lambda r: -r[1])[:limit]:
+        print(f"{self_us / 1000:>9.1f}{cumulative_us / 1000:>9.1f}  {module}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="モジュールの読み込み時間の計測")
+    parser.add_argument("--repeat", type=int, default=5, help="対象ごとの計測回数 (中央値を使う)")
+    parser.add_argument("--forbid", default=",".join(DEFAULT_FORBID), help="app の読み込みで読み込まれてはいけないモジュール")
+    parser.add_argument("--save", help="結果を比較元として保存するパス")
+    parser.add_argument("--baseline", help="比較元の結果")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="比較元からの悪化の許容率")
+    parser.add_argument("--tree", metavar="TARGET", help="対象の読み込み内訳を表示して終了する")
+    args = parser.parse_args()
+
+    if args.tree:
+        print_tree(args.tree)
+        return 0
+
+    results = measure(args.repeat)
+    floor = results["streamlit"]["median_ms"]
+    print(f"{'target':<14}{'median ms':>11}{'min ms':>9}{'+streamlit':>12}  heavy modules")
+    for name, r in results.items():
+        extra = "" if name == "streamlit" else f"{r['median_ms'] - floor:+.1f}"
+        print(f"{name:<14}{r['median_ms']:>11}{r['min_ms']:>9}{extra:>12}  {','.join(r['heavy']) or '-'}")
+
+    failures = []
+    forbidden = [m for m in args.forbid.split(",") if m in results["app"]["heavy"]]
+    if forbidden:
+        failures.append(f"app imports load {', '.join(forbidden)} (should be imported lazily)")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        for name, r in results.items():
+            base = baseline.get(name)
+            if base and r["median_ms"] > base["median_ms"] * (1 + args.tolerance):
+                failures.append(f"{name}: {r['median_ms']}ms > baseline {base['median_ms']}ms x{1 + args.tolerance:.2f}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,431 @@
+"""
+同時セッション数に対する app.py の負荷試験。
+
+`streamlit run app.py` を起動し、ブラウザと同じWebSocketプロトコル (/_stcore/stream, protobuf) で
+N 個のセッションを同時に接続して、各機能を操作するシナリオを繰り返す。
+1つのサーバープロセスのキャッシュとCPUを全セッションで奪い合うため、
+1コンテナで何セッションまでリランが詰まらずに処理できるかの目安になる。
+(AppTest はランタイムをプロセス全体で差し替えるため、同時に複数動かせない。)
+
+上流APIの代わりにオフラインのスタブ (bench/stub_api.py) を子プロセスとして起動する。
+--url で起動済みのサーバー (Dockerコンテナなど) を対象にすることもできる (CPU/RSSは計測しない)。
+
+計測項目:
+    - スループット (リラン/秒)
+    - リラン1回あたりの所要時間 p50 / p95 / p99 (シナリオ別と全体)
+    - サーバープロセスのCPU時間 / RSS増加量 (1セッションあたり)
+
+使い方:
+    python bench/loadtest.py --sessions 8 --iterations 3
+    python bench/loadtest.py --sessions 8 --save-baseline bench/baseline.json
+    python bench/loadtest.py --sessions 8 --baseline bench/baseline.json --tolerance 0.25
+    python bench/loadtest.py --sessions 8 --max-p95 2000 --min-throughput 5
+
+閾値を超えた場合 (または比較元より tolerance 以上悪化した場合) は終了コード 1 を返す。
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.sync.client import connect
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from translations import get_translations  # noqa: E402
+
+# ウィジェットの種類 -> 値を送るときの WidgetState のフィールド
+VALUE_FIELDS = {
+    "selectbox": "string_value",
+    "radio": "string_value",
+    "text_input": "string_value",
+    "number_input": "double_value",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_http(url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not become ready")
+            time.sleep(0.2)
+
+
+class ProcessStats:
+    """/proc から対象プロセスのCPU時間 (秒) とRSS (MB) を読みます (Linuxのみ)。"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.ticks = os.sysconf("SC_CLK_TCK")
+
+    def cpu(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.ticks  # utime + stime
+
+    def rss_mb(self) -> float:
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return 0.0
+
+
+def percentile(values: List[float], q: float) -> float:
+    """線形補間によるパーセンタイル (q は 0-100)。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
+
+
+class Session:
+    """
+    1ユーザー分のセッション。WebSocketでリランを要求し、script_finished までの時間を記録する。
+
+    ウィジェットは直前のリランで描画された要素から (種類, 表示ラベル) で探すため、
+    並び順の変更に影響されない。ラベルは日本語 (アプリの既定言語) の翻訳を使う。
+    """
+
+    def __init__(self, ws: Any, timeout: float):
+        self.tr = get_translations("ja")
+        self.timeout = timeout
+        self.ws = ws
+        self.page_script_hash = ""
+        self.widgets: Dict[Tuple[str, str], Any] = {}
+        self.values: Dict[str, WidgetState] = {}
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: List[str] = []
+
+    def rerun(self, scenario: str, trigger: Optional[str] = None) -> None:
+        """現在のウィジェット値 (と押したボタン) でリランし、完了までの時間を記録します。"""
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.page_script_hash = self.page_script_hash
+        for value in self.values.values():
+            state.widget_states.widgets.add().CopyFrom(value)
+        if trigger is not None:
+            state.widget_states.widgets.add(id=trigger, trigger_value=True)
+
+        started = time.perf_counter()
+        self.ws.send(msg.SerializeToString())
+        widgets: Dict[Tuple[str, str], Any] = {}
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(self.ws.recv(timeout=self.timeout))
+            kind = fwd.WhichOneof("type")
+            if kind == "new_session":
+                self.page_script_hash = fwd.new_session.page_script_hash
+            elif kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element = fwd.delta.new_element
+                element_type = element.WhichOneof("type")
+                if element_type == "exception":
+                    self.errors.append(f"{scenario}: {element.exception.message}")
+                elif element_type in VALUE_FIELDS or element_type == "button":
+                    proto = getattr(element, element_type)
+                    widgets[(element_type, proto.label)] = proto
+            elif kind == "script_finished" and fwd.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        self.samples.setdefault(scenario, []).append((time.perf_counter() - started) * 1000)
+
+        self.widgets = widgets
+        # 今回描画されなかったウィジェットの値は送らない
+        live = {proto.id for proto in widgets.values()}
+        self.values = {wid: value for wid, value in self.values.items() if wid in live}
+
+    def _find(self, element_type: str, label: str) -> Any:
+        proto = self.widgets.get((element_type, label))
+        if proto is None:
+            raise LookupError(f"{element_type} '{label}' not found")
+        return proto
+
+    def set_value(self, scenario: str, element_type: str, label: str, value: Any) -> None:
+        proto = self._find(element_type, label)
+        state = WidgetState(id=proto.id)
+        setattr(state, VALUE_FIELDS[element_type], value)
+        self.values[proto.id] = state
+        self.rerun(scenario)
+
+    def click(self, scenario: str, label: str) -> None:
+        self.rerun(scenario, trigger=self._find("button", label).id)
+
+    def next_page(self, scenario: str) -> None:
+        proto = self.widgets.get(("number_input", self.tr("page")))
+        if proto is None:
+            return
+        current = self.values[proto.id].double_value if proto.id in self.values else proto.default
+        if current < proto.max:
+            self.set_value(scenario, "number_input", self.tr("page"), current + 1)
+
+    # --- シナリオ ---
+    def open(self) -> None:
+        self.rerun("open")
+
+    def _select_feature(self, scenario: str, feature: str) -> None:
+        self.set_value(scenario, "selectbox", self.tr("select_feature"), self.tr("features")[feature])
+
+    def ammo(self) -> None:
+        self._select_feature("ammo", "ammo")
+        self.click("ammo", self.tr("get_data"))
+
+    def price(self) -> None:
+        self._select_feature("price", "price")
+        self.set_value("price", "text_input", self.tr("search_item_placeholder"), "gas")
+        self.next_page("price")
+
+    def task(self) -> None:
+        self._select_feature("task", "task")
+        self.click("task", self.tr("get_data"))
+        self.next_page("task")
+
+    def craft(self) -> None:
+        self._select_feature("craft", "craft")
+        self.click("craft", self.tr("calculate"))
+
+
+SCENARIOS = ("ammo", "price", "task", "craft")
+
+
+def run_sessions(url: str, sessions: int, iterations: int, scenarios: List[str], timeout: float,
+                 stats: Optional[ProcessStats] = None) -> Dict[str, Any]:
+    """
+    sessions 個のセッションを同時に開始し、各セッションでシナリオを iterations 回繰り返します。
+
+    Returns:
+        Dict[str, Any]: 計測結果のレポート。
+    """
+    rss_before = stats.rss_mb() if stats else None
+    cpu_before = stats.cpu() if stats else None
+    results: List[Session] = []
+    failures: List[str] = []
+    start_barrier = threading.Barrier(sessions)
+    lock = threading.Lock()
+
+    def worker(index: int) -> None:
+        try:
+            with connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=timeout) as ws:
+                session = Session(ws, timeout)
+                with lock:
+                    results.append(session)
+                start_barrier.wait()
+                session.open()
+                for _ in range(iterations):
+                    # セッションごとに開始シナリオをずらし、全員が同じ機能に集中しないようにする
+                    for k in range(len(scenarios)):
+                        getattr(session, scenarios[(index + k) % len(scenarios)])()
+        except threading.BrokenBarrierError:
+            pass
+        except Exception as e:  # 1セッションの失敗で全体を止めない
+            with lock:
+                failures.append(f"session {index}: {e!r}")
+            start_barrier.abort()
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f"session-{i}") for i in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    by_scenario: Dict[str, List[float]] = {}
+    for session in results:
+        for scenario, samples in session.samples.items():
+            by_scenario.setdefault(scenario, []).extend(samples)
+        failures.extend(session.errors)
+    all_samples = [s for samples in by_scenario.values() for s in samples]
+
+    def summary(samples: List[float]) -> Dict[str, float]:
+        return {
+            "count": len(samples),
+            "p50_ms": round(percentile(samples, 50), 1),
+            "p95_ms": round(percentile(samples, 95), 1),
+            "p99_ms": round(percentile(samples, 99), 1),
+        }
+
+    report: Dict[str, Any] = {
+        "sessions": sessions,
+        "iterations": iterations,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(all_samples) / elapsed, 2) if elapsed else 0.0,
+        "latency": summary(all_samples),
+        "scenarios": {name: summary(samples) for name, samples in sorted(by_scenario.items())},
+        "cpu_s_per_session": None,
+        "cpu_utilization": None,
+        "rss_mb": None,
+        "rss_mb_per_session": None,
+        "errors": failures,
+    }
+    if stats:
+        cpu = stats.cpu() - cpu_before
+        rss_after = stats.rss_mb()
+        report.update({
+            "cpu_s_per_session": round(cpu / sessions, 3),
+            "cpu_utilization": round(cpu / elapsed, 2) if elapsed else 0.0,
+            "rss_mb": round(rss_after, 1),
+            "rss_mb_per_session": round((rss_after - rss_before) / sessions, 2),
+        })
+    return report
+
+
+def check_thresholds(report: Dict[str, Any], args: argparse.Namespace) -> List[str]:
+    """閾値・比較元との差分を確認し、違反内容のリストを返します。"""
+    violations = []
+    if report["errors"]:
+        violations.append(f"{len(report['errors'])} session errors")
+    latency = report["latency"]
+    if args.max_p95 is not None and latency["p95_ms"] > args.max_p95:
+        violations.append(f"p95 {latency['p95_ms']}ms > {args.max_p95}ms")
+    if args.max_p99 is not None and latency["p99_ms"] > args.max_p99:
+        violations.append(f"p99 {latency['p99_ms']}ms > {args.max_p99}ms")
+    if args.min_throughput is not None and report["throughput_rps"] < args.min_throughput:
+        violations.append(f"throughput {report['throughput_rps']}/s < {args.min_throughput}/s")
+    rss = report["rss_mb_per_session"]
+    if args.max_rss_per_session is not None and rss is not None and rss > args.max_rss_per_session:
+        violations.append(f"RSS/session {rss}MB > {args.max_rss_per_session}MB")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        limit = 1 + args.tolerance
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if baseline["latency"][key] and latency[key] > baseline["latency"][key] * limit:
+                violations.append(f"{key} {latency[key]} > baseline {baseline['latency'][key]} x{limit:.2f}")
+        if report["throughput_rps"] < baseline["throughput_rps"] / limit:
+            violations.append(f"throughput {report['throughput_rps']} < baseline {baseline['throughput_rps']} /{limit:.2f}")
+        cpu, base_cpu = report["cpu_s_per_session"], baseline.get("cpu_s_per_session")
+        if cpu is not None and base_cpu and cpu > base_cpu * limit:
+            violations.append(f"cpu/session {cpu}s > baseline {base_cpu}s x{limit:.2f}")
+    return violations
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"sessions={report['sessions']} iterations={report['iterations']} elapsed={report['elapsed_s']}s")
+    print(f"throughput: {report['throughput_rps']} reruns/s")
+    print(f"{'scenario':<10}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, s in list(report["scenarios"].items()) + [("all", report["latency"])]:
+        print(f"{name:<10}{s['count']:>7}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+    if report["cpu_s_per_session"] is not None:
+        print(f"CPU: {report['cpu_s_per_session']}s/session (utilization {report['cpu_utilization']})")
+        print(f"RSS: {report['rss_mb']}MB total, {report['rss_mb_per_session']}MB/session")
+    for error in report["errors"][:10]:
+        print(f"error: {error}")
+
+
+def start_stub(latency_ms: float, scale: float) -> Tuple[subprocess.Popen, str]:
+    """スタブAPIを子プロセスで起動し、(プロセス, URL) を返します。"""
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, "bench", "stub_api.py"),
+         "--port", str(port), "--latency-ms", str(latency_ms), "--scale", str(scale)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    proc.stdout.readline()  # 待ち受け開始の通知
+    return proc, f"http://127.0.0.1:{port}/graphql"
+
+
+def start_app(api_url: str, timeout: float) -> Tuple[subprocess.Popen, str]:
+    """スタブAPIを向いた Streamlit サーバーを起動し、(プロセス, WebSocketのURL) を返します。"""
+    port = _free_port()
+    env = dict(os.environ)
+    env["TARKOV_API_URL"] = api_url
+    env.setdefault("TARKOV_HISTORY_DIR", tempfile.mkdtemp(prefix="tarkov-loadtest-history-"))
+    # 計測対象はアプリ側の処理なので、上流APIのレート制限は実質無効にする
+    env.setdefault("TARKOV_API_RATE", "1000")
+    env.setdefault("TARKOV_API_BURST", "1000")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(REPO_DIR, "app.py"),
+         "--server.headless=true", f"--server.port={port}", "--server.address=127.0.0.1",
+         "--browser.gatherUsageStats=false", "--server.fileWatcherType=none"],
+        env=env, cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    _wait_http(f"http://127.0.0.1:{port}/_stcore/health", timeout)
+    return proc, f"ws://127.0.0.1:{port}/_stcore/stream"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="app.py の同時セッション負荷試験")
+    parser.add_argument("--sessions", type=int, default=4, help="同時セッション数")
+    parser.add_argument("--iterations", type=int, default=2, help="各セッションでシナリオを繰り返す回数")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="実行するシナリオ (カンマ区切り)")
+    parser.add_argument("--timeout", type=float, default=120, help="リラン1回のタイムアウト (秒)")
+    parser.add_argument("--url", help="起動済みのサーバーのWebSocket URL (例: ws://localhost:8501/_stcore/stream)")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--stub-scale", type=float, default=1.0)
+    parser.add_argument("--warmup", type=int, default=1, help="計測前に全シナリオを実行するセッション数 (キャッシュを温める)")
+    parser.add_argument("--report", help="レポートをJSONで保存するパス")
+    parser.add_argument("--save-baseline", help="レポートを比較元として保存するパス")
+    parser.add_argument("--baseline", help="比較元のレポート")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="比較元からの悪化の許容率")
+    parser.add_argument("--max-p95", type=float, help="p95 の上限 (ms)")
+    parser.add_argument("--max-p99", type=float, help="p99 の上限 (ms)")
+    parser.add_argument("--min-throughput", type=float, help="スループットの下限 (リラン/秒)")
+    parser.add_argument("--max-rss-per-session", type=float, help="1セッションあたりのRSS増加量の上限 (MB)")
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    processes: List[subprocess.Popen] = []
+    stats: Optional[ProcessStats] = None
+    try:
+        if args.url:
+            url = args.url
+        else:
+            stub, api_url = start_stub(args.stub_latency_ms, args.stub_scale)
+            processes.append(stub)
+            app, url = start_app(api_url, args.timeout)
+            processes.append(app)
+            stats = ProcessStats(app.pid)
+
+        if args.warmup:
+            warmup = run_sessions(url, args.warmup, 1, list(SCENARIOS), args.timeout)
+            if warmup["errors"]:
+                print(f"warm-up failed: {warmup['errors'][0]}")
+                return 1
+        report = run_sessions(url, args.sessions, args.iterations, scenarios, args.timeout, stats)
+    finally:
+        for proc in reversed(processes):
+            proc.terminate()
+            proc.wait()
+
+    print_report(report)
+    for path in (args.report, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    violations = check_thresholds(report, args)
+    for violation in violations:
+        print(f"FAIL: {violation}")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
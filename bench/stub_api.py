@@ -0,0 +1,227 @@
+"""
+Tarkov.dev GraphQL API のオフライン代替サーバー (負荷試験用)。
+
+アプリが送るクエリのルートフィールド (items / tasks / crafts / barters / traders / maps) を見て、
+決定的に生成した合成データを返す。実際のAPIに近い件数 (アイテム約4000件、タスク約450件など) を
+既定値とし、--scale で増減できる。同じクエリへの応答は1度だけ生成してバイト列を使い回す。
+
+使い方:
+    python bench/stub_api.py --port 8599 [--latency-ms 50] [--scale 1.0]
+    TARKOV_API_URL=http://127.0.0.1:8599/graphql streamlit run app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+CALIBERS = ["5.56x45mm", "5.45x39mm", "7.62x39mm", "7.62x51mm", ".300 Blackout", "12/70", "9x19mm Parabellum"]
+TRADERS = ["Prapor", "Therapist", "Fence", "Skier", "Peacekeeper", "Mechanic", "Ragman", "Jaeger"]
+MAPS = ["Ground Zero", "Streets of Tarkov", "Customs", "Factory", "Woods", "Reserve", "Lighthouse", "Shoreline", "Interchange", "Labs"]
+STATIONS = ["Workbench", "Lavatory", "Medstation", "Nutrition Unit", "Water Collector", "Booze Generator", "Intelligence Center"]
+WORDS = ["Gas", "analyzer", "Bolts", "Screw", "nuts", "Wires", "Tushonka", "Salewa", "Ibuprofen", "Graphics", "card",
+         "Military", "cable", "Corrugated", "hose", "Duct", "tape", "Hose", "Gunpowder", "Eagle", "Kite", "Hawk"]
+
+
+def _normalize(name: str) -> str:
+    return name.lower().replace(" ", "-")
+
+
+def _vendor(name: str) -> Dict[str, str]:
+    return {"name": name, "normalizedName": _normalize(name)}
+
+
+class Dataset:
+    """合成データ一式。乱数の種を固定しているため、何度起動しても同じ内容になる。"""
+
+    def __init__(self, scale: float = 1.0, seed: int = 0):
+        rnd = random.Random(seed)
+        n_items = int(4000 * scale)
+        n_tasks = int(450 * scale)
+        n_crafts = int(200 * scale)
+        n_barters = int(400 * scale)
+
+        self.items: List[Dict[str, Any]] = []
+        self.names: List[str] = []
+        self.categories: List[str] = []
+        for i in range(n_items):
+            if i < len(CALIBERS) * 12:
+                category = "Ammo"
+                name = f"{CALIBERS[i // 12]} {rnd.choice(WORDS)} {i}"
+            else:
+                category = "Meds" if i % 10 == 0 else "BarterItem"
+                name = f"{rnd.choice(WORDS)} {rnd.choice(WORDS)} {i}"
+            price = rnd.randint(1000, 300000)
+            buy_for = [{"price": int(price * 1.1), "vendor": _vendor("Flea Market"), "requirements": []}]
+            if i % 3 == 0:
+                buy_for.append({
+                    "price": int(price * rnd.uniform(0.8, 1.3)),
+                    "vendor": _vendor(rnd.choice(TRADERS)),
+                    "requirements": [{"type": "loyaltyLevel", "value": rnd.randint(1, 4)}]
+                    + ([{"type": "questCompleted", "value": rnd.randint(1, n_tasks)}] if i % 9 == 0 else []),
+                })
+            self.items.append({
+                "id": f"item{i}",
+                "name": name,
+                "shortName": f"I{i}",
+                "avg24hPrice": price if i % 11 else None,
+                "buyFor": buy_for,
+                "sellFor": [{"price": int(price * rnd.uniform(0.3, 0.7)), "vendor": _vendor(t)} for t in rnd.sample(TRADERS, 2)],
+                "link": f"https://tarkov.dev/item/item{i}",
+                "properties": {
+                    "caliber": "Caliber" + re.sub(r"\W", "", CALIBERS[i // 12]),
+                    "damage": rnd.randint(30, 120),
+                    "penetrationPower": rnd.randint(5, 65),
+                    "fragmentationChance": round(rnd.random() * 0.5, 2),
+                    "projectileCount": 8 if CALIBERS[i // 12] == "12/70" else 1,
+                } if category == "Ammo" else None,
+            })
+            self.names.append(name)
+            self.categories.append(category)
+
+        self.tasks = []
+        for i in range(n_tasks):
+            objectives = []
+            for k in range(rnd.randint(1, 4)):
+                objective = {"id": f"obj{i}_{k}", "description": f"Objective {k} of task {i}"}
+                if k % 2 == 0:
+                    objective.update({
+                        "item": {"id": f"item{rnd.randrange(n_items)}"},
+                        "count": rnd.randint(1, 5),
+                        "foundInRaid": rnd.random() < 0.5,
+                    })
+                objectives.append(objective)
+            game_map = rnd.choice(MAPS + [None])
+            # 前提タスクは番号の小さいタスクから選ぶ (循環しない)
+            requirements = [{"task": {"id": f"task{j}"}, "status": ["complete"]}
+                            for j in sorted(set(rnd.sample(range(i), min(i, rnd.randint(0, 2)))))]
+            self.tasks.append({
+                "id": f"task{i}",
+                "tarkovDataId": i + 1,
+                "name": f"Task {i}",
+                "minPlayerLevel": rnd.randint(1, 60),
+                "kappaRequired": rnd.random() < 0.4,
+                "taskRequirements": requirements,
+                "trader": _vendor(rnd.choice(TRADERS)),
+                "map": _vendor(game_map) if game_map else None,
+                "objectives": objectives,
+                "wikiLink": f"https://escapefromtarkov.fandom.com/wiki/Task_{i}",
+            })
+
+        def item_list(count: int) -> List[Dict[str, Any]]:
+            return [{"count": rnd.randint(1, 3), "item": {"id": f"item{rnd.randrange(n_items)}"}} for _ in range(count)]
+
+        self.crafts = [{
+            "station": _vendor(rnd.choice(STATIONS)),
+            "level": rnd.randint(1, 3),
+            "duration": rnd.randint(600, 40000),
+            "rewardItems": item_list(1),
+            "requiredItems": item_list(rnd.randint(1, 4)),
+        } for _ in range(n_crafts)]
+        self.barters = [{
+            "trader": _vendor(rnd.choice(TRADERS)),
+            "level": rnd.randint(1, 4),
+            "requiredItems": item_list(rnd.randint(1, 3)),
+            "rewardItems": item_list(1),
+        } for _ in range(n_barters)]
+
+    def items_for(self, args: str) -> List[Dict[str, Any]]:
+        """items(...) の引数 (categoryNames / name / limit) に従って絞り込みます。"""
+        selected = range(len(self.items))
+        categories = re.search(r"categoryNames:\s*(\[[^\]]*\]|\w+)", args)
+        if categories:
+            wanted = {c.strip() for c in categories.group(1).strip("[]").split(",")}
+            selected = [i for i in selected if self.categories[i] in wanted]
+        name = re.search(r'name:\s*"([^"]*)"', args)
+        if name:
+            term = name.group(1).lower()
+            selected = [i for i in selected if term in self.names[i].lower()]
+        limit = re.search(r"limit:\s*(\d+)", args)
+        result = [self.items[i] for i in selected]
+        return result[:int(limit.group(1))] if limit else result
+
+    def respond(self, query: str) -> Dict[str, Any]:
+        data: Dict[str, Any] = {}
+        items = re.search(r"\bitems\s*(\(([^)]*)\))?\s*\{", query)
+        if items:
+            data["items"] = self.items_for(items.group(2) or "")
+        if re.search(r"\btasks\s*(\([^)]*\))?\s*\{", query):
+            data["tasks"] = self.tasks
+        if re.search(r"\bcrafts\s*\{", query):
+            data["crafts"] = self.crafts
+        if re.search(r"\bbarters\s*\{", query):
+            data["barters"] = self.barters
+        if re.search(r"\btraders\s*(\([^)]*\))?\s*\{", query):
+            data["traders"] = [_vendor(t) for t in TRADERS]
+        if re.search(r"\bmaps\s*(\([^)]*\))?\s*\{", query):
+            data["maps"] = [_vendor(m) for m in MAPS]
+        return {"data": data}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    dataset: Dataset
+    latency = 0.0
+    _responses: Dict[str, bytes] = {}
+    _lock = threading.Lock()
+    requests_served = 0
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            query = json.loads(self.rfile.read(length))["query"]
+        except (ValueError, KeyError):
+            self.send_error(HTTPStatus.BAD_REQUEST)
+            return
+        with self._lock:
+            body = self._responses.get(query)
+            StubHandler.requests_served += 1
+        if body is None:
+            body = json.dumps(self.dataset.respond(query)).encode("utf-8")
+            with self._lock:
+                self._responses[query] = body
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8599, latency_ms: float = 0.0,
+                scale: float = 1.0) -> ThreadingHTTPServer:
+    """スタブサーバーを作成します (serve_forever は呼び出し側で実行する)。"""
+    StubHandler.dataset = Dataset(scale)
+    StubHandler.latency = latency_ms / 1000
+    httpd = ThreadingHTTPServer((host, port), StubHandler)
+    httpd.daemon_threads = True
+    return httpd
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tarkov.dev GraphQL API のオフライン代替サーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="応答ごとに加える遅延 (上流APIの応答時間の再現)")
+    parser.add_argument("--scale", type=float, default=1.0, help="データ件数の倍率")
+    args = parser.parse_args()
+
+    httpd = make_server(args.host, args.port, args.latency_ms, args.scale)
+    print(f"stub API listening on http://{args.host}:{args.port}/graphql", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+一括査定の処理時間の計測。
+
+オフラインのスタブ (bench/stub_api.py) と同じ合成データから名前索引と売却価格表を作り、
+数量の書式や未知の名前を混ぜたアイテム一覧 (既定 5000行) を査定する時間を計測する。
+
+使い方:
+    python bench/valuation_bench.py [--lines 5000] [--repeat 5] [--max-ms 500]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import Localization  # noqa: E402
+from stub_api import Dataset  # noqa: E402
+from valuation import NameIndex, SaleTable, appraise  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="一括査定の処理時間の計測")
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, help="査定1回の中央値の上限 (ms)")
+    args = parser.parse_args()
+
+    dataset = Dataset()
+    rnd = random.Random(0)
+    started = time.perf_counter()
+    names = NameIndex([Localization("en", {"items": dataset.items})])
+    table = SaleTable({item['id']: item for item in dataset.items})
+    build_ms = (time.perf_counter() - started) * 1000
+
+    lines = []
+    for n in range(args.lines):
+        item = rnd.choice(dataset.items)
+        count = rnd.randint(1, 9)
+        lines.append(rnd.choice([
+            item['name'], f"{item['name']} x{count}", f"{count} {item['name']}",
+            f"{item['shortName']},{count}", f"unknown item {n}",
+        ]))
+
+    times = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        result = appraise(lines, names, table)
+        times.append((time.perf_counter() - started) * 1000)
+
+    median = statistics.median(times)
+    print(f"lines={len(lines)} items={len(result.item_ids)} unresolved={len(result.unresolved)} "
+          f"channels={len(table.channels)} total={result.grand_total:,}")
+    print(f"index/table build: {build_ms:.1f} ms (once per dataset)")
+    print(f"appraise: median {median:.1f} ms, max {max(times):.1f} ms")
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"FAIL: {median:.1f}ms > {args.max_ms}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
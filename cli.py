@@ -0,0 +1,78 @@
+"""
+コマンドラインからのデータ書き出し。
+
+使い方:
+    python cli.py crafts --station Workbench --max-level 2 --format csv -o crafts.csv
+    python cli.py prices --q "gas" --format ndjson
+    python cli.py task-items --lang en --format parquet -o task_items.parquet
+    python cli.py serve --port 8502   # ヘッドレスJSON API (server.py) を起動
+"""
+import argparse
+import logging
+import sys
+
+from api import UpstreamError
+from data import LANGUAGES
+from export import DATASETS, FORMATS, write_rows
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Tarkov Dashboard のデータ書き出し")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name, dataset in DATASETS.items():
+        p = sub.add_parser(name, help=dataset.description)
+        p.add_argument("--lang", choices=LANGUAGES, default="ja")
+        p.add_argument("--format", choices=FORMATS, default="json")
+        p.add_argument("-o", "--output", help="出力先ファイル (省略時は標準出力)")
+        for key, kind in dataset.filters.items():
+            option = f"--{key.replace('_', '-')}"
+            if kind is bool:
+                p.add_argument(option, dest=key, action="store_true", default=None)
+            else:
+                p.add_argument(option, dest=key, type=kind)
+
+    p = sub.add_parser("serve", help="ヘッドレスJSON APIを起動する")
+    p.add_argument("--host", default=None)
+    p.add_argument("--port", type=int, default=None)
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.command == "serve":
+        import server
+        server.serve(args.host or server.API_HOST, args.port or server.API_PORT)
+        return 0
+
+    dataset = DATASETS[args.command]
+    try:
+        rows = dataset.rows(args.lang, **dataset.parse_filters(vars(args)))
+    except UpstreamError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    # Parquetはバイナリ、それ以外はUTF-8テキストで書き出す
+    binary = args.format == "parquet"
+    if args.output:
+        fp = open(args.output, "wb" if binary else "w", encoding=None if binary else "utf-8", newline=None if binary else "")
+    elif binary:
+        fp = sys.stdout.buffer
+    else:
+        fp = sys.stdout
+    try:
+        count = write_rows(args.format, dataset, rows, fp)
+    except RuntimeError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.output:
+            fp.close()
+    print(f"{count} rows", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""
+データ層。
+
+言語に依存しないデータセット (価格、タスク、クラフト、バーター) は1度だけ取得し、
+名前・説明文は言語ごとの Localization テーブルから ID で結合する。
+言語を切り替えても取得し直すのは名前テーブルだけで、数値データは共有される。
+
+取得結果のキャッシュは TarkovClient に任せ、ここでは取得結果から作る索引などの派生データを
+元データが同じオブジェクトである間だけ使い回す (データが更新されたら作り直す)。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from api import TarkovClient, Priority
+from queries import (
+    get_ammo_query, get_items_query, get_localization_query, get_tasks_query,
+    get_all_crafts_query, get_items_by_category_query, get_barters_query
+)
+from taskgraph import TaskGraph
+
+if TYPE_CHECKING:
+    from ballistics import PenetrationMatrix
+    from valuation import NameIndex, SaleTable
+
+# 対応言語
+LANGUAGES = ("ja", "en")
+
+# 弾薬タブの口径一覧 (APIの検索に使う英語表記)
+CALIBERS = ["5.56x45mm NATO", "5.45x39mm", "7.62x39mm", "7.62x51mm NATO", ".300 Blackout", "12/70", "9x19mm Parabellum"]
+
+# 価格タブのカテゴリ検索モード -> APIのカテゴリ名
+CATEGORY_MODES = {"ammo": ["Ammo"], "meds": ["Meds"]}
+
+# トレーダー一覧 (traders) に含まれない売却先 (vendor) の名前 (normalizedName -> 名前)
+VENDOR_NAMES = {
+    "ja": {"flea-market": "フリーマーケット"},
+    "en": {"flea-market": "Flea Market"},
+}
+
+_derived: Dict[Hashable, Tuple[Any, Any]] = {}
+_derived_lock = threading.Lock()
+
+
+def _derive(key: Hashable, sources: Tuple[Any, ...], build: Callable[..., Any]) -> Any:
+    """
+    元データ (sources) が前回と全て同じオブジェクトなら前回の派生データを返し、
+    どれかが変わっていれば build(*sources) で作り直します。
+    """
+    with _derived_lock:
+        cached = _derived.get(key)
+    if cached is not None and len(cached[0]) == len(sources) and all(a is b for a, b in zip(cached[0], sources)):
+        return cached[1]
+    result = build(*sources)
+    with _derived_lock:
+        _derived[key] = (sources, result)
+    return result
+
+
+class Localization:
+    """
+    1言語分の名前・説明文テーブル。
+
+    Attributes:
+        lang (str): 言語コード。
+        items (Dict[str, Tuple[str, str]]): アイテムID -> (名前, 略称)。
+        tasks (Dict[str, str]): タスクID -> タスク名。
+        objectives (Dict[str, str]): 目標ID -> 説明文。
+        traders (Dict[str, str]): トレーダー・売却先のnormalizedName -> 名前 (フリーマーケットは VENDOR_NAMES から)。
+        maps (Dict[str, str]): マップのnormalizedName -> 名前。
+    """
+    __slots__ = ("lang", "items", "tasks", "objectives", "traders", "maps", "_search_keys")
+
+    def __init__(self, lang: str, data: Optional[Dict[str, Any]]):
+        data = data or {}
+        self.lang = lang
+        self.items = {x['id']: (x.get('name') or "", x.get('shortName') or "") for x in data.get('items') or []}
+        self.tasks = {x['id']: x.get('name') or "" for x in data.get('tasks') or []}
+        self.objectives = {
+            obj['id']: obj.get('description') or ""
+            for task in data.get('tasks') or []
+            for obj in task.get('objectives') or []
+            if obj.get('id')
+        }
+        self.traders = dict(VENDOR_NAMES.get(lang, {}))
+        self.traders.update({x['normalizedName']: x['name'] for x in data.get('traders') or []})
+        self.maps = {x['normalizedName']: x['name'] for x in data.get('maps') or []}
+        # 検索用に小文字化した「名前 + 略称」を事前に作っておく
+        self._search_keys = [(item_id, f"{name}\t{short}".lower()) for item_id, (name, short) in self.items.items()]
+
+    def item_name(self, item_id: str) -> str:
+        entry = self.items.get(item_id)
+        return entry[0] if entry else item_id
+
+    def item_short_name(self, item_id: str) -> str:
+        entry = self.items.get(item_id)
+        return entry[1] if entry else item_id
+
+    def task_name(self, task_id: str, default: str = "") -> str:
+        return self.tasks.get(task_id) or default or task_id
+
+    def objective(self, objective_id: str) -> str:
+        return self.objectives.get(objective_id, "")
+
+    def trader_name(self, trader: Dict[str, Any]) -> str:
+        """トレーダー (vendor) オブジェクトの表示名。翻訳がなければAPIの名前を使う。"""
+        return self.traders.get(trader.get('normalizedName'), trader.get('name', ""))
+
+    def map_name(self, game_map: Optional[Dict[str, Any]], default: str = "Any") -> str:
+        if not game_map:
+            return default
+        return self.maps.get(game_map.get('normalizedName'), game_map.get('name', default))
+
+    def search(self, term: str) -> List[str]:
+        """名前・略称に検索語 (空白区切りの全単語) を含むアイテムIDを返します。"""
+        words = term.lower().split()
+        if not words:
+            return []
+        return [item_id for item_id, key in self._search_keys if all(w in key for w in words)]
+
+
+def get_localization(lang: str, priority: Priority = Priority.INTERACTIVE) -> Localization:
+    """指定言語の名前テーブルを返します (取得に失敗した場合は空のテーブル)。"""
+    data = TarkovClient.run_query(get_localization_query(lang), priority=priority)
+    return _derive(("localization", lang), (data,), lambda d: Localization(lang, d))
+
+
+def get_market(priority: Priority = Priority.INTERACTIVE) -> Dict[str, Dict[str, Any]]:
+    """全アイテムの価格情報を アイテムID -> アイテム の辞書で返します。"""
+    data = TarkovClient.run_query(get_items_query(), priority=priority)
+    return _derive("market", (data,), lambda d: {x['id']: x for x in (d or {}).get('items') or []})
+
+
+def get_tasks(priority: Priority = Priority.INTERACTIVE) -> List[Dict[str, Any]]:
+    """全タスクの構造データを返します。"""
+    data = TarkovClient.run_query(get_tasks_query(), priority=priority)
+    return (data or {}).get('tasks') or []
+
+
+def get_task_graph(priority: Priority = Priority.INTERACTIVE) -> TaskGraph:
+    """タスクの依存関係グラフを返します (タスクデータが更新されたときだけ作り直す)。"""
+    data = TarkovClient.run_query(get_tasks_query(), priority=priority)
+    return _derive("task_graph", (data,), lambda d: TaskGraph((d or {}).get('tasks') or []))
+
+
+def get_crafts(priority: Priority = Priority.INTERACTIVE) -> List[Dict[str, Any]]:
+    """全クラフトレシピを返します。"""
+    data = TarkovClient.run_query(get_all_crafts_query(), priority=priority)
+    return (data or {}).get('crafts') or []
+
+
+def get_barter_index(priority: Priority = Priority.INTERACTIVE) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, List[Dict[str, Any]]]]:
+    """
+    バーターをアイテムIDで引ける索引を返します。
+
+    Returns:
+        Tuple[Dict, Dict]: (アイテムID -> そのアイテムを入手できるバーター,
+                            アイテムID -> そのアイテムを素材に使うバーター)
+    """
+    data = TarkovClient.run_query(get_barters_query(), priority=priority)
+
+    def build(d):
+        barters_for: Dict[str, List[Dict[str, Any]]] = {}
+        barters_using: Dict[str, List[Dict[str, Any]]] = {}
+        for barter in (d or {}).get('barters') or []:
+            for reward in barter.get('rewardItems') or []:
+                if reward.get('item'):
+                    barters_for.setdefault(reward['item']['id'], []).append(barter)
+            for req in barter.get('requiredItems') or []:
+                if req.get('item'):
+                    barters_using.setdefault(req['item']['id'], []).append(barter)
+        return barters_for, barters_using
+
+    return _derive("barter_index", (data,), build)
+
+
+def get_task_name_map(lang: str, priority: Priority = Priority.INTERACTIVE) -> Dict[str, str]:
+    """tarkovDataId (購入条件のタスク指定に使われるID) -> タスク名 の対応を返します。"""
+    loc = get_localization(lang, priority)
+    data = TarkovClient.run_query(get_tasks_query(), priority=priority)
+
+    def build(d, loc):
+        task_map = {}
+        for task in (d or {}).get('tasks') or []:
+            tid = str(task.get('tarkovDataId'))
+            if tid and tid != "None":
+                task_map[tid] = loc.task_name(task['id'])
+        return task_map
+
+    # タスクデータと名前テーブルのどちらが更新されても作り直す
+    return _derive(("task_name_map", lang), (data, loc), build)
+
+
+def search_items(term: str, lang: str, priority: Priority = Priority.INTERACTIVE) -> List[str]:
+    """
+    名前テーブルからアイテムを検索し、該当するアイテムIDを返します (APIへの検索リクエストは不要)。
+    現在の言語で見つからない場合は英語名でも検索する。
+    """
+    ids = get_localization(lang, priority).search(term)
+    if not ids and lang != "en":
+        ids = get_localization("en", priority).search(term)
+    return ids
+
+
+def get_penetration_matrix(priority: Priority = Priority.INTERACTIVE) -> Optional["PenetrationMatrix"]:
+    """
+    全弾薬の貫通マトリクスを返します (取得できない場合は None)。
+    弾薬データが更新されたときだけ計算し直す。
+    """
+    data = TarkovClient.run_query(get_ammo_query(), priority=priority)
+    if not data or not data.get('items'):
+        return None
+
+    def build(d):
+        from ballistics import PenetrationMatrix  # numpy は弾薬タブで初めて読み込む
+        return PenetrationMatrix(d['items'])
+
+    return _derive("penetration_matrix", (data,), build)
+
+
+def get_sale_table(priority: Priority = Priority.INTERACTIVE) -> Optional["SaleTable"]:
+    """全アイテムの売却価格表を返します (価格データが更新されたときだけ作り直す, 取得できない場合は None)。"""
+    market = get_market(priority)
+    if not market:
+        return None
+
+    def build(m):
+        from valuation import SaleTable  # numpy は一括査定で初めて読み込む
+        return SaleTable(m)
+
+    return _derive("sale_table", (market,), build)
+
+
+def get_name_index(lang: str, priority: Priority = Priority.INTERACTIVE) -> "NameIndex":
+    """アイテム名 (表示中の言語 + 英語)・略称・IDからアイテムIDを引く索引を返します。"""
+    locs = (get_localization(lang, priority),)
+    if lang != "en":
+        locs += (get_localization("en", priority),)
+
+    def build(*locs):
+        from valuation import NameIndex
+        return NameIndex(locs)
+
+    return _derive(("name_index", lang), locs, build)
+
+
+def ammo_query_caliber(caliber: str) -> str:
+    """口径の表示名をAPI検索用の文字列に変換します (" NATO" 等が付くとヒットしない場合がある)。"""
+    return caliber.replace(" NATO", "")
+
+
+@lru_cache(maxsize=None)
+def feature_queries(feature: str, lang: str) -> Tuple[str, ...]:
+    """
+    サイドバーの各機能が使うデータセットのクエリを返します。
+    リランのたびに先読みで参照されるため、クエリ文字列の生成は1度だけ行う。
+    """
+    localization = get_localization_query(lang)
+    if feature == "ammo":
+        return (localization, get_ammo_query()) + tuple(get_ammo_query(ammo_query_caliber(c)) for c in CALIBERS)
+    if feature == "price":
+        return (localization, get_items_query(), get_tasks_query(), get_barters_query()) + tuple(
+            get_items_by_category_query(cats) for cats in CATEGORY_MODES.values()
+        )
+    if feature == "task":
+        return (localization, get_tasks_query())
+    if feature == "craft":
+        return (localization, get_all_crafts_query(), get_items_query())
+    return ()
+
+
+def warm_queries() -> List[str]:
+    """起動時に温めておくクエリ (全機能 x 全言語, 重複なし)。"""
+    queries: List[str] = []
+    for lang in LANGUAGES:
+        for feature in ("craft", "task", "ammo", "price"):
+            for query in feature_queries(feature, lang):
+                if query not in queries:
+                    queries.append(query)
+    return queries
+
+
+_prefetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+_prefetching: Set[str] = set()
+_prefetching_lock = threading.Lock()
+
+
+def prefetch(feature: str, lang: str) -> None:
+    """
+    選択中の機能で次に必要になるデータセットを、先読みの優先度でバックグラウンド取得します。
+    キャッシュに新しい応答があるもの・取得中のものはスキップする。
+    """
+    for query in feature_queries(feature, lang):
+        entry = TarkovClient.freshness(query)
+        if entry is not None and not entry.stale:
+            continue
+        with _prefetching_lock:
+            if query in _prefetching:
+                continue
+            _prefetching.add(query)
+
+        def task(query=query):
+            try:
+                TarkovClient.warm(query, Priority.PREFETCH)
+            finally:
+                with _prefetching_lock:
+                    _prefetching.discard(query)
+
+        _prefetcher.submit(task)
@@ -0,0 +1,5 @@
+#!/bin/sh
+# キャッシュウォーマーをバックグラウンドで起動し、Streamlitと並行してデータを取得する
+python warmup.py &
+
+exec streamlit run app.py --server.port=8501 --server.address=0.0.0.0
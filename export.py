@@ -0,0 +1,210 @@
+"""
+ヘッドレスAPI (server.py) と CLI (cli.py) が共有するデータセットと書き出し処理。
+
+データは画面と同じ TarkovClient のキャッシュ (TARKOV_CACHE_DIR を指定すればプロセス間で共有) から
+取得するため、機械的な利用者が増えても上流APIへのリクエストは増えない。
+行はジェネレータで1件ずつ作り、JSON / NDJSON / CSV は逐次書き出す。
+Parquet は pyarrow がインストールされている場合のみ対応し、一定行数ごとに行グループとして書き出す。
+"""
+import csv
+import json
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from api import TarkovClient, Priority, UpstreamError
+from queries import get_items_query, get_localization_query, get_tasks_query, get_all_crafts_query
+from data import get_localization, get_market, get_tasks, get_crafts, get_task_name_map, search_items
+from translations import get_translations
+from pricing import iter_price_rows, iter_craft_profits, iter_task_items
+
+# 機械的な利用は画面操作より優先度を下げる (ユーザーの検索を待たせない)
+HEADLESS_PRIORITY = Priority.BACKGROUND
+
+FORMATS = ("json", "ndjson", "csv", "parquet")
+CONTENT_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Parquetの行グループあたりの行数
+PARQUET_BATCH_ROWS = 10000
+
+
+class Dataset(NamedTuple):
+    """
+    書き出し可能なデータセットの定義。
+
+    Attributes:
+        fields (Tuple[Tuple[str, str], ...]): (列名, 型) の並び。型は "str" / "int" / "float"。
+        rows (Callable): (lang, **filters) を受け取り行 (dict) を返すイテレータを作る関数。
+        description (str): データセットの説明。
+        filters (Dict[str, Callable[[str], Any]]): 絞り込み条件名 -> 型 (str / int / bool)。
+    """
+    fields: Tuple[Tuple[str, str], ...]
+    rows: Callable[..., Iterator[Dict[str, Any]]]
+    description: str
+    filters: Dict[str, Callable[[str], Any]] = {}
+
+    def parse_filters(self, params: Dict[str, str]) -> Dict[str, Any]:
+        """
+        クエリパラメータ・コマンドライン引数から絞り込み条件を作ります。未知のキーは無視する。
+
+        Raises:
+            ValueError: 数値の条件に数値以外が指定された場合。
+        """
+        filters = {}
+        for key, kind in self.filters.items():
+            value = params.get(key)
+            if value is None or value == "":
+                continue
+            if isinstance(value, str):
+                value = value.lower() in ("1", "true", "yes", "on") if kind is bool else kind(value)
+            filters[key] = value
+        return filters
+
+
+def _require(*queries: str) -> None:
+    """元データを1度も取得できていない場合は UpstreamError を送出します (空の結果と区別するため)。"""
+    missing = [q for q in queries if TarkovClient.freshness(q) is None]
+    if missing:
+        raise UpstreamError(f"data unavailable (upstream {TarkovClient.upstream_state()})")
+
+
+def price_rows(lang: str = "ja", q: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """アイテム価格一覧 (q を指定した場合は名前検索の結果のみ)。"""
+    market = get_market(HEADLESS_PRIORITY)
+    loc = get_localization(lang, HEADLESS_PRIORITY)
+    task_map = get_task_name_map(lang, HEADLESS_PRIORITY)
+    _require(get_items_query(), get_localization_query(lang))
+    item_ids = search_items(q, lang, HEADLESS_PRIORITY) if q else None
+    return iter_price_rows(market, loc, item_ids, task_map, get_translations(lang))
+
+
+def craft_rows(lang: str = "ja", station: Optional[str] = None, max_level: Optional[int] = None,
+               item: str = "", exclude_loss: bool = False) -> Iterator[Dict[str, Any]]:
+    """クラフト収支一覧。"""
+    crafts = get_crafts(HEADLESS_PRIORITY)
+    market = get_market(HEADLESS_PRIORITY)
+    loc = get_localization(lang, HEADLESS_PRIORITY)
+    _require(get_all_crafts_query(), get_items_query(), get_localization_query(lang))
+    return iter_craft_profits(crafts, market, loc, station, max_level, item, exclude_loss)
+
+
+def task_item_rows(lang: str = "ja") -> Iterator[Dict[str, Any]]:
+    """タスク納品アイテムの必要数と価格。"""
+    tasks = get_tasks(HEADLESS_PRIORITY)
+    market = get_market(HEADLESS_PRIORITY)
+    loc = get_localization(lang, HEADLESS_PRIORITY)
+    task_map = get_task_name_map(lang, HEADLESS_PRIORITY)
+    _require(get_tasks_query(), get_items_query(), get_localization_query(lang))
+    return iter_task_items(tasks, market, loc, task_map, get_translations(lang))
+
+
+DATASETS: Dict[str, Dataset] = {
+    "prices": Dataset((
+        ("id", "str"), ("name", "str"), ("short_name", "str"), ("avg24h_price", "int"),
+        ("flea_price", "int"), ("trader", "str"), ("trader_price", "int"), ("trader_requirements", "str"),
+        ("sell_to", "str"), ("sell_price", "int"), ("link", "str"),
+    ), price_rows, "アイテム価格 (フリマ・トレーダー売買)", {"q": str}),
+    "crafts": Dataset((
+        ("station", "str"), ("level", "int"), ("product", "str"), ("materials", "str"),
+        ("revenue", "int"), ("cost", "int"), ("profit", "int"), ("duration_sec", "int"),
+        ("profit_per_hour", "float"),
+    ), craft_rows, "クラフト利益", {"station": str, "max_level": int, "item": str, "exclude_loss": bool}),
+    "task-items": Dataset((
+        ("id", "str"), ("name", "str"), ("task_traders", "str"), ("task_count", "int"),
+        ("total_count", "int"), ("fir_count", "int"), ("flea_price", "int"), ("trader", "str"),
+        ("trader_price", "int"), ("trader_requirements", "str"),
+    ), task_item_rows, "タスク納品アイテムの必要数と価格"),
+}
+
+
+def write_json(rows: Iterable[Dict[str, Any]], fp: IO[str]) -> int:
+    """行をJSON配列として逐次書き出し、書き出した行数を返します。"""
+    count = 0
+    fp.write("[")
+    for row in rows:
+        fp.write(",\n" if count else "\n")
+        fp.write(json.dumps(row, ensure_ascii=False))
+        count += 1
+    fp.write("\n]\n" if count else "]\n")
+    return count
+
+
+def write_ndjson(rows: Iterable[Dict[str, Any]], fp: IO[str]) -> int:
+    """行を1行1オブジェクトのJSON (NDJSON) として逐次書き出します。"""
+    count = 0
+    for row in rows:
+        fp.write(json.dumps(row, ensure_ascii=False))
+        fp.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(rows: Iterable[Dict[str, Any]], fp: IO[str], fields: List[str]) -> int:
+    """行をヘッダー付きCSVとして逐次書き出します (None は空欄)。"""
+    writer = csv.DictWriter(fp, fieldnames=fields, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_parquet(rows: Iterable[Dict[str, Any]], fp: IO[bytes], fields: Tuple[Tuple[str, str], ...],
+                  batch_rows: int = PARQUET_BATCH_ROWS) -> int:
+    """
+    行をParquetとして書き出します。PARQUET_BATCH_ROWS 行ごとに行グループを確定させる。
+
+    Raises:
+        RuntimeError: pyarrow がインストールされていない場合。
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet形式の書き出しには pyarrow が必要です (pip install pyarrow)")
+
+    types = {"str": pa.string(), "int": pa.int64(), "float": pa.float64()}
+    schema = pa.schema([(name, types[kind]) for name, kind in fields])
+
+    count = 0
+    with pq.ParquetWriter(fp, schema) as writer:
+        batch: List[Dict[str, Any]] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        # 0行の場合も列定義だけのファイルを書く
+        if batch or not count:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def write_rows(fmt: str, dataset: Dataset, rows: Iterable[Dict[str, Any]], fp: IO) -> int:
+    """
+    指定形式で行を書き出します。
+
+    Args:
+        fmt (str): FORMATS のいずれか。
+        dataset (Dataset): 列定義に使うデータセット。
+        rows (Iterable[Dict]): 行。
+        fp (IO): json/ndjson/csv はテキスト、parquet はバイナリのファイルオブジェクト。
+
+    Returns:
+        int: 書き出した行数。
+    """
+    if fmt == "json":
+        return write_json(rows, fp)
+    if fmt == "ndjson":
+        return write_ndjson(rows, fp)
+    if fmt == "csv":
+        return write_csv(rows, fp, [name for name, _ in dataset.fields])
+    if fmt == "parquet":
+        return write_parquet(rows, fp, dataset.fields)
+    raise ValueError(f"unknown format: {fmt}")
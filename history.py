@@ -0,0 +1,330 @@
+"""
+アイテム価格の履歴を記録・検索するための追記専用の列指向ストア。
+
+レイアウト (base_dir 以下):
+    items.json          列番号 -> アイテムID の対応 (追記のみ)
+    open/ts.i64         書き込み中セグメントの時刻 (int64, UNIX秒)
+    open/prices.i32     書き込み中セグメントの価格 (int32, 行=スナップショット, 列=アイテム)
+    open/meta.json      書き込み中セグメントの列数
+    seg_<開始>_<終了>[_c].npz
+                        封印済みセグメント。時刻とアイテム毎の価格列を
+                        時間方向の差分 (int32) で保持し、zip圧縮する。
+                        アイテム毎に別メンバーなので1アイテムの検索で他の列は展開しない。
+
+書き込み中セグメントは np.memmap で読み、行数が上限に達したら封印する。
+ディスク使用量が上限を超えた場合は古いセグメントから間引き (_c)、それでも超える場合は削除する。
+価格 0 は「価格なし」を表す。
+"""
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+# 既定の保存先と記録間隔 (環境変数で変更可能)
+DEFAULT_HISTORY_DIR = os.environ.get(
+    "TARKOV_HISTORY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "history")
+)
+DEFAULT_MIN_INTERVAL = int(os.environ.get("TARKOV_HISTORY_INTERVAL", "300"))
+DEFAULT_MAX_BYTES = int(os.environ.get("TARKOV_HISTORY_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# 1セグメントあたりの行数 (5分間隔で約2週間)
+SEGMENT_ROWS = 4096
+# 容量超過時に古いセグメントを間引く間隔 (5分間隔 -> 1時間間隔)
+COMPACT_STRIDE = 12
+
+_SEGMENT_PREFIX = "seg_"
+
+
+def _delta_encode(values: np.ndarray, dtype=np.int32) -> np.ndarray:
+    """先頭値と隣接差分の配列に変換します (価格は int32、時刻は int64)。"""
+    return np.diff(values.astype(np.int64), prepend=0).astype(dtype)
+
+
+def _delta_decode(encoded: np.ndarray) -> np.ndarray:
+    return np.cumsum(encoded, dtype=np.int64)
+
+
+def moving_average(prices: np.ndarray, window: int) -> np.ndarray:
+    """
+    単純移動平均を計算します (先頭 window-1 点は NaN)。
+
+    Args:
+        prices (np.ndarray): 価格の配列。
+        window (int): 平均を取る点数。
+
+    Returns:
+        np.ndarray: prices と同じ長さの float64 配列。
+    """
+    result = np.full(len(prices), np.nan)
+    if window <= 0 or len(prices) < window:
+        return result
+    cumsum = np.cumsum(np.insert(prices.astype(np.float64), 0, 0.0))
+    result[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return result
+
+
+class PriceHistory:
+    """価格スナップショットの追記と、期間指定・間引き付きの検索を行うストア。"""
+
+    def __init__(
+        self,
+        base_dir: str = DEFAULT_HISTORY_DIR,
+        min_interval: int = DEFAULT_MIN_INTERVAL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.base_dir = base_dir
+        self.min_interval = min_interval
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._open_dir = os.path.join(base_dir, "open")
+        os.makedirs(self._open_dir, exist_ok=True)
+
+        self._items: List[str] = self._load_json(os.path.join(base_dir, "items.json"), [])
+        self._columns: Dict[str, int] = {item_id: i for i, item_id in enumerate(self._items)}
+        self._width: int = self._load_json(os.path.join(self._open_dir, "meta.json"), {}).get("width", len(self._items))
+        self._rows = self._repair_open_segment()
+        self._last_ts = self._read_last_ts()
+
+    # --- 永続化ヘルパー ---
+
+    @staticmethod
+    def _load_json(path: str, default):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    @staticmethod
+    def _write_json(path: str, value) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+
+    def _open_path(self, name: str) -> str:
+        return os.path.join(self._open_dir, name)
+
+    def _repair_open_segment(self) -> int:
+        """書き込み途中で落ちた場合に備え、時刻と価格の行数を揃えます。"""
+        ts_path, prices_path = self._open_path("ts.i64"), self._open_path("prices.i32")
+        ts_rows = os.path.getsize(ts_path) // 8 if os.path.exists(ts_path) else 0
+        row_bytes = max(self._width, 1) * 4
+        price_rows = os.path.getsize(prices_path) // row_bytes if os.path.exists(prices_path) else 0
+        rows = min(ts_rows, price_rows)
+        if ts_rows != rows:
+            os.truncate(ts_path, rows * 8)
+        if os.path.exists(prices_path) and os.path.getsize(prices_path) != rows * row_bytes:
+            os.truncate(prices_path, rows * row_bytes)
+        return rows
+
+    def _read_last_ts(self) -> int:
+        if self._rows:
+            return int(np.memmap(self._open_path("ts.i64"), dtype=np.int64, mode="r")[self._rows - 1])
+        segments = self._segments()
+        return segments[-1][1] if segments else 0
+
+    def _segments(self) -> List[Tuple[int, int, str]]:
+        """封印済みセグメントを (開始時刻, 終了時刻, パス) の時刻順で返します。"""
+        segments = []
+        for name in os.listdir(self.base_dir):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(".npz"):
+                parts = name[len(_SEGMENT_PREFIX):-4].split("_")
+                segments.append((int(parts[0]), int(parts[1]), os.path.join(self.base_dir, name)))
+        segments.sort()
+        return segments
+
+    # --- 書き込み ---
+
+    def due(self, now: Optional[float] = None) -> bool:
+        """次のスナップショットを記録する時刻に達しているかを返します。"""
+        now = time.time() if now is None else now
+        return now - self._last_ts >= self.min_interval
+
+    def record(self, prices: Mapping[str, Optional[int]], now: Optional[float] = None) -> bool:
+        """
+        全アイテムの価格スナップショットを1行追記します。
+
+        Args:
+            prices (Mapping[str, Optional[int]]): アイテムID -> 価格 (None は価格なし)。
+            now (Optional[float]): 記録時刻 (UNIX秒)。省略時は現在時刻。
+
+        Returns:
+            bool: 記録した場合はTrue。前回から min_interval 未満の場合、前回以前の時刻の場合はFalse。
+        """
+        ts = int(time.time() if now is None else now)
+        with self._lock:
+            if ts <= self._last_ts or ts - self._last_ts < self.min_interval:
+                return False
+
+            new_ids = [item_id for item_id in prices if item_id not in self._columns]
+            if new_ids:
+                for item_id in new_ids:
+                    self._columns[item_id] = len(self._items)
+                    self._items.append(item_id)
+                self._write_json(os.path.join(self.base_dir, "items.json"), self._items)
+
+            # 列数が変わった場合は現在のセグメントを封印して新しい幅で始める
+            if len(self._items) != self._width:
+                self._seal()
+                self._width = len(self._items)
+                self._write_json(self._open_path("meta.json"), {"width": self._width})
+
+            row = np.zeros(self._width, dtype=np.int32)
+            for item_id, price in prices.items():
+                if price:
+                    row[self._columns[item_id]] = min(int(price), np.iinfo(np.int32).max)
+
+            with open(self._open_path("prices.i32"), "ab") as f:
+                f.write(row.tobytes())
+            with open(self._open_path("ts.i64"), "ab") as f:
+                f.write(np.int64(ts).tobytes())
+            self._rows += 1
+            self._last_ts = ts
+
+            if self._rows >= SEGMENT_ROWS:
+                self._seal()
+            return True
+
+    def _open_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """書き込み中セグメントを memmap で返します (時刻, 価格行列)。"""
+        if not self._rows:
+            return np.empty(0, dtype=np.int64), np.empty((0, self._width), dtype=np.int32)
+        ts = np.memmap(self._open_path("ts.i64"), dtype=np.int64, mode="r", shape=(self._rows,))
+        prices = np.memmap(self._open_path("prices.i32"), dtype=np.int32, mode="r", shape=(self._rows, self._width))
+        return ts, prices
+
+    def _seal(self) -> None:
+        """書き込み中セグメントを差分符号化して圧縮セグメントに書き出します。"""
+        if not self._rows:
+            return
+        ts, prices = self._open_arrays()
+        path = os.path.join(self.base_dir, f"{_SEGMENT_PREFIX}{int(ts[0])}_{int(ts[-1])}.npz")
+        self._write_segment(path, np.asarray(ts), np.asarray(prices))
+        del ts, prices
+
+        for name in ("ts.i64", "prices.i32"):
+            os.remove(self._open_path(name))
+        self._rows = 0
+        self._enforce_budget()
+
+    @staticmethod
+    def _write_segment(path: str, ts: np.ndarray, prices: np.ndarray) -> None:
+        members = {"ts": _delta_encode(ts, np.int64)}
+        for col in range(prices.shape[1]):
+            members[f"p{col}"] = _delta_encode(prices[:, col])
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **members)
+        os.replace(tmp, path)
+        _load_member.cache_clear()
+
+    def _enforce_budget(self) -> None:
+        """ディスク使用量を max_bytes 以下に保ちます (古い順に間引き、次に削除)。"""
+        segments = self._segments()
+        total = sum(os.path.getsize(path) for _, _, path in segments)
+        for start, end, path in segments:
+            if total <= self.max_bytes:
+                return
+            if path.endswith("_c.npz"):
+                continue
+            with np.load(path) as archive:
+                width = len(archive.files) - 1
+                ts = _delta_decode(archive["ts"])[::COMPACT_STRIDE]
+                prices = np.column_stack(
+                    [_delta_decode(archive[f"p{col}"])[::COMPACT_STRIDE] for col in range(width)]
+                ) if width else np.empty((len(ts), 0), dtype=np.int64)
+            size = os.path.getsize(path)
+            compacted = os.path.join(self.base_dir, f"{_SEGMENT_PREFIX}{start}_{end}_c.npz")
+            self._write_segment(compacted, ts, prices)
+            os.remove(path)
+            total += os.path.getsize(compacted) - size
+
+        # 間引きでファイルが置き換わっているため、一覧と合計を取り直してから古い順に削除する
+        segments = self._segments()
+        total = sum(os.path.getsize(path) for _, _, path in segments)
+        for _, _, path in segments:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+        _load_member.cache_clear()
+
+    # --- 検索 ---
+
+    def series(
+        self,
+        item_id: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        max_points: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        指定アイテムの価格推移を返します。
+
+        Args:
+            item_id (str): アイテムID。
+            start (Optional[int]): 開始時刻 (UNIX秒, 含む)。
+            end (Optional[int]): 終了時刻 (UNIX秒, 含む)。
+            max_points (Optional[int]): 指定時はこの点数以下になるよう等間隔のバケットで平均化する。
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (時刻 int64, 価格 float64)。価格なしの点は含まない。
+        """
+        col = self._columns.get(item_id)
+        if col is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        start = 0 if start is None else start
+        end = np.iinfo(np.int64).max if end is None else end
+
+        ts_parts, price_parts = [], []
+        with self._lock:
+            for seg_start, seg_end, path in self._segments():
+                if seg_end < start or seg_start > end:
+                    continue
+                seg_prices = _load_member(path, f"p{col}")
+                if seg_prices is None:
+                    # 列追加前のセグメントにはこのアイテムの列がない
+                    continue
+                ts_parts.append(_load_member(path, "ts"))
+                price_parts.append(seg_prices)
+
+            open_ts, open_prices = self._open_arrays()
+            if len(open_ts) and col < open_prices.shape[1]:
+                ts_parts.append(np.array(open_ts))
+                price_parts.append(np.array(open_prices[:, col], dtype=np.int64))
+
+        if not ts_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        ts = np.concatenate(ts_parts)
+        prices = np.concatenate(price_parts)
+        mask = (ts >= start) & (ts <= end) & (prices > 0)
+        ts, prices = ts[mask], prices[mask].astype(np.float64)
+
+        if max_points and len(ts) > max_points:
+            ts, prices = self._downsample(ts, prices, max_points)
+        return ts, prices
+
+    @staticmethod
+    def _downsample(ts: np.ndarray, prices: np.ndarray, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+        """等間隔の時間バケットごとに平均を取って点数を減らします。"""
+        edges = np.linspace(ts[0], ts[-1] + 1, max_points + 1)
+        buckets = np.searchsorted(edges, ts, side="right") - 1
+        counts = np.bincount(buckets, minlength=max_points)
+        sums = np.bincount(buckets, weights=prices, minlength=max_points)
+        ts_sums = np.bincount(buckets, weights=ts.astype(np.float64), minlength=max_points)
+        filled = counts > 0
+        return (ts_sums[filled] / counts[filled]).astype(np.int64), sums[filled] / counts[filled]
+
+
+@lru_cache(maxsize=1024)
+def _load_member(path: str, member: str) -> Optional[np.ndarray]:
+    """封印済みセグメントから1メンバーだけを展開して復号します (セグメントは不変なのでキャッシュ可)。"""
+    with np.load(path) as archive:
+        if member not in archive.files:
+            return None
+        return _delta_decode(archive[member])
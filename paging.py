@@ -0,0 +1,136 @@
+"""
+大量の検索結果をページ単位で描画するためのヘルパー。
+
+表示中のページだけを構築 (価格計算など) し、次のページはバックグラウンドで先行構築しておく。
+ウィジェット数はページサイズで頭打ちになるため、ヒット件数に関係なく描画時間が一定になる。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Tuple
+
+import streamlit as st
+
+# ページサイズ (環境変数で既定値を変更可能)
+DEFAULT_PAGE_SIZE = int(os.environ.get("TARKOV_PAGE_SIZE", "20"))
+PAGE_SIZE_OPTIONS = tuple(sorted({10, 20, 50, 100, DEFAULT_PAGE_SIZE}))
+
+# 先行構築したページの保持数 (古いものから破棄) と有効期間 (秒)
+_MAX_PREFETCHED = 64
+_PAGE_TTL = 300
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="page-prefetch")
+_pages: "OrderedDict[Tuple[Hashable, ...], Tuple[float, Future]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def select_page(key: str, total: int, page_size: int, label: str, signature: Hashable = None) -> int:
+    """
+    ページ番号の選択ウィジェットを描画し、現在のページ (0始まり) を返します。
+
+    Args:
+        key (str): ウィジェットのキー接頭辞。
+        total (int): 結果の総件数。
+        page_size (int): 1ページあたりの件数。
+        label (str): ページ番号入力欄のラベル。
+        signature (Hashable): 結果セットを一意に表す値。変わった場合 (検索語やフィルタの変更) は先頭ページに戻す。
+
+    Returns:
+        int: 現在のページ番号 (0始まり)。
+    """
+    pages = max(1, -(-total // page_size))
+    state_key = f"{key}_page"
+    signature_key = f"{key}_page_signature"
+    # 検索条件が変わった場合、結果件数が減った場合は先頭ページに戻す
+    # (ページ番号は Session State だけで管理し、ウィジェットには既定値を渡さない)
+    if (state_key not in st.session_state or st.session_state.get(signature_key) != signature
+            or st.session_state[state_key] > pages):
+        st.session_state[state_key] = 1
+    st.session_state[signature_key] = signature
+    if pages <= 1:
+        return 0
+    page = st.number_input(label, min_value=1, max_value=pages, step=1, key=state_key)
+    return int(page) - 1
+
+
+def page_bounds(page: int, page_size: int, total: int) -> Tuple[int, int]:
+    """ページ番号から [start, end) の範囲を返します。"""
+    start = min(page * page_size, total)
+    return start, min(start + page_size, total)
+
+
+def _lookup(cache_key: Tuple[Hashable, ...]) -> Optional[Future]:
+    entry = _pages.get(cache_key)
+    if entry is None:
+        return None
+    created, future = entry
+    if time.monotonic() - created > _PAGE_TTL:
+        del _pages[cache_key]
+        return None
+    _pages.move_to_end(cache_key)
+    return future
+
+
+def _store(cache_key: Tuple[Hashable, ...], future: Future) -> None:
+    _pages[cache_key] = (time.monotonic(), future)
+    while len(_pages) > _MAX_PREFETCHED:
+        _pages.popitem(last=False)
+
+
+def _prefetch(cache_key: Tuple[Hashable, ...], build: Callable[[Sequence[Any]], List[Any]], chunk: Sequence[Any]) -> None:
+    with _lock:
+        if _lookup(cache_key) is None:
+            _store(cache_key, _executor.submit(build, chunk))
+
+
+def _get_or_build(cache_key: Tuple[Hashable, ...], build: Callable[[Sequence[Any]], List[Any]], chunk: Sequence[Any]) -> List[Any]:
+    with _lock:
+        future = _lookup(cache_key)
+    if future is not None:
+        return future.result()
+
+    # 先行構築されていないページは呼び出し元のスレッドで直接構築する
+    result = build(chunk)
+    future = Future()
+    future.set_result(result)
+    with _lock:
+        _store(cache_key, future)
+    return result
+
+
+def build_page(
+    key: str,
+    signature: Hashable,
+    items: Sequence[Any],
+    build: Callable[[Sequence[Any]], List[Any]],
+    page: int,
+    page_size: int,
+    version: Hashable = None,
+) -> List[Any]:
+    """
+    指定ページの要素だけを構築して返し、次のページをバックグラウンドで先行構築します。
+
+    Args:
+        key (str): 結果セットの種類を表すキー。
+        signature (Hashable): 結果セットを一意に表す値 (検索語や言語など)。
+        items (Sequence[Any]): 全結果 (未加工)。
+        build (Callable): ページ分の要素を受け取り表示用データのリストを返す関数。
+            バックグラウンドスレッドから呼ばれるため st.session_state に触れてはいけない。
+        page (int): 現在のページ番号 (0始まり)。
+        page_size (int): 1ページあたりの件数。
+        version (Hashable): 元データの版 (応答の取得時刻など)。データの更新後に古いページを返さないためキャッシュのキーに含める。
+
+    Returns:
+        List[Any]: 現在ページの表示用データ。
+    """
+    total = len(items)
+    start, end = page_bounds(page, page_size, total)
+    current = _get_or_build((key, signature, version, page_size, page), build, items[start:end])
+
+    next_start, next_end = page_bounds(page + 1, page_size, total)
+    if next_start < next_end:
+        _prefetch((key, signature, version, page_size, page + 1), build, items[next_start:next_end])
+
+    return current
@@ -0,0 +1,241 @@
+"""
+価格・クラフト利益・タスク納品アイテムの計算。
+
+Streamlit に依存しないため、画面 (app.py) とヘッドレスAPI・CLI (server.py, cli.py) で共有する。
+行は1件ずつ yield するので、エクスポートでは全件をメモリに載せずに書き出せる。
+"""
+from typing import Any, Dict, Iterator, List, Optional
+
+from data import Localization
+from translations import CompiledTranslations, get_translations
+
+
+def normalize_name(name: str) -> str:
+    """名前をAPIのnormalizedName形式 (小文字ケバブケース) に変換します。"""
+    return name.lower().replace(" ", "-")
+
+
+def format_requirements(reqs: List[Dict[str, Any]], task_map: Optional[Dict[str, str]] = None,
+                        tr: Optional[CompiledTranslations] = None) -> str:
+    """トレーダー購入条件 (信頼度レベル・タスク完了) を表示用の文字列にします。"""
+    if not reqs:
+        return ""
+    if tr is None:
+        tr = get_translations("ja")
+    ll_fmt = tr.formatter("req_ll")
+    parts = []
+    for r in reqs:
+        if r['type'] == 'loyaltyLevel':
+            parts.append(ll_fmt(r['value']))
+        elif r['type'] == 'questCompleted':
+            val = str(r['value'])
+            task_name = task_map.get(val, val) if task_map else tr("req_quest")
+            parts.append(f"{task_name}")
+    return ", ".join(parts)
+
+
+def get_price_info(item: Dict[str, Any], task_map: Optional[Dict[str, str]] = None,
+                   tr: Optional[CompiledTranslations] = None, loc: Optional[Localization] = None) -> Dict[str, Any]:
+    """
+    アイテムの購入価格情報 (フリマ価格、最安トレーダーとその購入条件) を返します。
+
+    Returns:
+        Dict[str, Any]: {'flea_price': フリマ価格, 'trader': {'price', 'name', 'req'} または None}
+    """
+    buy_for = item.get('buyFor') or []
+
+    # フリマ
+    flea_listing = next((x for x in buy_for if x['vendor']['name'] == 'Flea Market'), None)
+    flea_price = flea_listing['price'] if flea_listing else item.get('avg24hPrice')
+
+    # トレーダー (フリマ以外) の価格があるものから最安を探す
+    valid_deals = [x for x in buy_for if x['vendor']['name'] != 'Flea Market' and x.get('price') is not None]
+    trader_info = None
+    if valid_deals:
+        best_deal = min(valid_deals, key=lambda x: x['price'])
+        trader_info = {
+            'price': best_deal['price'],
+            'name': loc.trader_name(best_deal['vendor']) if loc else best_deal['vendor']['name'],
+            'req': format_requirements(best_deal.get('requirements', []), task_map, tr)
+        }
+
+    return {
+        'flea_price': flea_price,
+        'trader': trader_info
+    }
+
+
+def calculate_price(item: Dict[str, Any]) -> Optional[int]:
+    """アイテムの評価額 (avg24hPrice -> フリマ -> トレーダーの順に採用)。"""
+    price = item.get('avg24hPrice')
+    if price is None:
+        buy_for = item.get('buyFor') or []
+        flea = next((x['price'] for x in buy_for if x['vendor']['name'] == 'Flea Market'), None)
+        if flea:
+            price = flea
+        else:
+            trader_prices = [x['price'] for x in buy_for if x['vendor']['name'] != 'Flea Market' and x.get('price') is not None]
+            if trader_prices:
+                price = min(trader_prices)
+    return price
+
+
+def best_sell(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """最も高く売れる売却先 (sellFor の要素) を返します。"""
+    valid_sells = [x for x in item.get('sellFor') or [] if x.get('price') is not None]
+    return max(valid_sells, key=lambda x: x['price']) if valid_sells else None
+
+
+def iter_price_rows(market: Dict[str, Dict[str, Any]], loc: Localization, item_ids: Optional[List[str]] = None,
+                    task_map: Optional[Dict[str, str]] = None,
+                    tr: Optional[CompiledTranslations] = None) -> Iterator[Dict[str, Any]]:
+    """
+    アイテムの価格一覧を1行ずつ返します。
+
+    Args:
+        market (Dict): アイテムID -> アイテム (data.get_market の結果)。
+        loc (Localization): 名前テーブル。
+        item_ids (List[str], optional): 対象アイテムID。省略時は全アイテム。
+        task_map (Dict[str, str], optional): 購入条件のタスク名解決用。
+        tr (CompiledTranslations, optional): 購入条件の表示に使う翻訳。
+    """
+    for item_id in item_ids if item_ids is not None else market:
+        item = market.get(item_id)
+        if item is None:
+            continue
+        info = get_price_info(item, task_map, tr, loc)
+        sell = best_sell(item)
+        trader = info['trader'] or {}
+        yield {
+            'id': item_id,
+            'name': loc.item_name(item_id),
+            'short_name': loc.item_short_name(item_id),
+            'avg24h_price': item.get('avg24hPrice'),
+            'flea_price': info['flea_price'] or None,
+            'trader': trader.get('name'),
+            'trader_price': trader.get('price'),
+            'trader_requirements': trader.get('req'),
+            'sell_to': loc.trader_name(sell['vendor']) if sell else None,
+            'sell_price': sell['price'] if sell else None,
+            'link': item.get('link'),
+        }
+
+
+def iter_craft_profits(crafts: List[Dict[str, Any]], market: Dict[str, Dict[str, Any]], loc: Localization,
+                       station: Optional[str] = None, max_level: Optional[int] = None,
+                       item_filter: str = "", exclude_loss: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    クラフトごとの収支を1行ずつ返します (価格は calculate_price で評価)。
+
+    Args:
+        crafts (List[Dict]): 全クラフトレシピ (data.get_crafts の結果)。
+        market (Dict): アイテムID -> アイテム。
+        loc (Localization): 名前テーブル。
+        station (str, optional): ステーション名 (英語表記)。省略時は全ステーション。
+        max_level (int, optional): この値以下のステーションレベルのレシピのみ。
+        item_filter (str): 完成品の名前に含まれる文字列で絞り込む。
+        exclude_loss (bool): 赤字のレシピを除外する。
+    """
+    station_key = normalize_name(station) if station else None
+    item_filter = item_filter.lower()
+    for craft in crafts:
+        # ステーションフィルタ (normalizedNameを使用)
+        if station_key and craft['station']['normalizedName'] != station_key:
+            continue
+
+        # レベルフィルタ
+        level = craft.get('level') or 0
+        if max_level is not None and level > max_level:
+            continue
+
+        # 報酬 (完成品) 計算
+        total_revenue = 0
+        reward_names = []
+        for reward in craft.get('rewardItems', []):
+            item_id = reward['item']['id']
+            count = reward['count']
+            total_revenue += (calculate_price(market.get(item_id, {})) or 0) * count
+            reward_names.append(f"{loc.item_name(item_id)} x{count}")
+
+        # アイテム名フィルタ
+        if item_filter and item_filter not in " ".join(reward_names).lower():
+            continue
+
+        # コスト (材料) 計算
+        total_cost = 0
+        required_names = []
+        for req in craft.get('requiredItems', []):
+            item_id = req['item']['id']
+            count = req['count']
+            total_cost += (calculate_price(market.get(item_id, {})) or 0) * count
+            required_names.append(f"{loc.item_name(item_id)} x{count}")
+
+        profit = total_revenue - total_cost
+        if exclude_loss and profit < 0:
+            continue
+
+        duration_sec = craft.get('duration') or 1
+        yield {
+            'station': craft['station']['name'],
+            'level': level,
+            'product': ", ".join(reward_names),
+            'materials': ", ".join(required_names),
+            'revenue': total_revenue,
+            'cost': total_cost,
+            'profit': profit,
+            'duration_sec': duration_sec,
+            'profit_per_hour': profit / duration_sec * 3600,
+        }
+
+
+def task_item_demand(tasks: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    タスクの納品目標をアイテムごとに集計します。
+
+    Returns:
+        Dict[str, Dict]: アイテムID -> {'total_count', 'fir_count', 'tasks' (タスクIDの集合),
+                         'traders' (依頼主のトレーダーオブジェクト, normalizedName -> trader)}
+    """
+    demand: Dict[str, Dict[str, Any]] = {}
+    for task in tasks:
+        for obj in task.get('objectives', []):
+            # TaskObjectiveItem 以外は item キーがない場合がある
+            item = obj.get('item')
+            if not item:
+                continue
+            entry = demand.setdefault(item['id'], {
+                'total_count': 0,
+                'fir_count': 0,
+                'tasks': set(),
+                'traders': {}
+            })
+            count = obj.get('count', 1)
+            entry['total_count'] += count
+            if obj.get('foundInRaid'):
+                entry['fir_count'] += count
+            entry['tasks'].add(task['id'])
+            trader = task.get('trader')
+            if trader:
+                entry['traders'][trader['normalizedName']] = trader
+    return demand
+
+
+def iter_task_items(tasks: List[Dict[str, Any]], market: Dict[str, Dict[str, Any]], loc: Localization,
+                    task_map: Optional[Dict[str, str]] = None,
+                    tr: Optional[CompiledTranslations] = None) -> Iterator[Dict[str, Any]]:
+    """タスクで納品が必要なアイテムを、必要数と購入価格付きで1行ずつ返します。"""
+    for item_id, entry in task_item_demand(tasks).items():
+        info = get_price_info(market.get(item_id, {}), task_map, tr, loc)
+        trader = info['trader'] or {}
+        yield {
+            'id': item_id,
+            'name': loc.item_name(item_id),
+            'task_traders': ", ".join(sorted(loc.trader_name(x) for x in entry['traders'].values())),
+            'task_count': len(entry['tasks']),
+            'total_count': entry['total_count'],
+            'fir_count': entry['fir_count'],
+            'flea_price': info['flea_price'] or None,
+            'trader': trader.get('name'),
+            'trader_price': trader.get('price'),
+            'trader_requirements': trader.get('req'),
+        }
@@ -0,0 +1,279 @@
+"""
+本番環境向けのオンデマンドなサンプリングプロファイラ。
+
+対象スレッドのスタックを別スレッドから一定間隔で採取し (sys._current_frames)、
+speedscope 形式 (https://www.speedscope.app で開ける) と flamegraph.pl 用の折り畳み形式で保存する。
+スクリプトを止めたりトレース関数を仕込んだりしないため、有効にしたままでも負荷は採取間隔分だけで済む。
+
+有効化:
+    TARKOV_PROFILE=rerun        一定の割合のリラン (app.py のスクリプト全体) を記録する
+    TARKOV_PROFILE=query        一定の割合の上流APIへの取得 (TarkovClient.run_query のキャッシュミス) を記録する
+    TARKOV_PROFILE=rerun,query  両方
+    ?profile=<TARKOV_PROFILE_TOKEN>
+                                そのリランを必ず記録する (管理者用, トークン未設定の場合は無効)
+
+本番の負荷下でも安全なように、同時に記録するのは1件だけとし、
+自動の記録は確率 (TARKOV_PROFILE_RATE) と最小間隔 (TARKOV_PROFILE_MIN_GAP) で間引く。
+1件の記録時間は TARKOV_PROFILE_MAX_SECONDS で打ち切り、保存数は TARKOV_PROFILE_KEEP 件まで (古いものから削除)。
+"""
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from types import FrameType
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = {m.strip() for m in os.environ.get("TARKOV_PROFILE", "").split(",") if m.strip()}
+PROFILE_TOKEN = os.environ.get("TARKOV_PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get(
+    "TARKOV_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles")
+)
+# 採取間隔 (ms, 下限 1ms)
+PROFILE_INTERVAL_MS = max(1.0, float(os.environ.get("TARKOV_PROFILE_INTERVAL_MS", "5")))
+# 自動の記録を行う割合と最小間隔 (秒)
+PROFILE_RATE = float(os.environ.get("TARKOV_PROFILE_RATE", "0.05"))
+PROFILE_MIN_GAP = float(os.environ.get("TARKOV_PROFILE_MIN_GAP", "30"))
+PROFILE_MAX_SECONDS = float(os.environ.get("TARKOV_PROFILE_MAX_SECONDS", "30"))
+PROFILE_KEEP = int(os.environ.get("TARKOV_PROFILE_KEEP", "200"))
+
+# (ファイル名, 関数名, 定義行)
+FrameKey = Tuple[str, str, int]
+
+_lock = threading.Lock()
+_active: Optional["Profile"] = None
+_last_auto = 0.0
+_stats = Counter()
+
+
+class Profile:
+    """
+    1件の記録。対象スレッドの root フレームより下 (root を含む) のスタックだけを集計する。
+
+    Attributes:
+        kind (str): 記録の種類 ("rerun" / "query")。
+        context (Dict[str, Any]): 保存時に一緒に書き出す文脈 (機能、言語、入力値など)。
+    """
+
+    def __init__(self, kind: str, context: Dict[str, Any], thread_id: int, root: FrameType):
+        self.kind = kind
+        self.context = context
+        self._thread_id = thread_id
+        self._root: Optional[FrameType] = root
+        self._samples: Counter = Counter()
+        self._started = time.time()
+        self._elapsed = 0.0
+        self._done = threading.Event()
+        self._finish_lock = threading.Lock()
+        self._finished = False
+        self.path: Optional[str] = None
+        self._sampler = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._sampler.start()
+
+    def _run(self) -> None:
+        interval = PROFILE_INTERVAL_MS / 1000
+        started = time.perf_counter()
+        while not self._done.wait(interval):
+            if time.perf_counter() - started > PROFILE_MAX_SECONDS:
+                logger.info("profile %s stopped after %.0fs", self.kind, PROFILE_MAX_SECONDS)
+                break
+            stack = self._sample()
+            if stack is None:
+                # root フレームがスタックから消えた (st.stop / st.rerun などで終了の処理を通らなかった)
+                break
+            self._samples[stack] += 1
+        self._elapsed = time.perf_counter() - started
+        if not self._done.is_set():
+            finish(self)
+
+    def _sample(self) -> Optional[Tuple[FrameKey, ...]]:
+        frame = sys._current_frames().get(self._thread_id)
+        stack: List[FrameKey] = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+            if frame is self._root:
+                return tuple(reversed(stack))
+            frame = frame.f_back
+        return None
+
+    def _stop(self) -> bool:
+        """採取を止めます (2回目以降の呼び出しは False)。"""
+        with self._finish_lock:
+            if self._finished:
+                return False
+            self._finished = True
+        self._done.set()
+        if threading.current_thread() is not self._sampler:
+            self._sampler.join()
+        self._root = None
+        return True
+
+    def write(self, directory: str) -> str:
+        """speedscope 形式と折り畳み形式で保存し、speedscope ファイルのパスを返します。"""
+        os.makedirs(directory, exist_ok=True)
+        label = "_".join(str(self.context.get(k)) for k in ("feature", "lang") if self.context.get(k))
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self._started))
+        base = os.path.join(directory, f"{stamp}_{int(self._started * 1000) % 1000:03d}_{self.kind}"
+                                       + (f"_{label}" if label else ""))
+
+        frames: Dict[FrameKey, int] = {}
+        samples, weights = [], []
+        for stack, count in self._samples.most_common():
+            samples.append([frames.setdefault(key, len(frames)) for key in stack])
+            weights.append(count * PROFILE_INTERVAL_MS)
+        name = f"{self.kind} {label}".strip()
+        document = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "tarkov-dashboard profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [
+                {"name": func, "file": filename, "line": line} for filename, func, line in frames
+            ]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+            # 以下は speedscope では使われない (記録時の文脈)
+            "context": {
+                **self.context,
+                "kind": self.kind,
+                "started": self._started,
+                "elapsed_ms": round(self._elapsed * 1000, 1),
+                "interval_ms": PROFILE_INTERVAL_MS,
+                "samples": sum(self._samples.values()),
+            },
+        }
+        with open(base + ".speedscope.json", "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, default=str)
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for stack, count in self._samples.items():
+                line = ";".join(f"{func} ({os.path.basename(filename)}:{first})" for filename, func, first in stack)
+                f.write(f"{line} {count}\n")
+        return base + ".speedscope.json"
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """管理者用トークンが一致するかどうか (トークンが設定されていなければ常に False)。"""
+    return bool(PROFILE_TOKEN and token and hmac.compare_digest(str(token), PROFILE_TOKEN))
+
+
+def start(kind: str, context: Optional[Dict[str, Any]] = None, requested: bool = False,
+          root: Optional[FrameType] = None) -> Optional[Profile]:
+    """
+    呼び出し元のスレッドの記録を開始します。記録しない場合は None。
+
+    Args:
+        kind (str): 記録の種類 ("rerun" / "query")。
+        context (Optional[Dict[str, Any]]): 記録と一緒に保存する文脈。
+        requested (bool): 管理者が明示的に要求した記録かどうか (確率・最小間隔の間引きをしない)。
+        root (Optional[FrameType]): 集計の起点にするフレーム (省略時は呼び出し元のフレーム)。
+
+    Returns:
+        Optional[Profile]: 開始した記録。終了時は finish() に渡す。
+    """
+    global _active, _last_auto
+    if not requested and kind not in PROFILE_MODES:
+        return None
+    now = time.time()
+    with _lock:
+        if _active is not None:
+            _stats["skipped_busy"] += 1
+            return None
+        if not requested:
+            if now - _last_auto < PROFILE_MIN_GAP or random.random() >= PROFILE_RATE:
+                _stats["skipped_rate"] += 1
+                return None
+            _last_auto = now
+        _active = Profile(kind, dict(context or {}), threading.get_ident(), root or sys._getframe(1))
+        _stats["started"] += 1
+        return _active
+
+
+def finish(profile: Optional[Profile]) -> Optional[str]:
+    """記録を終了して保存し、保存先のパスを返します (既に終了していれば None)。"""
+    global _active
+    if profile is None or not profile._stop():
+        return None
+    saved = False
+    try:
+        profile.path = profile.write(PROFILE_DIR)
+        saved = True
+        logger.info("profile saved: %s", profile.path)
+        _prune(PROFILE_DIR, PROFILE_KEEP)
+    except OSError as e:
+        logger.warning("failed to save profile: %s", e)
+    finally:
+        with _lock:
+            _stats["saved" if saved else "failed"] += 1
+            if _active is profile:
+                _active = None
+    return profile.path
+
+
+@contextmanager
+def profile(kind: str, context: Optional[Dict[str, Any]] = None) -> Iterator[Optional[Profile]]:
+    """with ブロックの間を記録します (記録対象でなければ何もしない)。"""
+    current = start(kind, context, root=sys._getframe(2))
+    try:
+        yield current
+    finally:
+        finish(current)
+
+
+def _prune(directory: str, keep: int) -> None:
+    """保存数が上限を超えたら古い記録から削除します。"""
+    names = sorted(n for n in os.listdir(directory) if n.endswith(".speedscope.json"))
+    for name in names[:max(0, len(names) - keep)]:
+        base = os.path.join(directory, name[:-len(".speedscope.json")])
+        for suffix in (".speedscope.json", ".folded"):
+            try:
+                os.remove(base + suffix)
+            except OSError:
+                pass
+
+
+def script_inputs(namespace: Mapping[str, Any], limit: int = 200) -> Dict[str, Any]:
+    """
+    スクリプトの変数から、入力値らしい単純な値 (文字列・数値・真偽値とそのリスト) を取り出します。
+    文字列は limit 文字で切り詰める。
+    """
+    def simple(value: Any) -> bool:
+        return value is None or isinstance(value, (str, int, float, bool))
+
+    inputs = {}
+    for name, value in namespace.items():
+        if name.startswith("_") or name.isupper():
+            continue
+        if isinstance(value, (list, tuple)) and len(value) <= 20 and all(simple(v) for v in value):
+            value = [v[:limit] if isinstance(v, str) else v for v in value]
+        elif not simple(value):
+            continue
+        inputs[name] = value[:limit] if isinstance(value, str) else value
+    return inputs
+
+
+def stats() -> Dict[str, Any]:
+    """記録の統計 (開始・保存・間引いた件数) と設定。"""
+    with _lock:
+        return {
+            "modes": sorted(PROFILE_MODES),
+            "rate": PROFILE_RATE,
+            "min_gap": PROFILE_MIN_GAP,
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "active": _active is not None,
+            **_stats,
+        }
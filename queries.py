@@ -1,17 +1,29 @@
-def get_ammo_query(caliber: str, lang: str = "ja") -> str:
+"""
+GraphQLクエリの生成。
+
+数値・構造データ (価格、クラフト、タスク、バーター) は言語に依存しない形で1度だけ取得し、
+名前・説明文は言語ごとの小さなテーブル (get_localization_query) から ID で結合する。
+そのため言語指定 (lang) を受け取るのは get_localization_query のみ。
+"""
+from typing import Optional
+
+
+def get_ammo_query(caliber: Optional[str] = None) -> str:
     """
     指定された口径の弾薬情報を取得するクエリを生成します。
+    口径名は英語表記で検索する (言語非依存)。省略した場合は全弾薬 (貫通マトリクス用)。
     """
+    name_filter = f', name: "{caliber}"' if caliber else ""
     return f"""
     {{
-        items(categoryNames: Ammo, name: "{caliber}", lang: {lang}) {{
-            name
-            shortName
+        items(categoryNames: Ammo{name_filter}) {{
+            id
             avg24hPrice
             buyFor {{
                 price
                 vendor {{
                     name
+                    normalizedName
                 }}
                 requirements {{
                     type
@@ -20,134 +32,168 @@ def get_ammo_query(caliber: str, lang: str = "ja") -> str:
             }}
             properties {{
                 ... on ItemPropertiesAmmo {{
+                    caliber
                     damage
                     penetrationPower
                     fragmentationChance
+                    projectileCount
                 }}
             }}
         }}
     }}
     """
 
-def get_item_price_query(search_term: str, lang: str = "ja") -> str:
+def get_items_query() -> str:
     """
-    アイテム名を検索して価格情報を取得するクエリを生成します。
+    全アイテムの価格情報 (フリマ・トレーダー売買価格) を取得するクエリ。
+    キーワード検索や価格履歴はこのデータセットをローカルで引く。
     """
-    return f"""
-    {{
-        items(name: "{search_term}", lang: {lang}) {{
-            name
-            shortName
+    return """
+    {
+        items {
+            id
             avg24hPrice
-            buyFor {{
+            buyFor {
                 price
-                vendor {{
+                vendor {
                     name
-                }}
-                requirements {{
+                    normalizedName
+                }
+                requirements {
                     type
                     value
-                }}
-            }}
-            sellFor {{
+                }
+            }
+            sellFor {
                 price
-                vendor {{
+                vendor {
                     name
-                }}
-            }}
+                    normalizedName
+                }
+            }
             link
-        }}
-    }}
+        }
+    }
     """
 
-def get_tasks_query(trader_name: str, lang: str = "ja") -> str:
+def get_localization_query(lang: str = "ja") -> str:
     """
-    指定されたトレーダーのタスク一覧を取得するクエリ。
+    指定言語の名前・説明文テーブル (アイテム、タスク、トレーダー、マップ) を取得するクエリ。
     """
     return f"""
     {{
+        items(lang: {lang}) {{
+            id
+            name
+            shortName
+        }}
         tasks(limit: 1000, lang: {lang}) {{
+            id
             name
+            objectives {{
+                id
+                description
+            }}
+        }}
+        traders(lang: {lang}) {{
+            normalizedName
+            name
+        }}
+        maps(lang: {lang}) {{
+            normalizedName
+            name
+        }}
+    }}
+    """
+
+def get_tasks_query() -> str:
+    """
+    全タスクの構造データ (依頼主、マップ、レベル、前提タスク、納品アイテム) を取得するクエリ。
+    トレーダーでの絞り込みはクライアント側で行う。
+    """
+    return """
+    {
+        tasks(limit: 1000) {
+            id
             tarkovDataId
             minPlayerLevel
-            trader {{
+            kappaRequired
+            taskRequirements {
+                task {
+                    id
+                }
+                status
+            }
+            trader {
                 name
                 normalizedName
-            }}
-            map {{
+            }
+            map {
                 name
-            }}
-            objectives {{
-                description
-            }}
+                normalizedName
+            }
+            objectives {
+                id
+                ... on TaskObjectiveItem {
+                    item {
+                        id
+                    }
+                    count
+                    foundInRaid
+                }
+            }
             wikiLink
-        }}
-    }}
+        }
+    }
     """
 
-def get_all_crafts_query(lang: str = "ja") -> str:
+def get_all_crafts_query() -> str:
     """
-    全てのクラフトレシピと価格情報を取得するクエリ。
-    特定ステーションのフィルタリングはクライアント側で行う。
+    全てのクラフトレシピを取得するクエリ。
+    特定ステーションのフィルタリングはクライアント側で行い、価格は get_items_query の結果から引く。
     """
-    return f"""
-    {{
-        crafts(lang: {lang}) {{
-            station {{
+    return """
+    {
+        crafts {
+            station {
                 name
                 normalizedName
-            }}
+            }
             level
             duration
-            rewardItems {{
+            rewardItems {
                 count
-                item {{
-                    name
-                    shortName
-                    avg24hPrice
-                    buyFor {{
-                        price
-                        vendor {{
-                            name
-                        }}
-                    }}
-                }}
-            }}
-            requiredItems {{
+                item {
+                    id
+                }
+            }
+            requiredItems {
                 count
-                item {{
-                    name
-                    shortName
-                    avg24hPrice
-                    buyFor {{
-                        price
-                        vendor {{
-                            name
-                        }}
-                    }}
-                }}
-            }}
-        }}
-    }}
+                item {
+                    id
+                }
+            }
+        }
+    }
     """
 
-def get_items_by_category_query(category_names: list[str], lang: str = "ja") -> str:
+def get_items_by_category_query(category_names: list[str]) -> str:
     """
     指定されたカテゴリのアイテム一覧を取得するクエリ。
     """
     # カテゴリリストをGraphQLのEnum形式文字列に変換 (例: [Ammo, Meds])
     cats_str = ", ".join(category_names)
-    
+
     return f"""
     {{
-        items(categoryNames: [{cats_str}], limit: 100, lang: {lang}) {{
-            name
-            shortName
+        items(categoryNames: [{cats_str}], limit: 100) {{
+            id
             avg24hPrice
             buyFor {{
                 price
                 vendor {{
                     name
+                    normalizedName
                 }}
                 requirements {{
                     type
@@ -158,6 +204,7 @@ def get_items_by_category_query(category_names: list[str], lang: str = "ja") ->
                 price
                 vendor {{
                     name
+                    normalizedName
                 }}
             }}
             link
@@ -165,80 +212,31 @@ def get_items_by_category_query(category_names: list[str], lang: str = "ja") ->
     }}
     """
 
-def get_task_items_query(lang: str = "ja") -> str:
+def get_barters_query() -> str:
     """
-    タスクで使用されるアイテム（納品目標）を取得するクエリ。
+    全てのバーター (交換) レシピを取得するクエリ。
+    入手 (報酬側) と素材利用 (要求側) の検索はクライアント側で行う。
     """
-    return f"""
-    {{
-        tasks(limit: 200, lang: {lang}) {{
-            name
-            trader {{
+    return """
+    {
+        barters {
+            trader {
                 name
-            }}
-            objectives {{
-                ... on TaskObjectiveItem {{
-                    item {{
-                        name
-                        shortName
-                        avg24hPrice
-                        buyFor {{
-                            price
-                            vendor {{
-                                name
-                            }}
-                            requirements {{
-                                type
-                                value
-                            }}
-                        }}
-                        link
-                    }}
-                    count
-                    foundInRaid
-                }}
-            }}
-        }}
-    }}
-    """
-
-def get_barter_items_query(search_term: str, lang: str = "ja") -> str:
-    """
-    指定されたアイテム名に関連するバーター情報を取得するクエリ。
-    入手(bartersFor)と素材利用(bartersUsing)の両方を取得。
-    """
-    return f"""
-    {{
-        items(name: "{search_term}", lang: {lang}, limit: 20) {{
-            name
-            shortName
-            link
-            bartersFor {{
-                trader {{
-                    name
-                }}
-                level
-                requiredItems {{
-                    count
-                    item {{
-                        name
-                        shortName
-                    }}
-                }}
-            }}
-            bartersUsing {{
-                trader {{
-                    name
-                }}
-                level
-                rewardItems {{
-                    count
-                    item {{
-                        name
-                        shortName
-                    }}
-                }}
-            }}
-        }}
-    }}
+                normalizedName
+            }
+            level
+            requiredItems {
+                count
+                item {
+                    id
+                }
+            }
+            rewardItems {
+                count
+                item {
+                    id
+                }
+            }
+        }
+    }
     """
@@ -0,0 +1,146 @@
+"""
+ヘッドレスJSON API。
+
+Streamlit の画面を介さずに、画面と同じデータ層・計算 (export.py / pricing.py) から結果を返す。
+ボットや表計算ソフトからの取得用で、スクリプト全体の再実行が発生しない。
+
+エンドポイント:
+    GET /v1/<dataset>?lang=ja&format=json&...  データセット (prices / crafts / task-items) の書き出し
+    GET /v1                                     データセットの一覧と列定義
+    GET /metrics                                上流APIの状態とレート制限の統計
+    GET /health                                 死活確認
+
+使い方:
+    python server.py --port 8502
+"""
+import argparse
+import io
+import json
+import logging
+import os
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+from urllib.parse import parse_qsl, urlsplit
+
+import profiling
+from api import TarkovClient, UpstreamError
+from data import LANGUAGES
+from export import CONTENT_TYPES, DATASETS, FORMATS, write_rows
+
+logger = logging.getLogger(__name__)
+
+API_HOST = os.environ.get("TARKOV_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("TARKOV_API_PORT", "8502"))
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """
+    1リクエスト = 1スレッドで処理するハンドラ。
+
+    HTTP/1.0 で応答し、本文は長さを指定せずに逐次書き出して接続を閉じる (大きな一覧もメモリに溜めない)。
+    """
+    server_version = "TarkovDashboardAPI/1.0"
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        path = url.path.rstrip("/")
+
+        if path == "/health":
+            self._send_json({"status": "ok"})
+        elif path == "/metrics":
+            self._send_json({
+                "upstream": TarkovClient.upstream_state(),
+                "rate_limit": TarkovClient.metrics(),
+                "profiling": profiling.stats(),
+            })
+        elif path == "/v1":
+            self._send_json({
+                name: {"description": ds.description, "fields": dict(ds.fields), "filters": list(ds.filters)}
+                for name, ds in DATASETS.items()
+            })
+        elif path.startswith("/v1/") and path[4:] in DATASETS:
+            self._send_dataset(path[4:], params)
+        else:
+            self._send_json({"error": "not found"}, HTTPStatus.NOT_FOUND)
+
+    def _send_json(self, body: Any, status: HTTPStatus = HTTPStatus.OK) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_dataset(self, name: str, params: Dict[str, str]) -> None:
+        dataset = DATASETS[name]
+        fmt = params.get("format", "json")
+        lang = params.get("lang", "ja")
+        if fmt not in FORMATS or lang not in LANGUAGES:
+            self._send_json({"error": "invalid format or lang"}, HTTPStatus.BAD_REQUEST)
+            return
+        try:
+            rows = dataset.rows(lang, **dataset.parse_filters(params))
+        except ValueError as e:
+            self._send_json({"error": str(e)}, HTTPStatus.BAD_REQUEST)
+            return
+        except UpstreamError as e:
+            self._send_json({"error": str(e)}, HTTPStatus.SERVICE_UNAVAILABLE)
+            return
+
+        if fmt == "parquet":
+            # Parquetはフッターを書くまで完成しないため、メモリ上で作ってから送る
+            buffer = io.BytesIO()
+            try:
+                write_rows(fmt, dataset, rows, buffer)
+            except RuntimeError as e:
+                self._send_json({"error": str(e)}, HTTPStatus.NOT_IMPLEMENTED)
+                return
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", CONTENT_TYPES[fmt])
+            self.send_header("Content-Length", str(buffer.tell()))
+            self.end_headers()
+            self.wfile.write(buffer.getvalue())
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", f"{CONTENT_TYPES[fmt]}; charset=utf-8")
+        self.end_headers()
+        out = io.TextIOWrapper(self.wfile, encoding="utf-8", newline="", write_through=True)
+        try:
+            write_rows(fmt, dataset, rows, out)
+            out.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("client disconnected during %s export", name)
+        finally:
+            out.detach()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+def serve(host: str = API_HOST, port: int = API_PORT) -> None:
+    """APIサーバーを起動します (Ctrl+C で終了)。"""
+    httpd = ThreadingHTTPServer((host, port), ApiHandler)
+    httpd.daemon_threads = True
+    logger.info("serving on http://%s:%d", host, port)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tarkov Dashboard のヘッドレスJSON API")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+結果テーブル構築用の共通レイヤー。
+
+各タブは行ごとの辞書を作らず、列ごとのリスト/配列を渡す。
+ここで適切なdtype (int32 / Int64 / float32 / category) の列に変換してDataFrameを組み立て、
+ソートは数値列のまま行い、表示フォーマットは st.column_config にのみ任せる。
+
+numpy / pandas はテーブルを実際に作るときに初めて読み込む (表を使わないタブの起動を重くしない)。
+"""
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Sequence, Union
+
+import streamlit as st
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class Column(NamedTuple):
+    """
+    テーブルの1列の定義。
+
+    Attributes:
+        key (str): DataFrame上の列名 (言語に依存しない内部キー)。
+        label (str): 表示用のラベル (翻訳済み)。
+        kind (str): 列の種類。"text", "category", "int", "price", "float", "percent" のいずれか。
+        fmt (Optional[str]): 数値列のフォーマット (printf 形式 (例: "%.0f min") または "localized" などの名前)。
+            "price" 列の既定は桁区切り付きの "localized"。
+        unit (Optional[str]): ラベルの後ろに付ける単位 (例: "₽")。
+    """
+    key: str
+    label: str
+    kind: str = "text"
+    fmt: Optional[str] = None
+    unit: Optional[str] = None
+
+
+def _to_array(values: Sequence[Any], kind: str) -> Any:
+    """列の種類に応じたdtypeの配列 (numpy配列またはpandasの拡張配列) へ変換します。"""
+    import numpy as np
+    import pandas as pd
+
+    if kind == "category":
+        return pd.Categorical(values)
+    if kind == "int":
+        return np.asarray(values, dtype=np.int32)
+    if kind == "price":
+        # 価格は欠損 (売られていない) があり得るため nullable な整数を使う。
+        # 一括査定の合計などは int32 の上限 (約21億) を超えるため Int64 にする
+        raw = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(raw)
+        return pd.arrays.IntegerArray(np.where(missing, 0, raw).astype(np.int64), missing)
+    if kind == "float":
+        return np.asarray(values, dtype=np.float32)
+    if kind == "percent":
+        # 0.0-1.0 の比率を百分率で保持
+        return np.asarray(values, dtype=np.float32) * np.float32(100)
+    return np.asarray(values, dtype=object)
+
+
+def build_table(
+    columns: List[Column],
+    data: Dict[str, Sequence[Any]],
+    sort_by: Optional[Union[str, List[str]]] = None,
+    ascending: Union[bool, List[bool]] = False,
+) -> "pd.DataFrame":
+    """
+    列定義と列データから型付きのDataFrameを構築します。
+
+    Args:
+        columns (List[Column]): 列定義のリスト (表示順)。
+        data (Dict[str, Sequence[Any]]): 列キーごとの値のシーケンス。
+        sort_by (Optional[Union[str, List[str]]]): ソートに使う列キー。
+        ascending (Union[bool, List[bool]]): 昇順でソートするかどうか。
+
+    Returns:
+        pd.DataFrame: 列キーを列名に持つDataFrame。
+    """
+    import pandas as pd
+
+    frame = pd.DataFrame({col.key: _to_array(data[col.key], col.kind) for col in columns}, copy=False)
+    if sort_by is not None:
+        frame = frame.sort_values(by=sort_by, ascending=ascending, kind="stable", na_position="last")
+    return frame
+
+
+def column_config(columns: List[Column]) -> Dict[str, Any]:
+    """列定義から st.dataframe 用の column_config を生成します。"""
+    config = {}
+    for col in columns:
+        label = f"{col.label} ({col.unit})" if col.unit else col.label
+        if col.kind in ("text", "category"):
+            config[col.key] = st.column_config.TextColumn(label)
+        else:
+            # printf 形式では桁区切りを付けられないため、価格は "localized" (1,234,567) で表示し単位はラベルに付ける
+            fmt = col.fmt or ("localized" if col.kind == "price" else None)
+            config[col.key] = st.column_config.NumberColumn(label, format=fmt)
+    return config
+
+
+def render_table(frame: "pd.DataFrame", columns: List[Column]) -> None:
+    """構築済みのテーブルを表示します (フォーマットは column_config で適用)。"""
+    st.dataframe(frame, column_config=column_config(columns), use_container_width=True)
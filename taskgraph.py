@@ -0,0 +1,154 @@
+"""
+タスクの依存関係グラフ (DAG)。
+
+タスクの前提条件 (taskRequirements) からデータセットごとに1度だけ構築し、
+トポロジカル順序、推移閉包 (前提タスク・解放されるタスクの集合)、
+あるタスクに到達するまでに必要な納品アイテムの累計を事前計算する。
+タスクの集合は Python の int をビット集合として扱う (ビット i = i 番目のタスク)。
+「タスクXを受注できるようになるまでに何を集めればよいか」は表の参照だけで答えられる。
+"""
+import logging
+from typing import Any, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# アイテムID -> (必要数, うちインレイド品の数)
+ItemDemand = Dict[str, Tuple[int, int]]
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """ビット集合に含まれる番号を小さい順に返します。"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def _add_demand(total: Dict[str, List[int]], items: ItemDemand) -> None:
+    for item_id, (count, fir) in items.items():
+        entry = total.setdefault(item_id, [0, 0])
+        entry[0] += count
+        entry[1] += fir
+
+
+def _freeze(total: Dict[str, List[int]]) -> ItemDemand:
+    return {item_id: (count, fir) for item_id, (count, fir) in total.items()}
+
+
+class TaskGraph:
+    """
+    タスクの依存関係グラフと事前計算済みの表。
+
+    Attributes:
+        tasks (List[Dict[str, Any]]): グラフを作ったタスクの構造データ (番号順)。
+            画面ではタスク一覧もここから取り、グラフと一覧が別々の応答から作られないようにする。
+        ids (List[str]): タスクID (番号順)。
+        index (Dict[str, int]): タスクID -> 番号。
+        order (List[int]): トポロジカル順序 (前提タスクが必ず先に来る)。
+        requires (List[int]): 直接の前提タスクのビット集合。
+        unlocks (List[int]): 直接解放されるタスクのビット集合。
+        ancestors (List[int]): 到達までに完了が必要な全タスクのビット集合 (自身を含まない)。
+        descendants (List[int]): 完了により (間接的に) 解放される全タスクのビット集合。
+        kappa (int): Kappa (コレクター) に必要なタスクのビット集合。
+        items (List[ItemDemand]): 各タスク自身の納品アイテム。
+        unlock_demand (List[ItemDemand]): 受注できるようになるまでに必要な納品アイテムの累計 (前提タスクの合計)。
+        complete_demand (List[ItemDemand]): 完了までに必要な納品アイテムの累計 (前提タスク + 自身)。
+    """
+    __slots__ = ("tasks", "ids", "index", "order", "requires", "unlocks", "ancestors", "descendants", "kappa",
+                 "items", "unlock_demand", "complete_demand")
+
+    def __init__(self, tasks: List[Dict[str, Any]]):
+        self.tasks = tasks
+        self.ids = [task['id'] for task in tasks]
+        self.index = {task_id: i for i, task_id in enumerate(self.ids)}
+        n = len(self.ids)
+
+        self.requires = [0] * n
+        self.unlocks = [0] * n
+        self.kappa = 0
+        self.items: List[ItemDemand] = []
+        for i, task in enumerate(tasks):
+            for req in task.get('taskRequirements') or []:
+                # 依存先がデータセットにない (イベントタスク等) 場合は無視する
+                j = self.index.get((req.get('task') or {}).get('id'))
+                if j is not None and j != i:
+                    self.requires[i] |= 1 << j
+                    self.unlocks[j] |= 1 << i
+            if task.get('kappaRequired'):
+                self.kappa |= 1 << i
+            own: Dict[str, List[int]] = {}
+            for obj in task.get('objectives') or []:
+                item = obj.get('item')
+                if item:
+                    count = obj.get('count', 1)
+                    _add_demand(own, {item['id']: (count, count if obj.get('foundInRaid') else 0)})
+            self.items.append(_freeze(own))
+
+        self.order = self._topological_order()
+
+        # 推移閉包: トポロジカル順に前提タスクの閉包を合成する (逆順で子孫も同様)
+        self.ancestors = [0] * n
+        for i in self.order:
+            bits = self.requires[i]
+            for j in iter_bits(self.requires[i]):
+                bits |= self.ancestors[j]
+            self.ancestors[i] = bits
+        self.descendants = [0] * n
+        for i in reversed(self.order):
+            bits = self.unlocks[i]
+            for j in iter_bits(self.unlocks[i]):
+                bits |= self.descendants[j]
+            self.descendants[i] = bits
+
+        # 累計の必要アイテム (ひし形の依存で二重に数えないよう、閉包のビット集合から合計する)
+        self.unlock_demand: List[ItemDemand] = []
+        self.complete_demand: List[ItemDemand] = []
+        for i in range(n):
+            total: Dict[str, List[int]] = {}
+            for j in iter_bits(self.ancestors[i]):
+                _add_demand(total, self.items[j])
+            self.unlock_demand.append(_freeze(total))
+            _add_demand(total, self.items[i])
+            self.complete_demand.append(_freeze(total))
+
+    def _topological_order(self) -> List[int]:
+        """前提タスクが先に来る順序を返します (循環がある場合は残りを番号順に末尾へ置く)。"""
+        pending = [bin(bits).count("1") for bits in self.requires]
+        ready = [i for i, count in enumerate(pending) if count == 0]
+        order = []
+        while ready:
+            i = ready.pop()
+            order.append(i)
+            for j in iter_bits(self.unlocks[i]):
+                pending[j] -= 1
+                if pending[j] == 0:
+                    ready.append(j)
+        if len(order) < len(self.ids):
+            placed = set(order)
+            cyclic = [i for i in range(len(self.ids)) if i not in placed]
+            logger.warning("task requirements contain a cycle (%d tasks)", len(cyclic))
+            order.extend(cyclic)
+        return order
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self.index
+
+    def task_ids(self, bits: int) -> List[str]:
+        """ビット集合をトポロジカル順のタスクIDのリストに変換します。"""
+        return [self.ids[i] for i in self.order if bits >> i & 1]
+
+    def required_tasks(self, task_id: str) -> List[str]:
+        """受注までに完了が必要な全タスク (実行順)。"""
+        return self.task_ids(self.ancestors[self.index[task_id]])
+
+    def unlocked_tasks(self, task_id: str) -> List[str]:
+        """完了により (間接的に) 解放される全タスク (実行順)。"""
+        return self.task_ids(self.descendants[self.index[task_id]])
+
+    def is_kappa_relevant(self, task_id: str) -> bool:
+        """Kappa に必要なタスク、またはその前提タスクかどうか。"""
+        i = self.index[task_id]
+        return bool(self.kappa >> i & 1 or self.descendants[i] & self.kappa)
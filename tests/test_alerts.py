@@ -0,0 +1,49 @@
+"""alerts.py の閾値アラートのテスト。"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerts import AlertEngine, ABOVE, BELOW  # noqa: E402
+
+
+def test_crossing_in_each_direction_fires_once():
+    engine = AlertEngine()
+    below = engine.add_rule("u", "x", BELOW, 100)
+    above = engine.add_rule("u", "x", ABOVE, 200)
+
+    assert engine.update({"x": 150}) == 0
+    assert engine.update({"x": 90}) == 1
+    alerts = engine.drain("u")
+    assert [(a.rule, a.old_price, a.price) for a in alerts] == [(below, 150, 90)]
+
+    # 閾値を下回ったままの変動では再通知しない
+    assert engine.update({"x": 80}) == 0
+    assert engine.update({"x": 100}) == 0
+    assert engine.drain("u") == []
+
+    assert engine.update({"x": 250}) == 1
+    assert [a.rule for a in engine.drain("u")] == [above]
+    assert engine.update({"x": 300}) == 0
+
+    # 閾値の内側に戻ってから再び跨げば通知する
+    assert engine.update({"x": 150}) == 0
+    assert engine.update({"x": 100}) == 1
+    assert [a.rule for a in engine.drain("u")] == [below]
+
+
+def test_rule_fires_on_registration_when_already_met():
+    engine = AlertEngine()
+    engine.update({"x": 50})  # ルールがないアイテムの価格は保持しない
+    rule = engine.add_rule("u", "x", BELOW, 100, price=50)
+    assert [(a.rule, a.old_price) for a in engine.drain("u")] == [(rule, None)]
+    assert engine.update({"x": 40}) == 0
+
+
+def test_expire_removes_idle_users():
+    engine = AlertEngine(user_ttl=10)
+    engine.add_rule("u", "x", BELOW, 100)
+    assert engine.watched_items() == ["x"]
+    assert engine.expire(now=1e12) == 1
+    assert engine.rules("u") == []
+    assert engine.watched_items() == []
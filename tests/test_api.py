@@ -0,0 +1,120 @@
+"""api.py のレート制限・取得のまとめ (同じクエリの同時取得) のテスト。"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api  # noqa: E402
+from api import CircuitBreaker, Priority, RateGovernor, ResponseCache, TarkovClient  # noqa: E402
+
+
+class _Response:
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """上流APIの代わりに、送られたクエリを順に記録して少し遅れて応答する。"""
+    sent = []
+    lock = threading.Lock()
+
+    def post(url, json, timeout):
+        with lock:
+            sent.append(json["query"])
+        time.sleep(0.05)
+        return _Response({"data": {"query": json["query"]}})
+
+    monkeypatch.setattr(requests, "post", post)
+    monkeypatch.setattr(api, "_cache", ResponseCache(disk_dir=None))
+    monkeypatch.setattr(api, "_breaker", CircuitBreaker())
+    monkeypatch.setattr(api, "_inflight", {})
+    return sent
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _start(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_governor_grants_in_priority_order():
+    governor = RateGovernor(rate=20, burst=1)
+    governor._tokens = 0
+    granted = []
+    threads = [_start(lambda p: governor.acquire(p) and granted.append(p), p)
+               for p in (Priority.PREFETCH, Priority.BACKGROUND)]
+    _wait_for(lambda: governor.metrics()["background"]["queue_depth"] == 1)
+    threads.append(_start(lambda p: governor.acquire(p) and granted.append(p), Priority.INTERACTIVE))
+    for thread in threads:
+        thread.join(5)
+    assert granted == [Priority.INTERACTIVE, Priority.BACKGROUND, Priority.PREFETCH]
+
+
+def test_concurrent_fetches_of_same_query_share_one_request(upstream, monkeypatch):
+    monkeypatch.setattr(api, "_governor", RateGovernor(rate=100, burst=10))
+    results = []
+    threads = [_start(lambda: results.append(TarkovClient._fetch("q", Priority.INTERACTIVE).data)) for _ in range(5)]
+    for thread in threads:
+        thread.join(5)
+    assert upstream == ["q"]
+    assert results == [{"query": "q"}] * 5
+
+
+def test_interactive_follower_promotes_prefetch_leader(upstream, monkeypatch):
+    governor = RateGovernor(rate=10, burst=1)
+    governor._tokens = 0
+    monkeypatch.setattr(api, "_governor", governor)
+
+    # 定期更新のリクエストが待ち行列に並び、その後ろで同じクエリの先読みが待っている
+    background = [_start(TarkovClient._fetch, f"bg{i}", Priority.BACKGROUND) for i in range(5)]
+    _wait_for(lambda: governor.metrics()["background"]["queue_depth"] == 5)
+    leader = _start(TarkovClient._fetch, "q", Priority.PREFETCH)
+    _wait_for(lambda: governor.metrics()["prefetch"]["queue_depth"] == 1)
+
+    # ユーザー操作は先読みの結果を待つが、先読みの札が繰り上がるため定期更新より先に送られる
+    assert TarkovClient._fetch("q", Priority.INTERACTIVE).data == {"query": "q"}
+    assert upstream[0] == "q"
+    assert upstream.count("q") == 1
+
+    for thread in background + [leader]:
+        thread.join(5)
+    assert upstream.count("q") == 1 and len(upstream) == 6
+
+
+def test_refresh_failed_only_after_revalidation_fails(upstream, monkeypatch):
+    monkeypatch.setattr(api, "_governor", RateGovernor(rate=100, burst=10))
+    monkeypatch.setattr(api, "_refresh_failed", set())
+    monkeypatch.setattr(api, "CACHE_TTL", 0)
+    TarkovClient._fetch("q", Priority.INTERACTIVE)
+
+    # 古い応答を返しつつ再検証する (成功すれば警告の対象にならない)
+    assert TarkovClient.run_query("q", Priority.BACKGROUND) == {"query": "q"}
+    _wait_for(lambda: not api._revalidating)
+    assert not TarkovClient.refresh_failed("q")
+
+    def fail(url, json, timeout):
+        raise requests.exceptions.ConnectionError("down")
+
+    monkeypatch.setattr(requests, "post", fail)
+    assert TarkovClient.run_query("q", Priority.BACKGROUND) == {"query": "q"}
+    _wait_for(lambda: not api._revalidating)
+    assert TarkovClient.refresh_failed("q")
@@ -0,0 +1,43 @@
+"""export.py の書き出し処理のテスト。"""
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from export import Dataset, write_rows  # noqa: E402
+
+DATASET = Dataset((("id", "str"), ("name", "str"), ("price", "int")), lambda lang: iter(()), "test",
+                  {"min_price": int, "q": str, "craftable": bool})
+ROWS = [{"id": "a", "name": "弾薬", "price": 0}, {"id": "b", "name": "x,y", "price": None}]
+
+
+def _write(fmt, rows=ROWS):
+    fp = io.StringIO()
+    assert write_rows(fmt, DATASET, iter(rows), fp) == len(rows)
+    return fp.getvalue()
+
+
+def test_json_and_ndjson_round_trip():
+    assert json.loads(_write("json")) == ROWS
+    assert json.loads(_write("json", [])) == []
+    assert [json.loads(line) for line in _write("ndjson").splitlines()] == ROWS
+
+
+def test_csv_quotes_and_blanks_none():
+    assert _write("csv").splitlines() == ["id,name,price", "a,弾薬,0", 'b,"x,y",']
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        _write("xml")
+
+
+def test_parse_filters():
+    assert DATASET.parse_filters({"min_price": "100", "craftable": "yes", "other": "1"}) == \
+        {"min_price": 100, "craftable": True}
+    with pytest.raises(ValueError):
+        DATASET.parse_filters({"min_price": "abc"})
@@ -0,0 +1,54 @@
+"""history.py の価格履歴ストアのテスト。"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import history  # noqa: E402
+from history import PriceHistory  # noqa: E402
+
+
+def _segment_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, name))
+               for name in os.listdir(directory) if name.startswith("seg_"))
+
+
+def test_record_and_reopen(tmp_path):
+    store = PriceHistory(str(tmp_path), min_interval=300, max_bytes=1 << 30)
+    assert store.record({"a": 100, "b": None}, now=1000)
+    assert not store.record({"a": 999}, now=1100)  # 記録間隔未満
+    assert store.record({"a": 120, "b": 50}, now=1300)
+
+    reopened = PriceHistory(str(tmp_path), min_interval=300, max_bytes=1 << 30)
+    ts, prices = reopened.series("a")
+    assert ts.tolist() == [1000, 1300]
+    assert prices.tolist() == [100, 120]
+    # 価格なしの点は返さない
+    assert reopened.series("b")[0].tolist() == [1300]
+    # 再起動後も最後の記録時刻から間隔を数える
+    assert not reopened.record({"a": 1}, now=1400)
+
+
+def test_budget_is_enforced_after_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "SEGMENT_ROWS", 24)
+    rnd = np.random.default_rng(0)
+    items = [f"item{i}" for i in range(50)]
+
+    store = PriceHistory(str(tmp_path), min_interval=0, max_bytes=1 << 30)
+    for n in range(24 * 6):
+        store.record(dict(zip(items, rnd.integers(1000, 100000, len(items)).tolist())), now=n * 300)
+    full = _segment_bytes(str(tmp_path))
+    assert full > 0
+
+    budget = full // 3
+    store.max_bytes = budget
+    store._enforce_budget()
+    assert 0 < _segment_bytes(str(tmp_path)) <= budget
+    # 新しい期間 (最後のセグメント) が残る (間引かれていれば途中の点まで)
+    assert store.series("item0")[0][-1] >= 24 * 5 * 300
+
+    store.max_bytes = 1
+    store._enforce_budget()
+    assert _segment_bytes(str(tmp_path)) == 0
@@ -0,0 +1,28 @@
+"""tables.py の列変換のテスト。"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tables import Column, build_table, column_config  # noqa: E402
+
+
+def test_price_column_keeps_totals_above_int32():
+    # 一括査定の合計は int32 の上限 (2,147,483,647) を超え得る
+    frame = build_table([Column("t", "t", "price")], {"t": [3_000_000_000, 5, None]}, sort_by="t")
+    assert str(frame["t"].dtype) == "Int64"
+    assert frame["t"].tolist()[:2] == [3_000_000_000, 5]
+    assert frame["t"].isna().tolist() == [False, False, True]
+
+
+def test_price_column_keeps_zero_as_price():
+    # 売られていないのは None だけで、0 は価格として扱う (calculate_price の is not None と同じ)
+    frame = build_table([Column("p", "p", "price")], {"p": [0, None]})
+    assert frame["p"].isna().tolist() == [False, True]
+
+
+def test_price_column_uses_grouped_format_with_unit_in_label():
+    config = column_config([Column("p", "価格", "price", unit="₽"), Column("m", "時間", "float", "%.0f min")])
+    assert config["p"]["label"] == "価格 (₽)"
+    assert config["p"]["type_config"]["format"] == "localized"
+    assert config["m"]["type_config"]["format"] == "%.0f min"
@@ -1,3 +1,7 @@
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Tuple
+
 # UI翻訳データ
 TRANSLATIONS = {
     "ja": {
@@ -21,18 +25,39 @@ TRANSLATIONS = {
         "calculating": "計算中...",
         "no_data": "データが見つかりませんでした。",
         "price_format": "{:,} ₽",
+        "price_unit": "₽",
+        "hourly_unit": "₽/h",
         "not_sold": "売られていない",
         "ref_price": "参考価格",
         "wiki_link": "Wikiを見る",
         "sell_recommend": "売却推奨",
         "buy_price": "買取価格",
         "task_objective": "目標",
+        "task_requires": "前提タスク",
+        "task_unlocks": "解放されるタスク",
+        "kappa_only": "Kappaに必要なタスクのみ (前提タスクを含む)",
+        "task_plan": "到達計画",
+        "task_plan_target": "目標のタスク",
+        "task_plan_summary": "前提タスク {0} 件 / 完了で解放されるタスク {1} 件",
+        "task_plan_include_self": "目標のタスク自身の納品アイテムを含める",
+        "task_plan_no_items": "集める必要のあるアイテムはありません。",
         "flea_price": "フリマ平均価格",
         "search_mode_label": "検索モード",
         "search_mode_keyword": "キーワード検索",
         "search_mode_ammo": "弾薬一覧",
         "search_mode_meds": "医薬品・注射器",
         "search_mode_task_item": "タスク必要品リスト",
+        "search_mode_valuation": "一括査定",
+        "valuation_help": "1行に1アイテム (名前・略称, 数量は「x3」「, 3」「3 名前」の形式で指定可)。日本語名・英語名のどちらでも検索できます。",
+        "valuation_input": "アイテム一覧を貼り付け",
+        "valuation_upload": "またはファイルをアップロード (txt / csv)",
+        "valuation_exclude": "使わない売却先",
+        "valuation_total": "合計査定額",
+        "valuation_unresolved": "特定できなかった行 ({0}件)",
+        "col_channel": "売却先",
+        "col_count": "数量",
+        "col_unit_price": "単価",
+        "col_total": "合計",
         "task_item_count": "必要数",
         "task_item_fir": "FiR指定",
         "col_task_trader": "依頼トレーダー",
@@ -71,6 +96,44 @@ TRANSLATIONS = {
         "col_profit": "粗利益",
         "col_time": "所要時間",
         "col_profit_per_hour": "時間効率",
+        # 価格履歴
+        "price_history": "価格推移",
+        "history_range": "価格推移の表示期間",
+        "moving_average": "移動平均",
+
+        # 価格アラート
+        "watchlist": "ウォッチリスト",
+        "alert_direction": "価格アラート",
+        "alert_below": "この価格以下で通知",
+        "alert_above": "この価格以上で通知",
+        "alert_threshold": "閾値",
+        "alert_add": "追加",
+        "alert_added": "ウォッチリストに追加しました。",
+        "alert_limit": "登録できるアラートは{0}件までです。",
+        "alert_full": "アラートの登録数が上限に達しています。時間をおいて再度お試しください。",
+        "alert_fired_below": "{0} の価格が {1} になりました (閾値 {2} 以下)",
+        "alert_fired_above": "{0} の価格が {1} になりました (閾値 {2} 以上)",
+
+        # 貫通マトリクス
+        "penetration_matrix": "貫通マトリクス (アーマークラス別)",
+        "matrix_caliber": "口径",
+        "armor_durability": "アーマー耐久度",
+        "matrix_metric": "表示する指標",
+        "metric_chance": "貫通確率 (%)",
+        "metric_shots": "撃破弾数",
+        "metric_cost": "撃破あたりの弾薬費 (₽)",
+        "armor_class": "アーマークラス",
+        "matrix_note": "撃破弾数は胸部 (HP {0}) への命中を前提とした期待値です (非貫通時のダメージを含み、射撃中の耐久度の低下は考慮しません)。",
+
+        # データの鮮度
+        "data_age": "データ取得: {0}分前",
+        "data_stale": "APIから最新データを取得できていません。{0}分前のデータを表示しています (バックグラウンドで更新中)。",
+
+        # ページ送り
+        "page_size": "1ページの表示件数",
+        "page": "ページ",
+        "page_range": "{0}-{1} 件目 / 全 {2} 件",
+
         "disclaimer": "本アプリは非公式であり、Battlestate Gamesとは関係ありません。"
     },
     "en": {
@@ -94,18 +157,39 @@ TRANSLATIONS = {
         "calculating": "Calculating...",
         "no_data": "No data found.",
         "price_format": "₽ {:,}",
+        "price_unit": "₽",
+        "hourly_unit": "₽/h",
         "not_sold": "Not Sold",
         "ref_price": "Ref Price",
         "wiki_link": "Wiki",
         "sell_recommend": "Best Sell",
         "buy_price": "Buy Price",
         "task_objective": "Objectives",
+        "task_requires": "Requires",
+        "task_unlocks": "Unlocks",
+        "kappa_only": "Kappa-required tasks only (incl. prerequisites)",
+        "task_plan": "Unlock Plan",
+        "task_plan_target": "Target Task",
+        "task_plan_summary": "{0} prerequisite tasks / {1} tasks unlocked on completion",
+        "task_plan_include_self": "Include the target task's own items",
+        "task_plan_no_items": "No items to collect.",
         "flea_price": "Avg Flea Price",
         "search_mode_label": "Search Mode",
         "search_mode_keyword": "Keyword Search",
         "search_mode_ammo": "Ammo List",
         "search_mode_meds": "Medical & Injectors",
         "search_mode_task_item": "Task Items List",
+        "search_mode_valuation": "Bulk Valuation",
+        "valuation_help": "One item per line (name or short name; quantities as \"x3\", \", 3\" or \"3 name\"). Japanese and English names are both accepted.",
+        "valuation_input": "Paste an item list",
+        "valuation_upload": "Or upload a file (txt / csv)",
+        "valuation_exclude": "Excluded sale channels",
+        "valuation_total": "Total Value",
+        "valuation_unresolved": "Unresolved lines ({0})",
+        "col_channel": "Sell To",
+        "col_count": "Qty",
+        "col_unit_price": "Unit Price",
+        "col_total": "Total",
         "task_item_count": "Count",
         "task_item_fir": "FiR Req",
         "col_task_trader": "Task Trader",
@@ -144,6 +228,83 @@ TRANSLATIONS = {
         "col_profit": "Profit",
         "col_time": "Time",
         "col_profit_per_hour": "Profit/Hr",
+        # Price History
+        "price_history": "Price History",
+        "history_range": "History Range",
+        "moving_average": "Moving Average",
+
+        # Price Alerts
+        "watchlist": "Watchlist",
+        "alert_direction": "Price Alert",
+        "alert_below": "Notify at or below",
+        "alert_above": "Notify at or above",
+        "alert_threshold": "Threshold",
+        "alert_add": "Add",
+        "alert_added": "Added to the watchlist.",
+        "alert_limit": "You can register up to {0} alerts.",
+        "alert_full": "The alert service is full. Please try again later.",
+        "alert_fired_below": "{0} is now {1} (at or below {2})",
+        "alert_fired_above": "{0} is now {1} (at or above {2})",
+
+        # Penetration Matrix
+        "penetration_matrix": "Penetration Matrix (by Armor Class)",
+        "matrix_caliber": "Caliber",
+        "armor_durability": "Armor Durability",
+        "matrix_metric": "Metric",
+        "metric_chance": "Penetration Chance (%)",
+        "metric_shots": "Shots to Kill",
+        "metric_cost": "Ammo Cost per Kill (₽)",
+        "armor_class": "Armor Class",
+        "matrix_note": "Shots to kill is the expected value for thorax hits (HP {0}), including non-penetrating damage and ignoring armor wear during the fight.",
+
+        # Data Freshness
+        "data_age": "Data fetched {0} min ago",
+        "data_stale": "Could not refresh from the API. Showing data from {0} min ago (updating in the background).",
+
+        # Paging
+        "page_size": "Results per Page",
+        "page": "Page",
+        "page_range": "{0}-{1} of {2}",
+
         "disclaimer": "This app is unofficial and not affiliated with Battlestate Games."
     }
 }
+
+
+class CompiledTranslations:
+    """
+    1言語分の翻訳テーブルを事前解決したもの。
+    キー検索は1段の辞書参照のみで、書式付きテキストは `str.format` を束縛済みで保持する。
+    """
+    __slots__ = ("lang", "_texts", "_formatters")
+
+    def __init__(self, lang: str, table: Dict[str, Any]):
+        self.lang = lang
+        self._texts = MappingProxyType(dict(table))
+        self._formatters = MappingProxyType({
+            key: text.format
+            for key, text in table.items()
+            if isinstance(text, str) and "{" in text
+        })
+
+    def __call__(self, key: str, *args: Any) -> Any:
+        if args:
+            return self.formatter(key)(*args)
+        return self._texts.get(key, key)
+
+    def formatter(self, key: str) -> Callable[..., str]:
+        """キーに対応する事前コンパイル済みフォーマッタを返します。"""
+        fmt = self._formatters.get(key)
+        if fmt is None:
+            fmt = str(self._texts.get(key, key)).format
+        return fmt
+
+    def labels(self, *keys: str) -> Tuple[str, ...]:
+        """テーブルの列ラベルをまとめて解決します（テーブル1つにつき1回呼ぶ想定）。"""
+        return tuple(self._texts.get(key, key) for key in keys)
+
+
+@lru_cache(maxsize=None)
+def get_translations(lang: str) -> CompiledTranslations:
+    """言語コードに対応するコンパイル済み翻訳を返します（プロセス内で1度だけ構築）。"""
+    return CompiledTranslations(lang, TRANSLATIONS.get(lang, TRANSLATIONS['ja']))
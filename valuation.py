@@ -0,0 +1,217 @@
+"""
+アイテム一覧の一括査定。
+
+貼り付け・アップロードされたアイテム一覧 (1行1アイテム、数千行) の名前をローカルの名前索引で解決し、
+全アイテムの売却価格表 (アイテム x 売却先, sellFor から作成) を NumPy で1度に引いて、
+アイテムごとの最も高く売れる売却先と売却先ごとの合計を求める。APIへのリクエストは行わない。
+
+価格表と名前索引はデータ (価格データ / 名前テーブル) が更新されたときだけ作り直す
+(data.get_sale_table / data.get_name_index)。
+
+行の書式 (数量は省略可, 既定 1):
+    Graphics card
+    Graphics card x3 / Graphics card, 3 / Graphics card<TAB>3
+    3 Graphics card / 3x Graphics card
+"""
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from data import Localization
+
+# 数量付きの行 (末尾に数量 / 先頭に数量)
+_TRAILING_COUNT = re.compile(r"^(?P<name>.+?)\s*(?:[,;\t]\s*|\s+[x×]\s*|\s+)(?P<count>\d+)$", re.IGNORECASE)
+_LEADING_COUNT = re.compile(r"^(?P<count>\d+)\s*[x×]?\s+(?P<name>.+)$", re.IGNORECASE)
+
+
+def _normalize(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+class NameIndex:
+    """
+    アイテム名・略称・IDからアイテムIDを引く索引。
+    名前は略称より優先し、先に渡した名前テーブル (表示中の言語) を優先する。
+    完全一致で見つからない行のために、名前・略称の単語 -> アイテムIDの集合 の転置索引も持つ。
+    """
+    __slots__ = ("_exact", "_words")
+
+    def __init__(self, locs: Sequence[Localization]):
+        exact: Dict[str, str] = {}
+        words: Dict[str, Set[str]] = {}
+        for loc in locs:
+            for item_id, (name, _) in loc.items.items():
+                exact.setdefault(_normalize(name), item_id)
+        for loc in locs:
+            for item_id, (name, short) in loc.items.items():
+                if short:
+                    exact.setdefault(_normalize(short), item_id)
+                exact.setdefault(item_id.lower(), item_id)
+                for word in f"{name} {short}".lower().split():
+                    words.setdefault(word, set()).add(item_id)
+        self._exact = exact
+        self._words = words
+
+    def lookup(self, name: str) -> Optional[str]:
+        """完全一致 (大文字小文字・空白の違いは無視) でアイテムIDを返します。"""
+        return self._exact.get(_normalize(name))
+
+    def search(self, name: str) -> Optional[str]:
+        """全ての単語を名前・略称に含むアイテムが1件だけならそのアイテムIDを返します (完全一致の補助)。"""
+        candidates = [self._words.get(word) for word in name.lower().split()]
+        if not candidates or not all(candidates):
+            return None
+        hits = set.intersection(*sorted(candidates, key=len))
+        return next(iter(hits)) if len(hits) == 1 else None
+
+    def resolve(self, line: str) -> Tuple[Optional[str], int]:
+        """
+        1行をアイテムIDと数量に変換します。
+
+        行全体をアイテム名として引き、見つからなければ数量付きの書式として解釈する
+        (名前が数字で終わるアイテムを数量と誤解しないため)。
+
+        Returns:
+            Tuple[Optional[str], int]: (アイテムID (解決できない場合は None), 数量)
+        """
+        item_id = self.lookup(line)
+        if item_id:
+            return item_id, 1
+        matches = [m for m in (_TRAILING_COUNT.match(line), _LEADING_COUNT.match(line)) if m]
+        for match in matches:
+            item_id = self.lookup(match.group("name"))
+            if item_id:
+                return item_id, int(match.group("count"))
+        if matches:
+            return self.search(matches[0].group("name")), int(matches[0].group("count"))
+        return self.search(line), 1
+
+
+class SaleTable:
+    """
+    全アイテムの売却価格表。
+
+    Attributes:
+        index (Dict[str, int]): アイテムID -> 行番号。
+        channels (List[Dict[str, Any]]): 売却先 (sellFor の vendor) の一覧 (列の順)。
+        prices (np.ndarray): 売却価格 (アイテム, 売却先) の int64 配列。売れない組み合わせは 0。
+    """
+    __slots__ = ("index", "channels", "prices")
+
+    def __init__(self, market: Dict[str, Dict[str, Any]]):
+        self.index = {item_id: i for i, item_id in enumerate(market)}
+        columns: Dict[str, int] = {}
+        self.channels: List[Dict[str, Any]] = []
+        cells: List[Tuple[int, int, int]] = []
+        for i, item in enumerate(market.values()):
+            for sell in item.get('sellFor') or []:
+                if not sell.get('price'):
+                    continue
+                vendor = sell['vendor']
+                key = vendor.get('normalizedName') or vendor.get('name')
+                if key not in columns:
+                    columns[key] = len(self.channels)
+                    self.channels.append(vendor)
+                cells.append((i, columns[key], sell['price']))
+        self.prices = np.zeros((len(self.index), len(self.channels)), dtype=np.int64)
+        if cells:
+            rows, cols, values = np.array(cells, dtype=np.int64).T
+            self.prices[rows, cols] = values
+
+
+class Valuation(NamedTuple):
+    """
+    一括査定の結果。
+
+    Attributes:
+        item_ids (List[str]): アイテムID (入力に現れた順, 重複はまとめる)。
+        counts (np.ndarray): 数量。
+        channel (np.ndarray): 最も高く売れる売却先の列番号 (売れないアイテムは -1)。
+        unit_price (np.ndarray): その売却先での1個あたりの価格 (売れないアイテムは 0)。
+        total (np.ndarray): unit_price x counts。
+        channel_totals (np.ndarray): 売却先ごとの合計 (SaleTable.channels の順)。
+        channel_counts (np.ndarray): 売却先ごとの個数。
+        unresolved (List[str]): アイテムを特定できなかった行。
+    """
+    item_ids: List[str]
+    counts: np.ndarray
+    channel: np.ndarray
+    unit_price: np.ndarray
+    total: np.ndarray
+    channel_totals: np.ndarray
+    channel_counts: np.ndarray
+    unresolved: List[str]
+
+    @property
+    def grand_total(self) -> int:
+        return int(self.total.sum())
+
+
+def parse_items(lines: Iterable[str], names: NameIndex) -> Tuple[Dict[str, int], List[str]]:
+    """
+    アイテム一覧の各行を解決し、アイテムIDごとの数量にまとめます。
+
+    Returns:
+        Tuple[Dict[str, int], List[str]]: (アイテムID -> 数量 (入力に現れた順), 解決できなかった行)
+    """
+    counts: Dict[str, int] = {}
+    unresolved: List[str] = []
+    for raw in lines:
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        item_id, count = names.resolve(line)
+        if item_id is None:
+            unresolved.append(line)
+        else:
+            counts[item_id] = counts.get(item_id, 0) + count
+    return counts, unresolved
+
+
+def appraise(lines: Iterable[str], names: NameIndex, table: SaleTable,
+             allowed: Optional[Sequence[bool]] = None) -> Valuation:
+    """
+    アイテム一覧を一括で査定します。
+
+    Args:
+        lines (Iterable[str]): 入力の各行。
+        names (NameIndex): 名前索引。
+        table (SaleTable): 売却価格表。
+        allowed (Optional[Sequence[bool]]): 売却先ごとの使用可否 (例: フリマを使えない場合に除外)。省略時は全て使う。
+
+    Returns:
+        Valuation: 査定結果。
+    """
+    counts_by_id, unresolved = parse_items(lines, names)
+    # 価格データにないアイテム (名前テーブルにだけあるもの) は売れないものとして扱う
+    item_ids = list(counts_by_id)
+    rows = np.array([table.index.get(item_id, -1) for item_id in item_ids], dtype=np.int64)
+    counts = np.array([counts_by_id[item_id] for item_id in item_ids], dtype=np.int64)
+
+    n_channels = len(table.channels)
+    prices = table.prices[np.maximum(rows, 0)] if n_channels else np.zeros((len(rows), 0), dtype=np.int64)
+    prices[rows < 0] = 0
+    if allowed is not None:
+        prices = prices * np.asarray(allowed, dtype=bool)
+
+    if n_channels:
+        channel = prices.argmax(axis=1)
+        unit_price = prices[np.arange(len(rows)), channel]
+    else:
+        channel = np.zeros(len(rows), dtype=np.int64)
+        unit_price = np.zeros(len(rows), dtype=np.int64)
+    channel = np.where(unit_price > 0, channel, -1)
+    total = unit_price * counts
+
+    sold = channel >= 0
+    return Valuation(
+        item_ids=item_ids,
+        counts=counts,
+        channel=channel,
+        unit_price=unit_price,
+        total=total,
+        channel_totals=np.bincount(channel[sold], weights=total[sold], minlength=n_channels).astype(np.int64),
+        channel_counts=np.bincount(channel[sold], weights=counts[sold], minlength=n_channels).astype(np.int64),
+        unresolved=unresolved,
+    )
@@ -0,0 +1,97 @@
+"""
+起動時のキャッシュウォーマーとヘルスチェック。
+
+コンテナ起動時に Streamlit と並行して実行し、全機能・全言語のデータセットを取得して
+共有の応答キャッシュ (TARKOV_CACHE_DIR) に保存する。最初のユーザーがAPIの取得待ちにならないよう、
+キャッシュが揃ってから準備完了マーカーを書き、ヘルスチェックはそれを確認する。
+上流の障害などで揃わなかった場合は、揃うまで間隔を空けて取得を続ける (障害の復旧後に準備完了になる)。
+
+使い方:
+    python warmup.py          # キャッシュを温め、完了したら準備完了マーカーを書く (揃うまで再試行を続ける)
+    python warmup.py --once   # 1回だけ試み、揃わなければ終了コード1
+    python warmup.py --check  # 準備完了かつStreamlitが応答していれば終了コード0
+"""
+import argparse
+import os
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from api import CACHE_DIR, Priority, TarkovClient
+from data import warm_queries
+
+HEALTH_URL = os.environ.get("TARKOV_HEALTH_URL", "http://localhost:8501/_stcore/health")
+WARMUP_WORKERS = int(os.environ.get("TARKOV_WARMUP_WORKERS", "4"))
+WARMUP_RETRIES = int(os.environ.get("TARKOV_WARMUP_RETRIES", "5"))
+# 再試行しても揃わなかった場合に、次に温め直すまでの間隔 (秒)
+WARMUP_RETRY_INTERVAL = float(os.environ.get("TARKOV_WARMUP_RETRY_INTERVAL", "60"))
+
+
+def ready_marker() -> str:
+    return os.path.join(CACHE_DIR, ".ready")
+
+
+def warm() -> bool:
+    """
+    全データセットを取得してキャッシュに保存します。失敗したクエリは間隔を空けて再試行する。
+
+    Returns:
+        bool: 全クエリの応答 (再試行で取得できなければ前回起動時の古い応答も可) がキャッシュにある場合はTrue。
+    """
+    pending = warm_queries()
+    with ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix="warmup") as pool:
+        for attempt in range(WARMUP_RETRIES + 1):
+            if attempt:
+                time.sleep(min(2 ** attempt, 30))
+            results = list(pool.map(lambda q: TarkovClient.warm(q, Priority.BACKGROUND), pending))
+            pending = [q for q, ok in zip(pending, results) if not ok]
+            if not pending:
+                return True
+            print(f"warm-up: {len(pending)} queries failed (attempt {attempt + 1})", file=sys.stderr)
+    # 取得できなかったクエリも古い応答があれば表示はできる
+    return all(TarkovClient.freshness(q) is not None for q in pending)
+
+
+def check() -> bool:
+    """準備完了マーカーがあり、Streamlitのヘルスエンドポイントが応答すればTrue。"""
+    if not os.path.exists(ready_marker()):
+        return False
+    try:
+        with urllib.request.urlopen(HEALTH_URL, timeout=5) as res:
+            return res.status == 200
+    except OSError:
+        return False
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Tarkov Dashboard のキャッシュウォーマー")
+    parser.add_argument("--check", action="store_true", help="ヘルスチェックとして実行する")
+    parser.add_argument("--once", action="store_true", help="揃わなくても再試行を続けずに終了する")
+    args = parser.parse_args()
+
+    if not CACHE_DIR:
+        print("TARKOV_CACHE_DIR is not set", file=sys.stderr)
+        return 2
+    if args.check:
+        return 0 if check() else 1
+
+    # 前回起動時のマーカーは無効にしてから温め直す
+    if os.path.exists(ready_marker()):
+        os.remove(ready_marker())
+    started = time.monotonic()
+    while not warm():
+        if args.once:
+            print("warm-up: cache is incomplete", file=sys.stderr)
+            return 1
+        # 初回起動で上流が落ちている場合など。マーカーを書かないままだとヘルスチェックが通らないため続ける
+        print(f"warm-up: cache is incomplete, retrying in {WARMUP_RETRY_INTERVAL:.0f}s", file=sys.stderr)
+        time.sleep(WARMUP_RETRY_INTERVAL)
+    with open(ready_marker(), "w") as f:
+        f.write(str(time.time()))
+    print(f"warm-up: {len(warm_queries())} queries ready in {time.monotonic() - started:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())